@@ -27,9 +27,10 @@ from routes.project_routes import project_routes
 from routes.training_routes import training_routes
 from routes.synthesize_routes import synthesize_routes
 from routes.process_csv_routes import process_csv_routes
+from routes.spectrogram_routes import SPECTROGRAM_HEADER, spectrogram_routes
 
 app = Flask(__name__, static_folder='static',template_folder='templates')
-CORS(app)
+CORS(app, expose_headers=[SPECTROGRAM_HEADER])
 app.config['UPLOAD_FOLDER'] = os.path.join(app.root_path, 'static', 'uploads')
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
@@ -94,6 +95,7 @@ app.register_blueprint(project_routes)
 app.register_blueprint(synthesize_routes)
 app.register_blueprint(training_routes)
 app.register_blueprint(process_csv_routes)
+app.register_blueprint(spectrogram_routes)
 
 
 @app.route('/')
@@ -1,15 +1,18 @@
 import gc
+import io
 import logging
 import os
 import re
 import sys
 import tempfile
 import time
-import soundfile as sf
 from services.emotions import emotions
 from num2words import num2words
 from flask import Blueprint, request, jsonify, send_file
 from src.English_f5tts.English_train.English_utils.inference import infer
+from src.English_f5tts.model.guidance import parse_guidance
+from routes.spectrogram_routes import SPECTROGRAM_HEADER
+from utils.audio_encode import AudioFormatError, download_name, encode_audio, parse_audio_format
 
 
 LOG_DIR = "logs"
@@ -38,6 +41,16 @@ def generate_voice_endpoint():
         if 'ref_audio' not in request.files:
             return jsonify({"error": "Reference audio file is required"}), 400
 
+        try:
+            audio_format = parse_audio_format(request.form)
+        except AudioFormatError as e:
+            return jsonify({"error": str(e)}), 400
+        try:
+            # e.g. "interval:t_end=0.4" or "every_k:every=3", cfg at every step when absent
+            guidance = parse_guidance(request.form.get('guidance'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
         ref_audio_file = request.files['ref_audio']
         ref_text = request.form.get('ref_text', '')
         gen_text1 = request.form.get('gen_text', '')+'.'
@@ -48,6 +61,7 @@ def generate_voice_endpoint():
         emotion_seed = int(request.form.get('emotion_seed', -1))
         emotion_speed = float(request.form.get('emotion_speed', 0.9))
         remove_silence = request.form.get('remove_silence', 'true').lower() == 'true'
+        spectrogram = request.form.get('spectrogram', 'false').lower() == 'true'
         # Create the JSON metadata line
         metadata_line = f'{{"name": "{emotion_name}", "seed": {emotion_seed}, "speed": {emotion_speed}}}'
         
@@ -97,7 +111,7 @@ def generate_voice_endpoint():
             ref_audio_path = f.name
         
         # Call the voice generation logic
-        result, spectrogram_path, _, used_seed = emotions(
+        result, spectrogram_id, _, used_seed = emotions(
             ref_audio_path,
             ref_text,
             cleaned_gen_text,  # Use the cleaned text
@@ -105,8 +119,9 @@ def generate_voice_endpoint():
             language,
             remove_silence,
             emotion_seed,
-            speed=emotion_speed
-            
+            speed=emotion_speed,
+            spectrogram=spectrogram,
+            guidance=guidance,
         )
 
         if result is None:
@@ -114,18 +129,19 @@ def generate_voice_endpoint():
 
         sample_rate, audio_data = result
 
-        # Save the output audio
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as f:
-            sf.write(f.name, audio_data, sample_rate)
-            output_path = f.name
+        # Encode the output audio in memory, in the requested format
+        audio_bytes, mimetype, _ = encode_audio(audio_data, sample_rate, **audio_format)
        
         # Send the file directly
-        return send_file(
-            output_path,
-            mimetype='audio/wav',
+        response = send_file(
+            io.BytesIO(audio_bytes),
+            mimetype=mimetype,
             as_attachment=True,
-            download_name='generated.wav'
+            download_name=download_name('generated', audio_format['fmt'])
         )
+        if spectrogram_id:
+            response.headers[SPECTROGRAM_HEADER] = spectrogram_id
+        return response
 
     except Exception as e:
         import traceback
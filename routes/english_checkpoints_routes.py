@@ -7,6 +7,7 @@ import time
 import torch
 from importlib.resources import files
 from flask import Blueprint, request, jsonify,current_app,Response
+from src.English_f5tts.infer.model_registry import model_registry
 
 
 LOG_DIR = "logs"
@@ -58,3 +59,13 @@ def list_checkpoints_for_english_project():
         logger.error(f"Error in /list-checkpoints: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+
+@english_checkpoints_routes.route('/en/model-stats', methods=['GET'])
+def english_model_stats():
+    # per-checkpoint hit / miss / load / eviction counters of the resident model registry
+    return jsonify({
+        "max_models": model_registry.max_models,
+        "max_bytes": model_registry.max_bytes,
+        "resident_bytes": model_registry.resident_bytes(),
+        "models": model_registry.stats(),
+    }), 200
@@ -1,9 +1,14 @@
 import gc
+import io
+import os
 import tempfile
 import torch
-import soundfile as sf
-from flask import Blueprint, request, jsonify,send_file
-from services.english_infer import english_infer
+from flask import Blueprint, Response, request, jsonify,send_file,stream_with_context
+from services.english_infer import english_infer, english_infer_stream
+from src.English_f5tts.infer.utils_infer import target_sample_rate
+from routes.spectrogram_routes import SPECTROGRAM_HEADER
+from utils.audio_encode import AudioFormatError, download_name, encode_audio, parse_audio_format
+from utils.audio_stream import STREAM_CHUNK_SIZE, STREAM_FORMATS, stream_audio, stream_mimetype
 
 
 english_infer_routes = Blueprint('english_infer_routes', __name__)
@@ -17,18 +22,24 @@ def english_tts():
     gen_text = request.form['gen_text']
     gen_text = gen_text.lower() + ". "
 
+    try:
+        audio_format = parse_audio_format(request.form)
+    except AudioFormatError as e:
+        return jsonify({"error": str(e)}), 400
+
     ref_text = request.form.get('ref_text', '')
     remove_silence = request.form.get('remove_silence', 'false').lower() == 'true'
     cross_fade_duration = float(request.form.get('cross_fade_duration', 0.15))
     nfe_step = int(request.form.get('nfe_step', 32))
     speed = float(request.form.get('speed', 0.9))
+    spectrogram = request.form.get('spectrogram', 'false').lower() == 'true'
 
     with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
         ref_audio_path = tmp.name
         ref_audio_file.save(ref_audio_path)
 
     try:
-        audio_result, spectrogram_path =english_infer(
+        audio_result, spectrogram_id = english_infer(
             ref_audio_path,
             ref_text,
             f"{gen_text.lower()} .",
@@ -37,16 +48,59 @@ def english_tts():
             cross_fade_duration=cross_fade_duration,
             nfe_step=nfe_step,
             speed=speed,
+            spectrogram=spectrogram,
         )
     except Exception as e:
         return jsonify({"error": f"TTS failed: {str(e)}"}), 500
 
     sample_rate, wave = audio_result
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as out_audio_file:
-        out_path = out_audio_file.name
-        sf.write(out_path, wave, sample_rate)
+    audio_bytes, mimetype, _ = encode_audio(wave, sample_rate, **audio_format)
 
     gc.collect()
     torch.cuda.empty_cache()
     
-    return send_file(out_path, mimetype="audio/wav", as_attachment=True, download_name="tts_output.wav")
+    response = send_file(
+        io.BytesIO(audio_bytes), mimetype=mimetype, as_attachment=True,
+        download_name=download_name("tts_output", audio_format["fmt"]),
+    )
+    if spectrogram_id:
+        response.headers[SPECTROGRAM_HEADER] = spectrogram_id
+    return response
+
+
+@english_infer_routes.route('/en/tts/stream', methods=['POST'])
+def english_tts_stream():
+    # same form fields as /en/tts, audio is sent chunk by chunk as it is vocoded
+    # format: wav (header with open-ended length, then PCM16) or pcm (raw PCM16 at the model's sample rate)
+    if 'ref_audio' not in request.files or 'gen_text' not in request.form:
+        return jsonify({"error": "Missing 'ref_audio' or 'gen_text'"}), 400
+
+    fmt = request.form.get('format', 'wav').lower()
+    if fmt not in STREAM_FORMATS:
+        return jsonify({"error": f"Unsupported format '{fmt}', expected one of {sorted(STREAM_FORMATS)}"}), 400
+
+    gen_text = request.form['gen_text']
+    gen_text = gen_text.lower() + ". "
+    ref_text = request.form.get('ref_text', '')
+    cross_fade_duration = float(request.form.get('cross_fade_duration', 0.15))
+    nfe_step = int(request.form.get('nfe_step', 32))
+    speed = float(request.form.get('speed', 0.9))
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
+        ref_audio_path = tmp.name
+        request.files['ref_audio'].save(ref_audio_path)
+
+    chunks = english_infer_stream(
+        ref_audio_path,
+        ref_text,
+        f"{gen_text.lower()} .",
+        cross_fade_duration=cross_fade_duration,
+        nfe_step=nfe_step,
+        speed=speed,
+        chunk_size=STREAM_CHUNK_SIZE,
+    )
+    return Response(
+        stream_with_context(stream_audio(chunks, target_sample_rate, fmt, on_close=lambda: os.remove(ref_audio_path))),
+        mimetype=stream_mimetype(fmt, target_sample_rate),
+        headers={"Content-Disposition": f"attachment; filename=tts_output.{fmt}"},
+    )
@@ -1,8 +1,8 @@
 
 import gc
+import io
 import logging
 import os
-import random
 import sys
 import tempfile
 import time
@@ -10,11 +10,14 @@ import torch
 import shutil
 from werkzeug.utils import secure_filename
 from importlib.resources import files
-from speechbrain.pretrained import SpeakerRecognition
-from flask import Blueprint, request, jsonify,after_this_request,send_from_directory
-from src.English_f5tts.English_train.English_utils.inference import infer
-from scipy.io import wavfile
-from pydub import AudioSegment
+from services.audio_index import load_audio_index
+from services.speaker_verification import speaker_verifier
+from flask import Blueprint, Response, request, jsonify,after_this_request,send_file,stream_with_context
+from src.English_f5tts.English_train.English_utils.inference import infer, infer_stream
+from src.English_f5tts.infer.utils_infer import target_sample_rate
+from src.English_f5tts.model.guidance import parse_guidance
+from utils.audio_encode import AudioFormatError, download_name, encode_audio, parse_audio_format
+from utils.audio_stream import STREAM_CHUNK_SIZE, STREAM_FORMATS, stream_audio, stream_mimetype
 
 LOG_DIR = "logs"
 os.makedirs(LOG_DIR, exist_ok=True)
@@ -36,22 +39,20 @@ english_synthesize_routes = Blueprint('english_synthesize_routes', __name__)
 
 
 @english_synthesize_routes.route("/en/synthesize", methods=["POST"])
+@english_synthesize_routes.route("/en/synthesize/stream", methods=["POST"])
 def english_synthesize():
     gc.collect()
     torch.cuda.empty_cache()
+    # /stream sends the audio chunk by chunk as it is vocoded instead of one file at the end
+    streaming = request.path.endswith("/stream")
     temp_dir_ref_audio = None
-    generated_audio_output_path = None # Path of the file returned by infer()
     path_project_ckpts = str(files("src").joinpath("./English_ckpts"))
    
     @after_this_request
     def cleanup(response):
-        nonlocal temp_dir_ref_audio, generated_audio_output_path # Ensure access to outer scope variables
-        if generated_audio_output_path and os.path.exists(generated_audio_output_path):
-            try:
-                os.remove(generated_audio_output_path)
-                logger.info(f"Cleaned up generated audio file: {generated_audio_output_path}")
-            except Exception as e:
-                logger.error(f"Error deleting generated audio file {generated_audio_output_path}: {e}")
+        nonlocal temp_dir_ref_audio # Ensure access to outer scope variables
+        if streaming and response.is_streamed:
+            return response  # the stream still reads the reference audio, it cleans up when done
         if temp_dir_ref_audio and os.path.isdir(temp_dir_ref_audio):
             try:
                 shutil.rmtree(temp_dir_ref_audio)
@@ -76,6 +77,19 @@ def english_synthesize():
             return jsonify({"error": "Missing required field: gen_text"}), 400
         if not ref_audio_file:
             return jsonify({"error": "Missing required file: ref_audio"}), 400
+        fmt = request.form.get("format", "wav").lower()
+        if streaming and fmt not in STREAM_FORMATS:
+            return jsonify({"error": f"Unsupported format '{fmt}', expected one of {sorted(STREAM_FORMATS)}"}), 400
+        if not streaming:
+            try:
+                audio_format = parse_audio_format(request.form)
+            except AudioFormatError as e:
+                return jsonify({"error": str(e)}), 400
+        try:
+            # e.g. "interval:t_end=0.4" or "every_k:every=3", cfg at every step when absent
+            guidance = parse_guidance(request.form.get("guidance"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         exp_name = "F5TTS_v1_Base" # As per original script logic
 
@@ -95,63 +109,58 @@ def english_synthesize():
         # Securely save uploaded reference audio to a temporary location
         temp_dir_ref_audio = tempfile.mkdtemp()
         ref_audio_filename = secure_filename(ref_audio_file.filename)
-        sample_file_directory = str(files("src").joinpath(f"./English_data/{project_select}/wavs"))
-        print(sample_file_directory)
-        wav_files = [f for f in os.listdir(sample_file_directory) if f.endswith(".wav")]
-        # Function to get the duration of an audio file in seconds
-        def get_audio_duration(audio_file):
-            audio = AudioSegment.from_wav(audio_file)
-            return len(audio) / 1000  # Convert milliseconds to seconds
-
-        
-
-        # Filter files that are >= 5 seconds
-        valid_audio_files = []
-        for file in wav_files:
-            file_path = os.path.join(sample_file_directory, file)
-            duration = get_audio_duration(file_path)
-            if duration >= 5:
-                valid_audio_files.append(file_path)
-
-        # Print the valid audio files
-        print("Audio files with duration >= 10 seconds:")
-        for file in valid_audio_files:
-            print(file)
-        # Check if any .wav files exist
-        # if not wav_files:
-        #     print("No .wav files found in the directory.")
-        # else:
-            # Pick a random .wav file
-        random_file = random.choice(valid_audio_files)
-        sample_file= os.path.join(sample_file_directory, random_file)
-
-        # Load the WAV file
-        sample_rate, audio_data = wavfile.read(sample_file)
+        project_data_directory = str(files("src").joinpath(f"./English_data/{project_select}"))
+        print(project_data_directory)
+        # Pick a random training clip of >= 5 seconds from the project's audio index, no audio is decoded here
+        sample = load_audio_index(project_data_directory).pick(min_duration=5)
+        if sample is None:
+            return jsonify({"error": f"No reference sample of at least 5 seconds in project: {project_select}"}), 400
+        sample_file = sample["audio_path"]
 
         # Output information
-        print(f"\nLoaded file: {random_file}")
-        print(f"Sample Rate: {sample_rate} Hz")
-        print(f"Audio Data Shape: {audio_data.shape}")
+        print(f"\nSelected file: {sample_file}")
+        print(f"Duration: {sample['duration']:.2f} s")
         ref_audio_path = os.path.join(temp_dir_ref_audio, ref_audio_filename)
         ref_audio_file.save(ref_audio_path)
-        verification = SpeakerRecognition.from_hparams(
-            source="speechbrain/spkrec-ecapa-voxceleb",
-            savedir="pretrained_models/spkrec-ecapa-voxceleb"
-        )
-
-
         file1 = sample_file
         file2 = ref_audio_path
 
 
-        score, prediction = verification.verify_files(file1, file2)
+        if sample["embedding"] is not None:
+            score, prediction = speaker_verifier.verify_embedding(file2, sample["embedding"])
+        else:
+            score, prediction = speaker_verifier.verify_files(file1, file2)
 
-        print("Similarity score:", score.item())
-        print("Same speaker?", "Yes" if prediction.item() == 1 else "No")
-        if prediction.item() == 1:
+        print("Similarity score:", score)
+        print("Same speaker?", "Yes" if prediction else "No")
+        if prediction:
             
             logger.info(f"Saved reference audio to temporary path: {ref_audio_path}")
 
+            if streaming:
+                chunks = infer_stream(
+                    project=project_select,
+                    file_checkpoint=checkpoint_path,
+                    exp_name=exp_name,
+                    ref_text=ref_text,
+                    ref_audio=ref_audio_path,
+                    gen_text=f"{gen_text.lower()} .",
+                    nfe_step=nfe_step,
+                    use_ema=use_ema,
+                    speed=speed,
+                    seed=seed,
+                    chunk_size=STREAM_CHUNK_SIZE,
+                    guidance=guidance,
+                )
+                stream_dir = temp_dir_ref_audio
+                return Response(
+                    stream_with_context(stream_audio(
+                        chunks, target_sample_rate, fmt, on_close=lambda: shutil.rmtree(stream_dir, ignore_errors=True)
+                    )),
+                    mimetype=stream_mimetype(fmt, target_sample_rate),
+                    headers={"Content-Disposition": f"attachment; filename={secure_filename(project_select)}_{secure_filename(gen_text[:20])}.{fmt}"},
+                )
+
             # Corrected call to the infer function
             infer_result_tuple = infer(
                 project=project_select,
@@ -164,26 +173,28 @@ def english_synthesize():
                 use_ema=use_ema,
                 speed=speed,
                 seed=seed,
-                remove_silence=remove_silence
+                remove_silence=remove_silence,
+                guidance=guidance,
             )
             
-            # infer returns (audio_path, device_str, seed_str) or (None, error_msg, None) on checkpoint error
+            # infer returns ((sample_rate, wave), device_str, seed_str) or (None, error_msg, None) on checkpoint error
             if infer_result_tuple[0] is None and infer_result_tuple[1] == "checkpoint not found!":
                 return jsonify({"error": "Inference failed: checkpoint not found internally."}), 404
 
-            generated_audio_output_path = infer_result_tuple[0]
+            sample_rate, wave = infer_result_tuple[0]
             # device_info = infer_result_tuple[1]
             # seed_info = infer_result_tuple[2]
 
-            logger.info(f"Sending generated audio file: {generated_audio_output_path}")
+            # encoded in memory on the request thread, the model is already free for the next request
+            audio_bytes, mimetype, _ = encode_audio(wave, sample_rate, **audio_format)
+            logger.info(f"Sending generated audio: {len(audio_bytes)} bytes of {audio_format['fmt']}")
             gc.collect()
             torch.cuda.empty_cache()
-            return send_from_directory(
-                directory=os.path.dirname(generated_audio_output_path),
-                path=os.path.basename(generated_audio_output_path),
-                mimetype="audio/wav",
+            return send_file(
+                io.BytesIO(audio_bytes),
+                mimetype=mimetype,
                 as_attachment=True,
-                download_name=f"{secure_filename(project_select)}_{secure_filename(gen_text[:20])}.wav"
+                download_name=download_name(f"{secure_filename(project_select)}_{secure_filename(gen_text[:20])}", audio_format["fmt"])
             )
         else:
             return jsonify({"error": "Please provide your original audio"}), 500
@@ -11,6 +11,7 @@ from werkzeug.utils import secure_filename
 from importlib.resources import files
 from flask import Blueprint, request, jsonify,current_app
 from src.English_f5tts.English_train.English_utils.transcribe import create_metadata, transcribe_all
+from services.speaker_verification import speaker_verifier
 
 LOG_DIR = "logs"
 os.makedirs(LOG_DIR, exist_ok=True)
@@ -90,7 +91,9 @@ def english_transcribe_and_prepare(project_name):
         # This might need to come from project config or request if variable
         tokenizer_is_char_based = "pinyin" not in project_name.lower() # Heuristic, might need refinement
         logger.info(f"Calling create_metadata for project '{project_name}'. Deduced char_tokenizer={tokenizer_is_char_based}")
-        prepare_result_dict, _ = create_metadata(project_name, ch_tokenizer=tokenizer_is_char_based)
+        prepare_result_dict, _ = create_metadata(
+            project_name, ch_tokenizer=tokenizer_is_char_based, embed_fn=speaker_verifier.embed_file
+        )
 
         shutil.rmtree(request_specific_temp_dir)
         logger.debug(f"Removed temporary directory: {request_specific_temp_dir}")
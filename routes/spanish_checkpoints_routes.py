@@ -7,6 +7,7 @@ import time
 import torch
 from importlib.resources import files
 from flask import Blueprint, request, jsonify
+from src.Spanish_f5tts.infer.model_registry import model_registry
 
 
 LOG_DIR = "logs"
@@ -56,3 +57,13 @@ def list_checkpoints_for_spanish_project():
         logger.error(f"Error in /list-checkpoints: {e}", exc_info=True)
         return jsonify({"error": str(e)}), 500
 
+
+@spanish_checkpoints_routes.route('/es/model-stats', methods=['GET'])
+def spanish_model_stats():
+    # per-checkpoint hit / miss / load / eviction counters of the resident model registry
+    return jsonify({
+        "max_models": model_registry.max_models,
+        "max_bytes": model_registry.max_bytes,
+        "resident_bytes": model_registry.resident_bytes(),
+        "models": model_registry.stats(),
+    }), 200
@@ -1,10 +1,15 @@
 
 import gc
+import io
+import os
 import tempfile
 import torch
-import soundfile as sf
-from flask import Blueprint, request, jsonify,send_file
-from services.spanish_infer import spanish_infer
+from flask import Blueprint, Response, request, jsonify,send_file,stream_with_context
+from services.spanish_infer import spanish_infer, spanish_infer_stream
+from src.Spanish_f5tts.infer.utils_infer import target_sample_rate
+from routes.spectrogram_routes import SPECTROGRAM_HEADER
+from utils.audio_encode import AudioFormatError, download_name, encode_audio, parse_audio_format
+from utils.audio_stream import STREAM_CHUNK_SIZE, STREAM_FORMATS, stream_audio, stream_mimetype
 
 spanish_infer_routes = Blueprint('spanish_infer_routes', __name__)
 
@@ -17,6 +22,11 @@ def spanish_tts():
     if 'gen_text' not in request.form:
         return jsonify({"error": "Missing 'gen_text' parameter"}), 400
 
+    try:
+        audio_format = parse_audio_format(request.form)
+    except AudioFormatError as e:
+        return jsonify({"error": str(e)}), 400
+
     ref_audio_file = request.files['ref_audio']
     gen_text = request.form['gen_text']
     gen_text += ". "
@@ -43,11 +53,12 @@ def spanish_tts():
         speed = float(request.form.get("speed", 0.9))
     except ValueError:
         return jsonify({"error": "Invalid 'speed' parameter. Must be a number."}), 400
+    spectrogram = request.form.get('spectrogram', 'false').lower() == 'true'
 
 
     try:
         # Call the infer function with only the required parameters
-        audio_result, spectrogram_path = spanish_infer(
+        audio_result, spectrogram_id = spanish_infer(
             ref_audio_path,
             ref_text,
             f"{gen_text.lower()} .",
@@ -56,6 +67,7 @@ def spanish_tts():
             nfe_step,
             cross_fade_duration,
             speed,
+            spectrogram=spectrogram,
             # show_info=dummy  # using dummy info object
         )
     except Exception as e:
@@ -63,12 +75,57 @@ def spanish_tts():
 
     sample_rate, wave = audio_result
 
-    # Write the resulting synthesized audio to a temporary file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as out_audio_file:
-        out_path = out_audio_file.name
-        sf.write(out_path, wave, sample_rate)
+    # Encode the resulting synthesized audio in memory, in the requested format
+    audio_bytes, mimetype, _ = encode_audio(wave, sample_rate, **audio_format)
 
     gc.collect()
     torch.cuda.empty_cache()
     # Return the synthesized audio file as a download
-    return send_file(out_path, mimetype="audio/wav", as_attachment=True, download_name="cloned_audio.wav")
+    response = send_file(
+        io.BytesIO(audio_bytes), mimetype=mimetype, as_attachment=True,
+        download_name=download_name("cloned_audio", audio_format["fmt"]),
+    )
+    if spectrogram_id:
+        response.headers[SPECTROGRAM_HEADER] = spectrogram_id
+    return response
+
+
+@spanish_infer_routes.route('/es/tts/stream', methods=['POST'])
+def spanish_tts_stream():
+    # same form fields as /es/tts, audio is sent chunk by chunk as it is vocoded
+    # format: wav (header with open-ended length, then PCM16) or pcm (raw PCM16 at the model's sample rate)
+    if 'ref_audio' not in request.files:
+        return jsonify({"error": "Missing 'ref_audio' file"}), 400
+    if 'gen_text' not in request.form:
+        return jsonify({"error": "Missing 'gen_text' parameter"}), 400
+
+    fmt = request.form.get("format", "wav").lower()
+    if fmt not in STREAM_FORMATS:
+        return jsonify({"error": f"Unsupported format '{fmt}', expected one of {sorted(STREAM_FORMATS)}"}), 400
+
+    gen_text = request.form['gen_text']
+    gen_text += ". "
+
+    try:
+        speed = float(request.form.get("speed", 0.9))
+    except ValueError:
+        return jsonify({"error": "Invalid 'speed' parameter. Must be a number."}), 400
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
+        ref_audio_path = tmp.name
+        request.files['ref_audio'].save(ref_audio_path)
+
+    chunks = spanish_infer_stream(
+        ref_audio_path,
+        "",
+        f"{gen_text.lower()} .",
+        nfe_step=32,
+        cross_fade_duration=0.15,
+        speed=speed,
+        chunk_size=STREAM_CHUNK_SIZE,
+    )
+    return Response(
+        stream_with_context(stream_audio(chunks, target_sample_rate, fmt, on_close=lambda: os.remove(ref_audio_path))),
+        mimetype=stream_mimetype(fmt, target_sample_rate),
+        headers={"Content-Disposition": f"attachment; filename=cloned_audio.{fmt}"},
+    )
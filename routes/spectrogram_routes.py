@@ -0,0 +1,25 @@
+import io
+from concurrent.futures import TimeoutError
+
+from flask import Blueprint, jsonify, send_file
+
+from services.spectrograms import spectrogram_store
+
+
+# synthesis routes called with spectrogram=true return the artifact id in this header
+SPECTROGRAM_HEADER = "X-Spectrogram-Id"
+SPECTROGRAM_TIMEOUT = 60  # seconds to wait for the background render
+
+spectrogram_routes = Blueprint('spectrogram_routes', __name__)
+
+
+@spectrogram_routes.route('/api/spectrograms/<artifact_id>', methods=['GET'])
+def get_spectrogram(artifact_id):
+    # rendered on first request from the mel kept by the synthesis call, later requests reuse the PNG
+    try:
+        png = spectrogram_store.get(artifact_id, timeout=SPECTROGRAM_TIMEOUT)
+    except TimeoutError:
+        return jsonify({"error": "Spectrogram is still rendering, try again"}), 503
+    if png is None:
+        return jsonify({"error": f"Unknown or expired spectrogram: {artifact_id}"}), 404
+    return send_file(io.BytesIO(png), mimetype="image/png", download_name=f"{artifact_id}.png")
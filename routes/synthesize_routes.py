@@ -3,7 +3,7 @@ import logging
 import os
 import time
 import uuid
-from flask import Blueprint, Response, request, jsonify,current_app
+from flask import Blueprint, Response, request, jsonify,current_app,stream_with_context
 import psycopg2
 import requests
 from services.db_service import get_db
@@ -29,6 +29,7 @@ synthesize_routes = Blueprint('synthesize_routes', __name__)
 
 ALLOWED_EXTENSIONS = {'mp3', 'wav', 'webm'}
 MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload size
+PROXY_CHUNK_SIZE = 8192  # bytes relayed per read from the synthesis API
 
 # synthesize_routes.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 # synthesize_routes.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
@@ -48,6 +49,8 @@ def synthesize_text():
         # Get the appropriate API URL based on language
         api_url = get_api_url(language)
         text = request.form.get('text')
+        # stream=true uses the chunked /synthesize/stream endpoint, audio starts flowing after the first text chunk
+        stream = request.form.get('stream', 'false').lower() == 'true'
         ref_audio = None
         
         if 'reference_audio' in request.files:
@@ -64,6 +67,10 @@ def synthesize_text():
         
         # Always use model_last.pt as checkpoint
         payload['checkpoint'] = 'model_last.pt'
+        # output encoding (format, opus bitrate, sample rate) is chosen by the synthesis API
+        for field in ('format', 'bitrate', 'sample_rate'):
+            if request.form.get(field):
+                payload[field] = request.form.get(field)
         
         # Handle reference audio if provided
         files = {}
@@ -87,17 +94,26 @@ def synthesize_text():
             print(payload)
             print(api_url)
             response = requests.post(
-                f"{api_url}/synthesize",
+                f"{api_url}/synthesize/stream" if stream else f"{api_url}/synthesize",
                 data=payload,
-                files=files
+                files=files,
+                stream=True
             )
             
             if response.status_code == 200:
-                # Audio data is returned directly as binary content
+                # Audio data is relayed as it arrives instead of buffering the whole file
+                def relay():
+                    try:
+                        for chunk in response.iter_content(chunk_size=PROXY_CHUNK_SIZE):
+                            if chunk:
+                                yield chunk
+                    finally:
+                        response.close()
+
                 return Response(
-                    response.content,
+                    stream_with_context(relay()),
                     mimetype=response.headers.get('Content-Type', 'audio/wav'),
-                    headers={'Content-Disposition': 'attachment; filename=synthesized_audio.wav'}
+                    headers={'Content-Disposition': response.headers.get('Content-Disposition', 'attachment; filename=synthesized_audio.wav')}
                 )
             else:
                 print(response.status_code)
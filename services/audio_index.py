@@ -0,0 +1,68 @@
+import json
+import os
+import random
+import threading
+
+import soundfile as sf
+
+
+AUDIO_INDEX_FILE = "audio_index.json"  # written by create_metadata next to raw.arrow
+
+
+class AudioIndex:
+    def __init__(self, samples):
+        self.samples = samples
+        self._eligible = {}  # min_duration -> samples at least that long
+
+    def eligible(self, min_duration):
+        if min_duration not in self._eligible:
+            self._eligible[min_duration] = [s for s in self.samples if s["duration"] >= min_duration]
+        return self._eligible[min_duration]
+
+    def pick(self, min_duration):
+        eligible = self.eligible(min_duration)
+        return random.choice(eligible) if eligible else None
+
+
+_indexes = {}  # project path -> (index file mtime, AudioIndex)
+_indexes_lock = threading.Lock()
+
+
+def _scan_wavs(path_project):
+    # projects prepared before the index existed: durations from the wav headers, no decoding
+    path_project_wavs = os.path.join(path_project, "wavs")
+    samples = []
+    for name in sorted(os.listdir(path_project_wavs)):
+        if not name.endswith(".wav"):
+            continue
+        audio_path = os.path.join(path_project_wavs, name)
+        info = sf.info(audio_path)
+        samples.append({
+            "name": os.path.splitext(name)[0],
+            "audio_path": audio_path,
+            "duration": info.frames / info.samplerate,
+            "rms": None,
+            "text": None,
+            "embedding": None,
+        })
+    return samples
+
+
+def load_audio_index(path_project):
+    file_index = os.path.join(path_project, AUDIO_INDEX_FILE)
+    mtime = os.path.getmtime(file_index) if os.path.isfile(file_index) else None
+
+    with _indexes_lock:
+        cached = _indexes.get(path_project)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        if mtime is not None:
+            with open(file_index, "r", encoding="utf-8") as f:
+                samples = json.load(f)["samples"]
+        else:
+            samples = _scan_wavs(path_project)
+
+        index = AudioIndex(samples)
+        _indexes[path_project] = (mtime, index)
+        return index
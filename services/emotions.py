@@ -1,16 +1,17 @@
 
 
+import hashlib
 import json
-import tempfile
+import threading
+from collections import OrderedDict
 import torch
 import numpy as np
-from functools import lru_cache
 from cached_path import cached_path
-import soundfile as sf
-import torchaudio
 from importlib.resources import files
 from src.English_f5tts.model import DiT
-from src.English_f5tts.infer.utils_infer import (load_vocoder,load_model,preprocess_ref_audio_text,infer_process,remove_silence_for_generated_wav,save_spectrogram)
+from src.English_f5tts.infer.batch_scheduler import BatchScheduler
+from src.English_f5tts.infer.utils_infer import (load_vocoder,load_model,preprocess_ref_audio_text,infer_process,remove_silence_from_wave)
+from services.spectrograms import spectrogram_store
 
 DEFAULT_EMOTIONS_TTS_MODEL = "F5-TTS_v1"
 DEFAULT_English_EMOTIONS_TTS_MODEL_CFG = [
@@ -26,6 +27,16 @@ DEFAULT_Spanish_EMOTIONS_TTS_MODEL_CFG = [
 ]
 emotions_vocoder = load_vocoder()
 
+# base models are loaded lazily, once per language, and shared by all requests
+# each comes with a batch scheduler, which serializes sampling and batches chunks of concurrent requests
+_emotions_models = {}
+_emotions_models_lock = threading.Lock()
+
+# generated results keyed by reference audio/text content and generation parameters
+EMOTIONS_RESULT_CACHE_SIZE = 100
+_emotions_results = OrderedDict()
+_emotions_results_lock = threading.Lock()
+
 def load_f5tts(language):
     if language.lower() == "spanish":
         ckpt_path = str(cached_path(DEFAULT_Spanish_EMOTIONS_TTS_MODEL_CFG[0]))
@@ -38,7 +49,23 @@ def load_f5tts(language):
     return load_model(DiT, F5TTS_model_cfg, ckpt_path)
 
 
-@lru_cache(maxsize=100)
+def get_f5tts(language):
+    language = language.lower()
+    with _emotions_models_lock:
+        if language not in _emotions_models:
+            ema_model = load_f5tts(language)
+            _emotions_models[language] = ema_model, BatchScheduler(ema_model)
+        return _emotions_models[language]
+
+
+def emotions_cache_key(ref_audio_orig, *params):
+    # the uploaded reference is a fresh temp file per request, so key on its content rather than its path
+    with open(ref_audio_orig, "rb") as f:
+        audio_hash = hashlib.sha256(f.read()).hexdigest()
+    params_hash = hashlib.sha256(json.dumps(params, ensure_ascii=False).encode("utf-8")).hexdigest()
+    return audio_hash, params_hash
+
+
 def emotions(
     ref_audio_orig,
     ref_text,
@@ -49,17 +76,35 @@ def emotions(
     seed,
     cross_fade_duration=0.15,
     nfe_step=32,
-    speed=1
+    speed=1,
+    spectrogram=False,
+    guidance=None,  # GuidanceSchedule (src/English_f5tts/model/guidance.py), None for cfg at every step
     # show_info=None,
     
     ):
-    F5TTS_emotions_ema_model = load_f5tts(language)
+    # returns ((sample_rate, wave), spectrogram artifact id or None, ref_text, seed), see services/spectrograms.py
     if not ref_audio_orig:
         return None, None, ref_text, seed
 
+    # an out of range seed (e.g. -1) asks for a new random sample on every call, so only explicit seeds are cached
+    random_seed = seed < 0 or seed > 2**31 - 1
+    cache_key = None
+    if not random_seed:
+        cache_key = emotions_cache_key(
+            ref_audio_orig, ref_text, gen_text, model, language.lower(), remove_silence, seed, cross_fade_duration,
+            nfe_step, speed, spectrogram, guidance.spec if guidance else "full",
+        )
+        with _emotions_results_lock:
+            if cache_key in _emotions_results:
+                _emotions_results.move_to_end(cache_key)
+                audio, combined_spectrogram, ref_text, used_seed = _emotions_results[cache_key]
+                return audio, spectrogram_store.put(combined_spectrogram) if spectrogram else None, ref_text, used_seed
+
+    F5TTS_emotions_ema_model, batch_scheduler = get_f5tts(language)
+
     # Set inference seed
-    if seed < 0 or seed > 2**31 - 1:
-        seed = np.random.randint(0, 2**31 - 1)
+    if random_seed:
+        seed = int(np.random.randint(0, 2**31 - 1))
     torch.manual_seed(seed)
     used_seed = seed
 
@@ -94,22 +139,25 @@ def emotions(
         emotions_vocoder,
         cross_fade_duration=cross_fade_duration,
         nfe_step=nfe_step,
+        guidance=guidance,
+        seed=seed,
         speed=speed,
+        batch_scheduler=batch_scheduler,
+        return_spectrogram=spectrogram,
     )
 
     # Remove silence
     if remove_silence:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as f:
-            sf.write(f.name, final_wave, final_sample_rate)
-            remove_silence_for_generated_wav(f.name)
-            final_wave, _ = torchaudio.load(f.name)
-        final_wave = final_wave.squeeze().cpu().numpy()
-
-    # Save the spectrogram
-    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp_spectrogram:
-        spectrogram_path = tmp_spectrogram.name
-        save_spectrogram(combined_spectrogram, spectrogram_path)
-
-    return (final_sample_rate, final_wave), spectrogram_path, ref_text, used_seed
+        final_wave = remove_silence_from_wave(final_wave, final_sample_rate)
+
+    # the mel is cached with the audio, each caller gets its own spectrogram artifact
+    if cache_key is not None:
+        with _emotions_results_lock:
+            _emotions_results[cache_key] = (final_sample_rate, final_wave), combined_spectrogram, ref_text, used_seed
+            while len(_emotions_results) > EMOTIONS_RESULT_CACHE_SIZE:
+                _emotions_results.popitem(last=False)
+
+    spectrogram_id = spectrogram_store.put(combined_spectrogram) if spectrogram else None
+    return (final_sample_rate, final_wave), spectrogram_id, ref_text, used_seed
 
 
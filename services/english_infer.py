@@ -1,10 +1,9 @@
 import json
-import tempfile
-import torchaudio
-import soundfile as sf
 from cached_path import cached_path
 from src.English_f5tts.model import DiT
-from src.English_f5tts.infer.utils_infer import (load_vocoder,load_model,preprocess_ref_audio_text,infer_process,remove_silence_for_generated_wav,save_spectrogram)
+from src.English_f5tts.infer.batch_scheduler import BatchScheduler
+from src.English_f5tts.infer.utils_infer import (load_vocoder,load_model,preprocess_ref_audio_text,infer_process,remove_silence_from_wave)
+from services.spectrograms import spectrogram_store
 
 
 DEFAULT_ENGLISH_TTS_MODEL = "F5-TTS_v1"
@@ -21,10 +20,13 @@ F5TTS_ENGLISH_ema_model = load_model(
     json.loads(DEFAULT_ENGLISH_TTS_MODEL_CFG[2]),
     str(cached_path(DEFAULT_ENGLISH_TTS_MODEL_CFG[0])),
 )
+# concurrent /en/tts requests share padded sampling batches on the one model
+english_batch_scheduler = BatchScheduler(F5TTS_ENGLISH_ema_model)
 
 
 
-def english_infer(ref_audio_orig,ref_text,gen_text,model,remove_silence,cross_fade_duration=0.15,nfe_step=32,speed=0.9):
+def english_infer(ref_audio_orig,ref_text,gen_text,model,remove_silence,cross_fade_duration=0.15,nfe_step=32,speed=0.9,spectrogram=False):
+    # returns ((sample_rate, wave), spectrogram artifact id or None), see services/spectrograms.py
     ref_audio, ref_text = preprocess_ref_audio_text(ref_audio_orig, ref_text)
     final_wave, final_sample_rate, combined_spectrogram = infer_process(
         ref_audio,
@@ -35,18 +37,33 @@ def english_infer(ref_audio_orig,ref_text,gen_text,model,remove_silence,cross_fa
         cross_fade_duration=cross_fade_duration,
         nfe_step=nfe_step,
         speed=speed,
+        batch_scheduler=english_batch_scheduler,
+        return_spectrogram=spectrogram,
     )
 
     if remove_silence:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as f:
-            sf.write(f.name, final_wave, final_sample_rate)
-            remove_silence_for_generated_wav(f.name)
-            final_wave, _ = torchaudio.load(f.name)
-        final_wave = final_wave.squeeze().cpu().numpy()
+        final_wave = remove_silence_from_wave(final_wave, final_sample_rate)
 
-    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp_spectrogram:
-        spectrogram_path = tmp_spectrogram.name
-        save_spectrogram(combined_spectrogram, spectrogram_path)
+    spectrogram_id = spectrogram_store.put(combined_spectrogram) if spectrogram else None
 
-    return (final_sample_rate, final_wave), spectrogram_path
+    return (final_sample_rate, final_wave), spectrogram_id
 
+
+
+def english_infer_stream(ref_audio_orig,ref_text,gen_text,cross_fade_duration=0.15,nfe_step=32,speed=0.9,chunk_size=2048):
+    # yields (wave piece, sample rate) as each text chunk is vocoded, for the streaming /en/tts/stream route
+    ref_audio, ref_text = preprocess_ref_audio_text(ref_audio_orig, ref_text)
+    yield from infer_process(
+        ref_audio,
+        ref_text,
+        gen_text,
+        F5TTS_ENGLISH_ema_model,
+        vocoder,
+        progress=None,
+        cross_fade_duration=cross_fade_duration,
+        nfe_step=nfe_step,
+        speed=speed,
+        batch_scheduler=english_batch_scheduler,
+        streaming=True,
+        chunk_size=chunk_size,
+    )
@@ -1,13 +1,12 @@
 
 
 import re
-import tempfile
-import torchaudio
-import soundfile as sf
 from num2words import num2words
 from importlib.resources import files
 from src.Spanish_f5tts.model import spanish_dit, spanish_unett
-from src.Spanish_f5tts.infer.utils_infer import (spanish_load_vocoder,load_spanish_model,preprocess_spanish_ref_audio_text,spanish_infer_process,spanish_remove_silence_for_generated_wav,save_spanish_spectrogram)
+from src.Spanish_f5tts.infer.batch_scheduler import BatchScheduler
+from src.Spanish_f5tts.infer.utils_infer import (spanish_load_vocoder,load_spanish_model,preprocess_spanish_ref_audio_text,spanish_infer_process,spanish_remove_silence_from_wave)
+from services.spectrograms import spectrogram_store
 
 spanish_vocoder = spanish_load_vocoder()
 
@@ -19,6 +18,8 @@ ckpt_path = str(files("src").joinpath("./weights/pruned_model.safetensors"))
 
 F5TTS_SPANISH_ema_model = load_spanish_model(
     spanish_dit, F5TTS_SPANISH_model_cfg, ckpt_path)
+# concurrent /es/tts requests share padded sampling batches on the one model
+spanish_batch_scheduler = BatchScheduler(F5TTS_SPANISH_ema_model)
 
 
 def traducir_numero_a_texto(texto):
@@ -34,19 +35,24 @@ def traducir_numero_a_texto(texto):
     return texto_traducido
 
 
-def spanish_infer(ref_audio_orig, ref_text, gen_text, model, remove_silence,nfe_step,cross_fade_duration=0.15, speed=0.9):
-    # Automatically transcribe the reference audio if ref_text is empty
-    ref_audio, ref_text = preprocess_spanish_ref_audio_text(ref_audio_orig, ref_text)
-
-    ema_model = F5TTS_SPANISH_ema_model
-
+def preparar_gen_text(gen_text):
     # Preprocess gen_text (adding needed padding and punctuation)
     if not gen_text.startswith(" "):
         gen_text = " " + gen_text
     if not gen_text.endswith(". "):
         gen_text += ". "
     gen_text = gen_text.lower()
-    gen_text = traducir_numero_a_texto(gen_text)
+    return traducir_numero_a_texto(gen_text)
+
+
+def spanish_infer(ref_audio_orig, ref_text, gen_text, model, remove_silence,nfe_step,cross_fade_duration=0.15, speed=0.9, spectrogram=False):
+    # returns ((sample_rate, wave), spectrogram artifact id or None), see services/spectrograms.py
+    # Automatically transcribe the reference audio if ref_text is empty
+    ref_audio, ref_text = preprocess_spanish_ref_audio_text(ref_audio_orig, ref_text)
+
+    ema_model = F5TTS_SPANISH_ema_model
+
+    gen_text = preparar_gen_text(gen_text)
 
     # Synthesize the voice, using dummy progress in place of Gradio's Progress
     final_wave, final_sample_rate, combined_spectrogram = spanish_infer_process(
@@ -58,22 +64,36 @@ def spanish_infer(ref_audio_orig, ref_text, gen_text, model, remove_silence,nfe_
         cross_fade_duration=cross_fade_duration,
         nfe_step=nfe_step,
         speed=speed,
+        batch_scheduler=spanish_batch_scheduler,
+        return_spectrogram=spectrogram,
         #show_info=show_info,
         # progress=dummy,  # dummy progress object
     )
 
     # Remove silence if needed
     if remove_silence:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as f:
-            sf.write(f.name, final_wave, final_sample_rate)
-            spanish_remove_silence_for_generated_wav(f.name)
-            final_wave, _ = torchaudio.load(f.name)
-        final_wave = final_wave.squeeze().cpu().numpy()
+        final_wave = spanish_remove_silence_from_wave(final_wave, final_sample_rate)
+
+    # Keep the mel for the spectrogram image only when asked for, it is rendered on retrieval
+    spectrogram_id = spectrogram_store.put(combined_spectrogram) if spectrogram else None
 
-    # Save the spectrogram image (optional, if you want to also return it)
-    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp_spectrogram:
-        spectrogram_path = tmp_spectrogram.name
-        save_spanish_spectrogram(combined_spectrogram, spectrogram_path)
+    return (final_sample_rate, final_wave), spectrogram_id
 
-    return (final_sample_rate, final_wave), spectrogram_path
 
+def spanish_infer_stream(ref_audio_orig, ref_text, gen_text, nfe_step=32, cross_fade_duration=0.15, speed=0.9, chunk_size=2048):
+    # yields (wave piece, sample rate) as each text chunk is vocoded, for the streaming /es/tts/stream route
+    ref_audio, ref_text = preprocess_spanish_ref_audio_text(ref_audio_orig, ref_text)
+    yield from spanish_infer_process(
+        ref_audio,
+        ref_text,
+        preparar_gen_text(gen_text),
+        F5TTS_SPANISH_ema_model,
+        spanish_vocoder,
+        progress=None,
+        cross_fade_duration=cross_fade_duration,
+        nfe_step=nfe_step,
+        speed=speed,
+        batch_scheduler=spanish_batch_scheduler,
+        streaming=True,
+        chunk_size=chunk_size,
+    )
@@ -0,0 +1,60 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import torch
+import torch.nn.functional as F
+from speechbrain.pretrained import SpeakerRecognition
+
+
+SPEAKER_VERIFICATION_SOURCE = "speechbrain/spkrec-ecapa-voxceleb"
+SPEAKER_VERIFICATION_SAVEDIR = "pretrained_models/spkrec-ecapa-voxceleb"
+SPEAKER_VERIFICATION_THRESHOLD = 0.25  # same decision threshold as SpeakerRecognition.verify_files
+EMBEDDING_CACHE_SIZE = 4096  # ECAPA embeddings are 192 floats, so this stays a few MB
+
+
+class SpeakerVerifier:
+    def __init__(self, source=SPEAKER_VERIFICATION_SOURCE, savedir=SPEAKER_VERIFICATION_SAVEDIR,
+                 threshold=SPEAKER_VERIFICATION_THRESHOLD, cache_size=EMBEDDING_CACHE_SIZE):
+        self.model = SpeakerRecognition.from_hparams(source=source, savedir=savedir)
+        self.threshold = threshold
+        self.cache_size = cache_size
+        self._embeddings = OrderedDict()  # audio content hash -> embedding
+        self._lock = threading.Lock()
+
+    def embed_file(self, path):
+        with open(path, "rb") as f:
+            audio_hash = hashlib.sha256(f.read()).hexdigest()
+
+        with self._lock:
+            if audio_hash in self._embeddings:
+                self._embeddings.move_to_end(audio_hash)
+                return self._embeddings[audio_hash]
+
+        waveform = self.model.load_audio(path)  # resampled to the model's 16 kHz
+        with torch.inference_mode():
+            embedding = self.model.encode_batch(waveform.unsqueeze(0)).squeeze().cpu()
+
+        with self._lock:
+            self._embeddings[audio_hash] = embedding
+            while len(self._embeddings) > self.cache_size:
+                self._embeddings.popitem(last=False)
+        return embedding
+
+    def similarity(self, path1, path2):
+        return F.cosine_similarity(self.embed_file(path1), self.embed_file(path2), dim=-1, eps=1e-6).item()
+
+    def verify_files(self, path1, path2):
+        # training samples hit the cache after their first use, so this costs one embedding plus a cosine
+        score = self.similarity(path1, path2)
+        return score, score > self.threshold
+
+    def verify_embedding(self, path, embedding):
+        # embedding precomputed by create_metadata into the project's audio index
+        embedding = torch.as_tensor(embedding, dtype=torch.float32)
+        score = F.cosine_similarity(self.embed_file(path), embedding, dim=-1, eps=1e-6).item()
+        return score, score > self.threshold
+
+
+# loaded once when the routes are imported at startup, shared by /en/synthesize and /es/synthesize
+speaker_verifier = SpeakerVerifier()
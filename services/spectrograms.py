@@ -0,0 +1,71 @@
+import io
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from matplotlib.figure import Figure
+
+
+# spectrograms are opt-in: a synthesis call that asks for one only stores its mel here and returns an artifact id,
+# the PNG is rendered on first retrieval in a background worker and kept with the artifact
+MAX_SPECTROGRAMS = 256  # artifacts kept in memory, least recently used are dropped first
+SPECTROGRAM_WORKERS = 1  # renders are serialized, matplotlib is not meant for concurrent use
+
+
+def render_spectrogram(spectrogram):
+    # PNG bytes, drawn on a standalone Figure (no pyplot global state, nothing written to disk)
+    fig = Figure(figsize=(12, 4))
+    ax = fig.subplots()
+    image = ax.imshow(spectrogram, origin="lower", aspect="auto")
+    fig.colorbar(image, ax=ax)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+class _Artifact:
+    __slots__ = ("mel", "future")
+
+    def __init__(self, mel):
+        self.mel = mel
+        self.future = None
+
+
+class SpectrogramStore:
+    def __init__(self, max_entries=MAX_SPECTROGRAMS, workers=SPECTROGRAM_WORKERS):
+        self.max_entries = max_entries
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="spectrogram")
+        self._lock = threading.Lock()
+        self._artifacts = OrderedDict()  # id -> _Artifact, least recently used first
+
+    def put(self, mel):
+        # mel "d n" as returned by infer_process(..., return_spectrogram=True), no rendering happens here
+        if mel is None:
+            return None
+        artifact_id = uuid.uuid4().hex
+        with self._lock:
+            self._artifacts[artifact_id] = _Artifact(mel)
+            while len(self._artifacts) > self.max_entries:
+                self._artifacts.popitem(last=False)
+        return artifact_id
+
+    def render(self, artifact_id):
+        # Future of the PNG bytes, None for an unknown or evicted id
+        with self._lock:
+            artifact = self._artifacts.get(artifact_id)
+            if artifact is None:
+                return None
+            self._artifacts.move_to_end(artifact_id)
+            if artifact.future is None:
+                artifact.future = self._executor.submit(render_spectrogram, artifact.mel)
+                artifact.future.add_done_callback(lambda _, artifact=artifact: setattr(artifact, "mel", None))
+            return artifact.future
+
+    def get(self, artifact_id, timeout=None):
+        # PNG bytes in memory, None for an unknown or evicted id
+        future = self.render(artifact_id)
+        return None if future is None else future.result(timeout=timeout)
+
+
+spectrogram_store = SpectrogramStore()
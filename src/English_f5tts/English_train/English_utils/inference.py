@@ -1,8 +1,10 @@
 from importlib.resources import files
 import platform
+import random
 import sys
-import tempfile
 from src.English_f5tts.api import F5TTS
+from src.English_f5tts.infer.model_registry import model_registry, registry_key
+from src.English_f5tts.infer.utils_infer import remove_silence_from_wave
 from asyncio.log import logger
 import os
 
@@ -11,78 +13,123 @@ import os
 training_process = None
 system = platform.system()
 python_executable = sys.executable or "python"
-tts_api = None
-last_checkpoint = ""
-last_device = ""
-last_ema = None
 stop_signal = False
+batch_requests = True  # concurrent requests on one checkpoint share padded sampling batches
+quantize = False  # int8 dynamic quantization of DiT and Vocos, for cpu-only hosts (int8 weights cached by checkpoint)
+dtype = "auto"  # DiT precision, auto picks bf16 on cpus with avx512_bf16 / amx (ignored when quantize is set)
+compile_dit = False  # torch.compile'd DiT with duration buckets, all bucket graphs built when a checkpoint loads
+fuse_projections = True  # fused qkv and adaptive norm GEMMs for sampling, same outputs up to float rounding
 path_data = str(files("src").joinpath("./English_data"))
 path_project_ckpts = str(files("src").joinpath("./English_ckpts"))
 file_train = str(files("src.English_f5tts.English_train").joinpath("finetune_cli.py"))
 
 
+def _use_tts_api(project, file_checkpoint, exp_name, use_ema):
+    # device_test logic might need adjustment based on 'training_process'
+    device_test = "cpu" if training_process is not None else None
+
+    # 'path_data' is crucial here
+    vocab_file = os.path.join(path_data, project, "vocab.txt")
+    if not os.path.isfile(vocab_file):
+        logger.error(f"Vocabulary file not found: {vocab_file}")
+        # Consider how to handle this error; F5TTS might fail.
+        # For now, F5TTS will likely raise an error if vocab_file is missing.
+
+    def load_tts_api():
+        logger.info(f"Initializing F5TTS with: model={exp_name}, ckpt={file_checkpoint}, vocab={vocab_file}, device={device_test}, ema={use_ema}")
+        return F5TTS(
+            model=exp_name,
+            ckpt_file=file_checkpoint,
+            vocab_file=vocab_file,
+            device=device_test,
+            use_ema=use_ema,
+            batch_requests=batch_requests,
+            quantize=quantize,
+            dtype=dtype,
+            compile_dit=compile_dit,
+            fuse_projections=fuse_projections,
+        )
+
+    key = registry_key(file_checkpoint, use_ema=use_ema, dtype="int8" if quantize else dtype, device=device_test)
+    return model_registry.use(key, load_tts_api, exclusive=not batch_requests)
+
+
 def infer(
-    project, file_checkpoint, exp_name, ref_text, ref_audio, gen_text, nfe_step, use_ema, speed, seed, remove_silence
+    project,
+    file_checkpoint,
+    exp_name,
+    ref_text,
+    ref_audio,
+    gen_text,
+    nfe_step,
+    use_ema,
+    speed,
+    seed,
+    remove_silence,
+    guidance=None,
 ):
-    global last_checkpoint, last_device, tts_api, last_ema, training_process, path_data
+    global training_process, path_data
 
     if not os.path.isfile(file_checkpoint):
         # It's better to raise an error or return a specific error indicator
         logger.error(f"Checkpoint not found: {file_checkpoint}")
         return None, "checkpoint not found!", None # Match tuple structure
 
-    # device_test logic might need adjustment based on 'training_process'
-    device_test = "cpu" if training_process is not None else None 
-
-    if last_checkpoint != file_checkpoint or last_device != device_test or last_ema != use_ema or tts_api is None:
-        if last_checkpoint != file_checkpoint:
-            last_checkpoint = file_checkpoint
-        if last_device != device_test:
-            last_device = device_test
-        if last_ema != use_ema:
-            last_ema = use_ema
-        
-        # 'path_data' is crucial here
-        vocab_file = os.path.join(path_data, project, "vocab.txt")
-        if not os.path.isfile(vocab_file):
-            logger.error(f"Vocabulary file not found: {vocab_file}")
-            # Consider how to handle this error; F5TTS might fail.
-            # For now, F5TTS will likely raise an error if vocab_file is missing.
-
-        logger.info(f"Initializing F5TTS with: model={exp_name}, ckpt={file_checkpoint}, vocab={vocab_file}, device={device_test}, ema={use_ema}")
-        tts_api = F5TTS(
-            model=exp_name, ckpt_file=file_checkpoint, vocab_file=vocab_file, device=device_test, use_ema=use_ema
-        )
-        logger.info(f"F5TTS API updated. Device: {device_test}, Checkpoint: {file_checkpoint}, EMA: {use_ema}")
-
     if seed == -1:  # -1 used for random
-        actual_seed = None
+        # resolved here, the shared F5TTS instance's .seed may be overwritten by a concurrent request
+        actual_seed = random.randint(0, sys.maxsize)
     else:
         actual_seed = seed
 
-    # Create a temporary file for the output, ensuring it's deleted after.
-    # The infer method of tts_api writes to f.name.
-    # We will return f.name and let the caller (synthesize route) handle sending and cleanup.
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as f_out:
-        output_wav_path = f_out.name
-    
+    # The audio stays in memory, the caller (synthesize route) encodes it in the requested format.
     try:
-        tts_api.infer(
+        with _use_tts_api(project, file_checkpoint, exp_name, use_ema) as tts_api:
+            wave, sample_rate, _ = tts_api.infer(
+                ref_file=ref_audio,
+                ref_text=ref_text.lower().strip(),
+                gen_text=gen_text.lower().strip(),
+                nfe_step=nfe_step,
+                guidance=guidance,
+                speed=speed,
+                seed=actual_seed,
+                return_spectrogram=False,
+            )
+        if remove_silence:
+            wave = remove_silence_from_wave(wave, sample_rate)
+        logger.info(f"Inference successful. Device: {tts_api.device}, Seed used: {actual_seed}")
+        return (sample_rate, wave), str(tts_api.device), str(actual_seed)
+    except Exception as e:
+        logger.error(f"Error during tts_api.infer: {e}", exc_info=True)
+        raise # Re-raise the exception to be caught by the route
+
+
+def infer_stream(
+    project,
+    file_checkpoint,
+    exp_name,
+    ref_text,
+    ref_audio,
+    gen_text,
+    nfe_step,
+    use_ema,
+    speed,
+    seed,
+    chunk_size=2048,
+    guidance=None,
+):
+    # generator of (wave piece, sample rate), the model stays checked out of the registry until it is exhausted
+    if seed == -1:  # -1 used for random
+        seed = random.randint(0, sys.maxsize)
+
+    with _use_tts_api(project, file_checkpoint, exp_name, use_ema) as tts_api:
+        logger.info(f"Streaming inference. Device: {tts_api.device}, Seed used: {seed}")
+        yield from tts_api.infer_stream(
             ref_file=ref_audio,
             ref_text=ref_text.lower().strip(),
             gen_text=gen_text.lower().strip(),
             nfe_step=nfe_step,
+            guidance=guidance,
             speed=speed,
-            remove_silence=remove_silence,
-            file_wave=output_wav_path,
-            seed=actual_seed,
+            chunk_size=chunk_size,
+            seed=seed,
         )
-        # tts_api.seed will be updated by the infer call if seed was None
-        returned_seed = tts_api.seed if hasattr(tts_api, 'seed') else actual_seed 
-        logger.info(f"Inference successful. Output: {output_wav_path}, Device: {tts_api.device}, Seed used: {returned_seed}")
-        return output_wav_path, str(tts_api.device), str(returned_seed)
-    except Exception as e:
-        logger.error(f"Error during tts_api.infer: {e}", exc_info=True)
-        if os.path.exists(output_wav_path):
-            os.remove(output_wav_path) # Clean up temp file on error
-        raise # Re-raise the exception to be caught by the route
@@ -34,6 +34,14 @@ def get_audio_duration(audio_path):
         raise # Re-raise the exception to be caught by the caller
 
 
+def get_audio_stats(audio_path):
+    # duration and rms from a single decode, for the metadata and the project audio index
+    audio, sample_rate = torchaudio.load(audio_path)
+    duration = audio.shape[1] / sample_rate
+    rms = audio.pow(2).mean().sqrt().item()
+    return duration, rms
+
+
 
 def clear_text(text):
     # logger.debug(f"Clearing text: '{text}'")
@@ -215,12 +223,13 @@ def format_seconds_to_hms(seconds):
     return "{:02d}:{:02d}:{:02d}".format(hours, minutes, int(seconds_val))
 
 
-def create_metadata(name_project, ch_tokenizer):
+def create_metadata(name_project, ch_tokenizer, embed_fn=None):
     path_project = os.path.join(path_data, name_project)
     path_project_wavs = os.path.join(path_project, "wavs")
     file_metadata_csv = os.path.join(path_project, "metadata.csv") # Source CSV from transcribe_all
     file_arrow_output = os.path.join(path_project, "raw.arrow")
     file_duration_json = os.path.join(path_project, "duration.json")
+    file_audio_index_json = os.path.join(path_project, "audio_index.json")
     file_vocab_txt = os.path.join(path_project, "vocab.txt")
 
     if not os.path.isfile(file_metadata_csv):
@@ -237,6 +246,7 @@ def create_metadata(name_project, ch_tokenizer):
     text_list = []
     duration_list = []
     result_for_arrow = []
+    audio_index = []
     error_files_detail = []
     text_vocab_set = set()
     total_lines = len(lines)
@@ -259,7 +269,7 @@ def create_metadata(name_project, ch_tokenizer):
             error_files_detail.append([file_audio_full_path, "missing audio file"])
             continue
         try:
-            duration = get_audio_duration(file_audio_full_path)
+            duration, rms = get_audio_stats(file_audio_full_path)
         except Exception as e_dur:
             print(f"Could not get duration for '{file_audio_full_path}': {e_dur}")
             error_files_detail.append([file_audio_full_path, f"duration error: {e_dur}"])
@@ -289,6 +299,20 @@ def create_metadata(name_project, ch_tokenizer):
         duration_list.append(duration)
         text_list.append(text_pinyin)
         result_for_arrow.append({"audio_path": file_audio_full_path, "text": text_pinyin, "duration": duration})
+        embedding = None
+        if embed_fn is not None:
+            try:
+                embedding = [float(v) for v in embed_fn(file_audio_full_path)]
+            except Exception as e_embed:
+                print(f"Could not compute speaker embedding for '{file_audio_full_path}': {e_embed}")
+        audio_index.append({
+            "name": name_audio,
+            "audio_path": file_audio_full_path,
+            "duration": duration,
+            "rms": rms,
+            "text": text_cleaned,
+            "embedding": embedding,
+        })
         if ch_tokenizer:
             text_vocab_set.update(list(text_pinyin)) # Use pinyin for vocab if ch_tokenizer is true
 
@@ -321,6 +345,12 @@ def create_metadata(name_project, ch_tokenizer):
         json.dump({"duration": duration_list}, f_json, ensure_ascii=False, indent=2)
     print(f"Successfully wrote duration JSON: {file_duration_json}")
 
+    # per-sample features, lets the synthesize routes pick a reference clip without decoding any audio
+    print(f"Writing audio index to JSON: {file_audio_index_json}")
+    with open(file_audio_index_json, "w") as f_json:
+        json.dump({"samples": audio_index}, f_json, ensure_ascii=False)
+    print(f"Successfully wrote audio index JSON: {file_audio_index_json}")
+
     new_vocal_content = ""
     vocab_size = 0
     if not ch_tokenizer:
@@ -354,7 +384,8 @@ def create_metadata(name_project, ch_tokenizer):
         f"Min segment duration: {min_second}s, Max segment duration: {max_second}s.\n"
         f"Arrow data file created at: {file_arrow_output}.\n"
         f"Vocabulary file created at: {file_vocab_txt} (Size: {vocab_size}).\n"
-        f"Duration JSON created at: {file_duration_json}."
+        f"Duration JSON created at: {file_duration_json}.\n"
+        f"Audio index created at: {file_audio_index_json}."
     )
     status_val = "success"
     if error_files_detail:
@@ -375,6 +406,7 @@ def create_metadata(name_project, ch_tokenizer):
         "vocab_file_path": file_vocab_txt,
         "vocab_size": vocab_size,
         "duration_json_path": file_duration_json,
+        "audio_index_path": file_audio_index_json,
         "error_details_count": len(error_files_detail),
         "error_details_summary": error_text_summary
     }, new_vocal_content
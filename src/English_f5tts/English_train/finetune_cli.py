@@ -3,10 +3,12 @@ import os
 import shutil
 from importlib.resources import files
 
+import torch
 from cached_path import cached_path
 
 from English_f5tts.model import CFM, DiT, Trainer, UNetT
 from English_f5tts.model.dataset import load_dataset
+from English_f5tts.model.precision import mixed_precision_of
 from English_f5tts.model.utils import get_tokenizer
 
 
@@ -71,6 +73,14 @@ def parse_args():
         action="store_true",
         help="Use 8-bit Adam optimizer from bitsandbytes",
     )
+    parser.add_argument(
+        "--dtype",
+        type=str,
+        default=None,
+        choices=["auto", "fp32", "fp16", "bf16"],
+        help="Mixed precision autocast dtype, auto picks bf16 on cpus with avx512_bf16 / amx "
+        "(default: accelerate launch --mixed_precision)",
+    )
 
     return parser.parse_args()
 
@@ -181,6 +191,13 @@ def main():
         vocab_char_map=vocab_char_map,
     )
 
+    accelerate_kwargs = dict()
+    if args.dtype is not None:
+        # fp32 master weights either way, the forward / backward run under autocast
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        accelerate_kwargs["mixed_precision"] = mixed_precision_of(args.dtype, device)
+        print("\nmixed precision : ", accelerate_kwargs["mixed_precision"])
+
     trainer = Trainer(
         model,
         args.epochs,
@@ -201,6 +218,7 @@ def main():
         log_samples=args.log_samples,
         last_per_updates=args.last_per_updates,
         bnb_optimizer=args.bnb_optimizer,
+        accelerate_kwargs=accelerate_kwargs,
     )
 
     train_dataset = load_dataset(args.dataset_name, tokenizer, mel_spec_kwargs=mel_spec_kwargs)
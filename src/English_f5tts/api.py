@@ -8,12 +8,15 @@ from cached_path import cached_path
 from hydra.utils import get_class
 from omegaconf import OmegaConf
 
+from English_f5tts.infer.batch_scheduler import BatchScheduler
+from English_f5tts.infer.compiled import warmup_model
+from English_f5tts.infer.onnx_backend import load_onnx_model, load_onnx_vocoder
 from English_f5tts.infer.utils_infer import (
     infer_process,
     load_model,
     load_vocoder,
     preprocess_ref_audio_text,
-    remove_silence_for_generated_wav,
+    remove_silence_from_wave,
     save_spectrogram,
     transcribe,
 )
@@ -31,7 +34,16 @@ class F5TTS:
         vocoder_local_path=None,
         device=None,
         hf_cache_dir=None,
+        batch_requests=False,
+        quantize=False,
+        dtype="auto",
+        compile_dit=False,
+        fuse_projections=False,
+        backend="torch",
+        onnx_dir=None,
     ):
+        if backend not in ("torch", "onnx"):
+            raise ValueError(f"Unknown backend '{backend}', expected 'torch' or 'onnx'")
         model_cfg = OmegaConf.load(str(files("src.English_f5tts").joinpath(f"configs/{model}.yaml")))
         model_cls = get_class(f"English_f5tts.model.{model_cfg.model.backbone}")
         model_arc = model_cfg.model.arch
@@ -57,9 +69,21 @@ class F5TTS:
                 else "cpu"
             )
 
+        if backend == "onnx":
+            # DiT steps and the Vocos decoder on onnxruntime's cpu provider, onnx_dir as written by infer/onnx_export.py
+            self.device, self.mel_spec_type = "cpu", "vocos"
+            self.vocoder = load_onnx_vocoder(onnx_dir)
+            self.ema_model = load_onnx_model(onnx_dir, self.ode_method)
+            self.batch_scheduler = BatchScheduler(self.ema_model) if batch_requests else None
+            return
+
         # Load models
+        # quantize: int8 dynamic quantization of the DiT and Vocos linear layers for cpu hosts
+        # dtype: DiT precision, "auto" / "fp32" / "fp16" / "bf16" (model/precision.py), the vocoder stays fp32
+        # compile_dit: torch.compile the DiT with duration buckets, every bucket's graph is built here (warm-up)
+        # fuse_projections: fused qkv and one adaptive norm GEMM per DiT step (DiT.fuse_projections_)
         self.vocoder = load_vocoder(
-            self.mel_spec_type, vocoder_local_path is not None, vocoder_local_path, self.device, hf_cache_dir
+            self.mel_spec_type, vocoder_local_path is not None, vocoder_local_path, self.device, hf_cache_dir, quantize
         )
 
         repo_name, ckpt_step, ckpt_type = "F5-TTS", 1250000, "safetensors"
@@ -80,17 +104,38 @@ class F5TTS:
                 cached_path(f"hf://SWivid/{repo_name}/{model}/model_{ckpt_step}.{ckpt_type}", cache_dir=hf_cache_dir)
             )
         self.ema_model = load_model(
-            model_cls, model_arc, ckpt_file, self.mel_spec_type, vocab_file, self.ode_method, self.use_ema, self.device
+            model_cls,
+            model_arc,
+            ckpt_file,
+            self.mel_spec_type,
+            vocab_file,
+            self.ode_method,
+            self.use_ema,
+            self.device,
+            quantize=quantize,
+            dtype=dtype,
+            compile_dit=compile_dit,
+            fuse=fuse_projections,
         )
+        if compile_dit:
+            print("compiled buckets : ", warmup_model(self.ema_model))
+
+        # concurrent infer calls on this instance share padded sampling batches
+        self.batch_scheduler = BatchScheduler(self.ema_model) if batch_requests else None
+
+    def compile_stats(self):
+        # graph / recompile counters of the compiled DiT, None when not compiled
+        compiled = getattr(self.ema_model.transformer, "compiled_blocks", None)
+        return None if compiled is None else compiled.stats()
 
     def transcribe(self, ref_audio, language=None):
         return transcribe(ref_audio, language)
 
     def export_wav(self, wav, file_wave, remove_silence=False):
-        sf.write(file_wave, wav, self.target_sample_rate)
-
         if remove_silence:
-            remove_silence_for_generated_wav(file_wave)
+            wav = remove_silence_from_wave(wav, self.target_sample_rate)
+
+        sf.write(file_wave, wav, self.target_sample_rate)
 
     def export_spectrogram(self, spec, file_spec):
         save_spectrogram(spec, file_spec)
@@ -105,6 +150,8 @@ class F5TTS:
         target_rms=0.1,
         cross_fade_duration=0.15,
         sway_sampling_coef=-1,
+        skip_threshold=0.0,
+        guidance=None,
         cfg_strength=2,
         nfe_step=32,
         speed=1.0,
@@ -113,6 +160,7 @@ class F5TTS:
         file_wave=None,
         file_spec=None,
         seed=None,
+        return_spectrogram=True,
     ):
         if seed is None:
             seed = random.randint(0, sys.maxsize)
@@ -135,9 +183,14 @@ class F5TTS:
             nfe_step=nfe_step,
             cfg_strength=cfg_strength,
             sway_sampling_coef=sway_sampling_coef,
+            skip_threshold=skip_threshold,
+            guidance=guidance,
+            seed=seed,
             speed=speed,
             fix_duration=fix_duration,
             device=self.device,
+            batch_scheduler=self.batch_scheduler,
+            return_spectrogram=return_spectrogram or file_spec is not None,
         )
 
         if file_wave is not None:
@@ -148,6 +201,58 @@ class F5TTS:
 
         return wav, sr, spec
 
+    def infer_stream(
+        self,
+        ref_file,
+        ref_text,
+        gen_text,
+        show_info=print,
+        progress=None,
+        target_rms=0.1,
+        cross_fade_duration=0.15,
+        sway_sampling_coef=-1,
+        skip_threshold=0.0,
+        guidance=None,
+        cfg_strength=2,
+        nfe_step=32,
+        speed=1.0,
+        fix_duration=None,
+        chunk_size=2048,
+        seed=None,
+    ):
+        # yields (wave piece, sample rate) per vocoded text chunk, no silence removal or spectrogram
+        if seed is None:
+            seed = random.randint(0, sys.maxsize)
+        seed_everything(seed)
+        self.seed = seed
+
+        ref_file, ref_text = preprocess_ref_audio_text(ref_file, ref_text)
+
+        yield from infer_process(
+            ref_file,
+            ref_text,
+            gen_text,
+            self.ema_model,
+            self.vocoder,
+            self.mel_spec_type,
+            show_info=show_info,
+            progress=progress,
+            target_rms=target_rms,
+            cross_fade_duration=cross_fade_duration,
+            nfe_step=nfe_step,
+            cfg_strength=cfg_strength,
+            sway_sampling_coef=sway_sampling_coef,
+            skip_threshold=skip_threshold,
+            guidance=guidance,
+            seed=seed,
+            speed=speed,
+            fix_duration=fix_duration,
+            device=self.device,
+            batch_scheduler=self.batch_scheduler,
+            streaming=True,
+            chunk_size=chunk_size,
+        )
+
 
 if __name__ == "__main__":
     f5tts = F5TTS()
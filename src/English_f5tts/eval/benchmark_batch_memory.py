@@ -0,0 +1,122 @@
+# Peak memory of padded batch sampling on CPU
+# Peak RSS only grows within a process, so every measurement runs in its own subprocess. First one masked attention
+# call with the key-padding mask expanded to "b h n n" (as before) against the broadcast "b 1 1 n" mask, then a full
+# batched CFM.sample with mixed target durations at each batch size
+# python src/English_f5tts/eval/benchmark_batch_memory.py --batch_sizes 4 8 16 --frames 2048
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import torch
+import torch.nn.functional as F
+
+from English_f5tts.eval.utils_benchmark import (
+    load_ref_audio,
+    load_tts,
+    peak_rss_mb,
+    print_table,
+    ref_text,
+    set_threads,
+)
+
+
+parser = argparse.ArgumentParser(description="Benchmark peak RSS of padded batch sampling on CPU.")
+parser.add_argument("--batch_sizes", type=int, nargs="+", default=[4, 8, 16])
+parser.add_argument("--frames", type=int, default=2048, help="longest target duration in the batch, in mel frames")
+parser.add_argument("--heads", type=int, default=16)
+parser.add_argument("--dim_head", type=int, default=64)
+parser.add_argument("--nfe_step", type=int, default=4, help="peak memory does not depend on the number of steps")
+parser.add_argument("--threads", type=int, default=0)
+parser.add_argument("--worker", type=str, default="", help=argparse.SUPPRESS)
+args = parser.parse_args()
+
+
+def durations_of(batch):
+    # evenly spread between half and all of --frames, so every row but one is padded
+    return [args.frames // 2 + (args.frames - args.frames // 2) * (i + 1) // batch for i in range(batch)]
+
+
+def attention_worker(batch, expanded):
+    # one masked attention call shaped like AttnProcessor's, cfg folded (batch doubled)
+    batch *= 2
+    q, k, v = (torch.randn(batch, args.heads, args.frames, args.dim_head) for _ in range(3))
+    lens = torch.tensor(durations_of(batch // 2) * 2)
+    mask = torch.arange(args.frames)[None, :] < lens[:, None]
+    attn_mask = mask.unsqueeze(1).unsqueeze(1)
+    if expanded:
+        attn_mask = attn_mask.expand(batch, args.heads, args.frames, args.frames)
+
+    base = peak_rss_mb()
+    start = time.perf_counter()
+    with torch.inference_mode():
+        F.scaled_dot_product_attention(q, k, v, attn_mask=attn_mask, dropout_p=0.0, is_causal=False)
+    return dict(peak_mb=peak_rss_mb() - base, seconds=time.perf_counter() - start)
+
+
+def sample_worker(batch):
+    tts = load_tts(device="cpu", dtype="fp32")
+    audio, _ = load_ref_audio()
+    text = ref_text + " " + "I've been a silent spectator, watching species evolve. " * (args.frames // 256)
+    with torch.inference_mode():
+        cond = tts.ema_model.mel_spec(audio).permute(0, 2, 1)
+
+    base = peak_rss_mb()
+    start = time.perf_counter()
+    with torch.inference_mode():
+        tts.ema_model.sample(
+            cond=cond.expand(batch, -1, -1),
+            text=[text] * batch,
+            duration=torch.tensor(durations_of(batch)),
+            steps=args.nfe_step,
+            cfg_strength=2.0,
+            sway_sampling_coef=-1.0,
+            seed=0,
+        )
+    return dict(peak_mb=peak_rss_mb() - base, seconds=time.perf_counter() - start)
+
+
+def run_worker(**kwargs):
+    command = [sys.executable, __file__, "--worker", json.dumps(kwargs)]
+    command += ["--frames", str(args.frames), "--heads", str(args.heads), "--dim_head", str(args.dim_head)]
+    command += ["--nfe_step", str(args.nfe_step), "--threads", str(args.threads)]
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    set_threads(args.threads)
+    if args.worker:
+        kwargs = json.loads(args.worker)
+        kind = kwargs.pop("kind")
+        result = attention_worker(**kwargs) if kind == "attention" else sample_worker(**kwargs)
+        print(json.dumps(result))
+        return
+
+    rows = []
+    for batch in args.batch_sizes:
+        expanded = run_worker(kind="attention", batch=batch, expanded=True)
+        broadcast = run_worker(kind="attention", batch=batch, expanded=False)
+        rows.append(
+            dict(
+                batch=batch,
+                expanded_mb=f"{expanded['peak_mb']:.0f}",
+                broadcast_mb=f"{broadcast['peak_mb']:.0f}",
+                expanded_ms=f"{expanded['seconds'] * 1000:.0f}",
+                broadcast_ms=f"{broadcast['seconds'] * 1000:.0f}",
+            )
+        )
+    print(f"one attention call, {args.heads} heads x {args.frames} frames, cfg folded:")
+    print_table(rows, ["batch", "expanded_mb", "broadcast_mb", "expanded_ms", "broadcast_ms"])
+
+    rows = []
+    for batch in args.batch_sizes:
+        result = run_worker(kind="sample", batch=batch)
+        rows.append(dict(batch=batch, peak_mb=f"{result['peak_mb']:.0f}", seconds=f"{result['seconds']:.2f}"))
+    print(f"CFM.sample, durations {args.frames // 2}..{args.frames} frames, {args.nfe_step} steps:")
+    print_table(rows, ["batch", "peak_mb", "seconds"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Per-step CFG as two DiT forwards vs one forward on a doubled batch, CPU batch 1
+# python src/English_f5tts/eval/benchmark_cfg_folding.py --nfe_step 16 32 --threads 8
+import argparse
+
+import torch
+
+from English_f5tts.eval.utils_benchmark import (
+    gen_text_of,
+    load_ref_audio,
+    load_tts,
+    print_table,
+    ref_text,
+    set_threads,
+    timeit,
+)
+from English_f5tts.infer.utils_infer import hop_length
+from English_f5tts.model.utils import convert_char_to_pinyin
+
+
+parser = argparse.ArgumentParser(description="Benchmark folded classifier-free guidance on CPU.")
+parser.add_argument("--nfe_step", type=int, nargs="+", default=[16, 32])
+parser.add_argument("--sentences", type=int, default=2)
+parser.add_argument("--repeat", type=int, default=3)
+parser.add_argument("--threads", type=int, default=0)
+args = parser.parse_args()
+
+
+def main():
+    set_threads(args.threads)
+    tts = load_tts(device="cpu")
+    model = tts.ema_model
+    audio, sr = load_ref_audio()
+
+    gen_text = gen_text_of(args.sentences)
+    text = convert_char_to_pinyin([ref_text + " " + gen_text])
+    ref_len = audio.shape[-1] // hop_length
+    duration = ref_len + int(ref_len / len(ref_text.encode("utf-8")) * len(gen_text.encode("utf-8")))
+
+    rows = []
+    for nfe_step in args.nfe_step:
+        row = dict(nfe_step=nfe_step, frames=duration)
+        outputs = {}
+        for name, fold_cfg in (("two_pass", False), ("folded", True)):
+            model.fold_cfg = fold_cfg
+
+            def run():
+                with torch.inference_mode():
+                    return model.sample(
+                        cond=audio, text=text, duration=duration, steps=nfe_step, cfg_strength=2.0,
+                        sway_sampling_coef=-1.0, seed=0,
+                    )[0]
+
+            seconds, outputs[name] = timeit(run, repeat=args.repeat)
+            row[f"{name}_s"] = f"{seconds:.2f}"
+            row[f"{name}_ms_per_step"] = f"{seconds / nfe_step * 1000:.1f}"
+        row["speedup"] = f"{float(row['two_pass_s']) / float(row['folded_s']):.2f}x"
+        row["max_abs_diff"] = f"{(outputs['two_pass'] - outputs['folded']).abs().max().item():.2e}"
+        rows.append(row)
+
+    print_table(
+        rows,
+        ["nfe_step", "frames", "two_pass_s", "folded_s", "two_pass_ms_per_step", "folded_ms_per_step", "speedup",
+         "max_abs_diff"],
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# Chunk count vs latency of infer_batch_process, batched chunk sampling against one chunk after the other
+# python src/English_f5tts/eval/benchmark_chunk_batching.py --sentences 1 2 4 8
+import argparse
+
+import torch
+
+from English_f5tts.eval.utils_benchmark import (
+    gen_text_of,
+    load_ref_audio,
+    load_tts,
+    print_table,
+    ref_text,
+    set_threads,
+    timeit,
+)
+from English_f5tts.infer.utils_infer import chunk_text, infer_batch_process
+
+
+parser = argparse.ArgumentParser(description="Benchmark batched multi-chunk sampling on CPU.")
+parser.add_argument("--sentences", type=int, nargs="+", default=[1, 2, 4, 8])
+parser.add_argument("--max_chars", type=int, default=100, help="chunk size in characters, small to force chunking")
+parser.add_argument("--nfe_step", type=int, default=16)
+parser.add_argument("--repeat", type=int, default=3)
+parser.add_argument("--threads", type=int, default=0)
+args = parser.parse_args()
+
+
+def main():
+    set_threads(args.threads)
+    tts = load_tts(device="cpu")
+    audio, sr = load_ref_audio()
+
+    rows = []
+    for sentences in args.sentences:
+        gen_text_batches = chunk_text(gen_text_of(sentences), max_chars=args.max_chars)
+        row = dict(sentences=sentences, chunks=len(gen_text_batches))
+        for name, batch_chunks in (("batched", True), ("sequential", False)):
+
+            def run():
+                torch.manual_seed(0)
+                return next(
+                    infer_batch_process(
+                        (audio, sr),
+                        ref_text,
+                        gen_text_batches,
+                        tts.ema_model,
+                        tts.vocoder,
+                        mel_spec_type=tts.mel_spec_type,
+                        progress=None,
+                        nfe_step=args.nfe_step,
+                        device="cpu",
+                        batch_chunks=batch_chunks,
+                    )
+                )
+
+            seconds, (wave, _, _) = timeit(run, repeat=args.repeat)
+            row[f"{name}_s"] = f"{seconds:.2f}"
+            row[f"{name}_rtf"] = f"{seconds / (len(wave) / sr):.3f}"
+        row["speedup"] = f"{float(row['sequential_s']) / float(row['batched_s']):.2f}x"
+        rows.append(row)
+
+    print_table(rows, ["sentences", "chunks", "batched_s", "sequential_s", "batched_rtf", "sequential_rtf", "speedup"])
+
+
+if __name__ == "__main__":
+    main()
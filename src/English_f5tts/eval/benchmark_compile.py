@@ -0,0 +1,100 @@
+# torch.compile'd DiT with duration buckets against eager sampling on CPU
+# Reports the warm-up cost, per-step latency at each bucket, end-to-end latency at several text lengths (each one
+# lands in some bucket, so no request should compile after warm-up) and the output difference to eager sampling
+# python src/English_f5tts/eval/benchmark_compile.py --sentences 1 2 4 8
+import argparse
+import copy
+import time
+
+import torch
+
+from English_f5tts.eval.utils_benchmark import (
+    gen_text_of,
+    load_ref_audio,
+    load_tts,
+    print_table,
+    ref_text,
+    set_threads,
+    timeit,
+)
+from English_f5tts.infer.compiled import bucket_for, compile_model_, duration_buckets, warmup_model
+from English_f5tts.infer.utils_infer import hop_length
+
+
+parser = argparse.ArgumentParser(description="Benchmark the compiled, duration bucketed DiT on CPU.")
+parser.add_argument("--sentences", type=int, nargs="+", default=[1, 2, 4, 8])
+parser.add_argument("--buckets", type=int, nargs="+", default=list(duration_buckets))
+parser.add_argument("--nfe_step", type=int, default=32)
+parser.add_argument("--repeat", type=int, default=3)
+parser.add_argument("--threads", type=int, default=0)
+args = parser.parse_args()
+
+
+def step_ms(fn, dit, frames, batch):
+    x = torch.randn(batch, frames, dit.dim)
+    t = torch.randn(batch, dit.dim)
+    mask = torch.ones(batch, frames, dtype=torch.bool)
+    rope = dit.rotary_embed.forward_from_seq_len(frames)
+
+    def run():
+        with torch.no_grad():
+            return fn(x, t, mask, rope)
+
+    return timeit(run, repeat=args.repeat)[0] * 1000
+
+
+def main():
+    set_threads(args.threads)
+    tts = load_tts(device="cpu", dtype="fp32")
+    eager = tts.ema_model
+    compiled = copy.deepcopy(eager)
+    blocks = compile_model_(compiled, buckets=args.buckets)
+
+    start = time.perf_counter()
+    warmup_model(compiled)
+    print(f"warm-up of {len(blocks.buckets)} buckets: {time.perf_counter() - start:.1f}s, {blocks.stats()}")
+
+    batch = 2 if eager.fold_cfg else 1
+    rows = []
+    for frames in blocks.buckets:
+        eager_ms = step_ms(eager.transformer.run_blocks, eager.transformer, frames, batch)
+        compiled_ms = step_ms(blocks, compiled.transformer, frames, batch)
+        rows.append(
+            dict(
+                bucket=frames,
+                eager_ms=f"{eager_ms:.1f}",
+                compiled_ms=f"{compiled_ms:.1f}",
+                speedup=f"{eager_ms / compiled_ms:.2f}x",
+            )
+        )
+    print_table(rows, ["bucket", "eager_ms", "compiled_ms", "speedup"])
+
+    audio, sr = load_ref_audio()
+    ref_len = audio.shape[-1] // hop_length
+    rows = []
+    for sentences in args.sentences:
+        gen_text = gen_text_of(sentences)
+        duration = ref_len + int(ref_len / len(ref_text.encode("utf-8")) * len(gen_text.encode("utf-8")))
+        row = dict(sentences=sentences, frames=duration, bucket=bucket_for(duration, blocks.buckets))
+        outputs = {}
+        for name, model in (("eager", eager), ("compiled", compiled)):
+
+            def run():
+                with torch.no_grad():
+                    return model.sample(
+                        cond=audio, text=[ref_text + " " + gen_text], duration=duration, steps=args.nfe_step,
+                        cfg_strength=2.0, sway_sampling_coef=-1.0, seed=0,
+                    )[0]
+
+            seconds, outputs[name] = timeit(run, repeat=args.repeat)
+            row[f"{name}_s"] = f"{seconds:.2f}"
+        row["speedup"] = f"{float(row['eager_s']) / float(row['compiled_s']):.2f}x"
+        row["max_abs_diff"] = f"{(outputs['eager'] - outputs['compiled']).abs().max().item():.2e}"
+        rows.append(row)
+
+    print_table(rows, ["sentences", "frames", "bucket", "eager_s", "compiled_s", "speedup", "max_abs_diff"])
+    print(f"after the run: {blocks.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# Fused QKV and batched adaptive norm projections (DiT.fuse_projections_) against the unfused DiT on CPU
+# Reports per-step latency of the transformer blocks at several frame counts, the end-to-end output difference, and
+# checks that the fused model still saves and loads state dicts in the original layout
+# python src/English_f5tts/eval/benchmark_fused.py --frames 256 512 1024 2048
+import argparse
+import copy
+import sys
+
+import torch
+
+from English_f5tts.eval.utils_benchmark import (
+    gen_text_of,
+    load_ref_audio,
+    load_tts,
+    print_table,
+    ref_text,
+    set_threads,
+    timeit,
+)
+from English_f5tts.infer.utils_infer import hop_length
+
+
+parser = argparse.ArgumentParser(description="Benchmark the fused DiT projections on CPU.")
+parser.add_argument("--frames", type=int, nargs="+", default=[256, 512, 1024, 2048])
+parser.add_argument("--sentences", type=int, default=2)
+parser.add_argument("--dtype", type=str, default="fp32", choices=["auto", "fp32", "fp16", "bf16"])
+parser.add_argument("--nfe_step", type=int, default=32)
+parser.add_argument("--repeat", type=int, default=5)
+parser.add_argument("--threads", type=int, default=0)
+args = parser.parse_args()
+
+
+def step_ms(dit, frames, batch):
+    param = next(dit.parameters())
+    x = torch.randn(batch, frames, dit.dim, dtype=param.dtype)
+    t = torch.randn(batch, dit.dim, dtype=param.dtype)
+    rope = dit.rotary_embed.forward_from_seq_len(frames)
+
+    def run():
+        with torch.inference_mode():
+            return dit.run_blocks(x, t, None, rope)
+
+    return timeit(run, repeat=args.repeat)[0] * 1000
+
+
+def check_layout(unfused, fused):
+    # same keys and values as the unfused model, and a loaded state dict reaches the fused weights
+    state, fused_state = unfused.state_dict(), fused.state_dict()
+    errors = []
+    if state.keys() != fused_state.keys():
+        errors.append(f"state dict keys differ: {sorted(state.keys() ^ fused_state.keys())[:4]}")
+    elif not all(torch.equal(state[k], fused_state[k]) for k in state):
+        errors.append("state dict values differ")
+
+    dit = fused.transformer
+    perturbed = {k: v + 1 if v.is_floating_point() else v for k, v in state.items()}
+    fused.load_state_dict(perturbed)
+    attn = dit.transformer_blocks[0].attn
+    to_q = perturbed["transformer.transformer_blocks.0.attn.to_q.weight"]
+    if not torch.equal(attn.qkv_weight[: attn.inner_dim], to_q):
+        errors.append("loading a state dict did not update qkv_weight")
+    if not torch.equal(dit.modulation_weight[-dit.norm_out.linear.out_features :], dit.norm_out.linear.weight):
+        errors.append("norm_out.linear is not a view of modulation_weight")
+    fused.load_state_dict(state)
+    return errors
+
+
+def main():
+    set_threads(args.threads)
+    tts = load_tts(device="cpu", dtype=args.dtype)
+    unfused = tts.ema_model
+    fused = copy.deepcopy(unfused)
+    fused.transformer.fuse_projections_()
+
+    batch = 2 if unfused.fold_cfg else 1
+    rows = []
+    for frames in args.frames:
+        unfused_ms = step_ms(unfused.transformer, frames, batch)
+        fused_ms = step_ms(fused.transformer, frames, batch)
+        rows.append(
+            dict(
+                frames=frames,
+                unfused_ms=f"{unfused_ms:.1f}",
+                fused_ms=f"{fused_ms:.1f}",
+                speedup=f"{unfused_ms / fused_ms:.2f}x",
+            )
+        )
+    print(f"transformer blocks per ode step, batch {batch}:")
+    print_table(rows, ["frames", "unfused_ms", "fused_ms", "speedup"])
+
+    audio, _ = load_ref_audio()
+    ref_len = audio.shape[-1] // hop_length
+    gen_text = gen_text_of(args.sentences)
+    duration = ref_len + int(ref_len / len(ref_text.encode("utf-8")) * len(gen_text.encode("utf-8")))
+    rows, outputs = [], {}
+    for name, model in (("unfused", unfused), ("fused", fused)):
+
+        def run():
+            with torch.inference_mode():
+                return model.sample(
+                    cond=audio, text=[ref_text + " " + gen_text], duration=duration, steps=args.nfe_step,
+                    cfg_strength=2.0, sway_sampling_coef=-1.0, seed=0,
+                )[0].float()
+
+        seconds, outputs[name] = timeit(run, repeat=max(1, args.repeat // 2))
+        rows.append(dict(model=name, frames=duration, seconds=f"{seconds:.2f}"))
+    print_table(rows, ["model", "frames", "seconds"])
+    print(f"max abs mel difference: {(outputs['unfused'] - outputs['fused']).abs().max().item():.2e}")
+
+    errors = check_layout(unfused, fused)
+    for error in errors:
+        print(f"layout check failed: {error}")
+    if errors:
+        sys.exit(1)
+    print("layout check passed, the fused model saves and loads the original state dict layout")
+
+
+if __name__ == "__main__":
+    main()
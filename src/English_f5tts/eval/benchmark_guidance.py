@@ -0,0 +1,96 @@
+# Guidance schedules (model/guidance.py) against cfg at every step, at equal NFE on CPU
+# reports wall time, the cut against "full", word error rate of a Whisper transcript (utils_infer.transcribe) against
+# the generated text and speaker similarity to the prompt
+# python src/English_f5tts/eval/benchmark_guidance.py --schedules full interval every_k decay "interval:t_end=0.3"
+import argparse
+import re
+
+import jiwer
+import torch
+import torchaudio
+
+from English_f5tts.eval.utils_benchmark import (
+    decode_mel,
+    gen_text_of,
+    load_ref_audio,
+    load_tts,
+    print_table,
+    ref_text,
+    set_threads,
+    speaker_similarity,
+    timeit,
+)
+from English_f5tts.infer.utils_infer import hop_length, target_sample_rate, transcribe
+from English_f5tts.model.guidance import parse_guidance
+from English_f5tts.model.utils import convert_char_to_pinyin
+
+
+parser = argparse.ArgumentParser(description="Compare guidance schedules at equal NFE on CPU.")
+parser.add_argument("--schedules", nargs="+", default=["full", "interval", "every_k", "decay", "every_k:every=3"])
+parser.add_argument("--nfe_step", type=int, default=32)
+parser.add_argument("--sentences", type=int, default=2)
+parser.add_argument("--cfg_strength", type=float, default=2.0)
+parser.add_argument("--seeds", type=int, nargs="+", default=[0, 1])
+parser.add_argument("--repeat", type=int, default=1)
+parser.add_argument("--threads", type=int, default=0)
+args = parser.parse_args()
+
+
+def normalize(text):
+    return " ".join(re.sub(r"[^\w' ]+", " ", text.lower()).split())
+
+
+def main():
+    set_threads(args.threads)
+    schedules = [parse_guidance(spec) for spec in args.schedules]
+    tts = load_tts(device="cpu")
+    model = tts.ema_model
+    audio, sr = load_ref_audio()
+    if sr != target_sample_rate:
+        audio = torchaudio.functional.resample(audio, sr, target_sample_rate)
+
+    gen_text = gen_text_of(args.sentences)
+    text = convert_char_to_pinyin([ref_text + " " + gen_text])
+    ref_len = audio.shape[-1] // hop_length
+    duration = ref_len + int(ref_len / len(ref_text.encode("utf-8")) * len(gen_text.encode("utf-8")))
+
+    def sample(guidance, seed):
+        with torch.inference_mode():
+            mel, _ = model.sample(
+                cond=audio, text=text, duration=duration, steps=args.nfe_step, cfg_strength=args.cfg_strength,
+                sway_sampling_coef=-1.0, seed=seed, guidance=guidance,
+            )
+        return mel[:, ref_len:]
+
+    rows = []
+    for guidance in schedules:
+        seconds, wers, sims = 0.0, [], []
+        for seed in args.seeds:
+            elapsed, mel = timeit(lambda: sample(guidance, seed), repeat=args.repeat)
+            seconds += elapsed / len(args.seeds)
+            with torch.inference_mode():
+                wave = decode_mel(tts, mel)
+            transcript = transcribe(dict(raw=wave.reshape(-1).cpu().numpy(), sampling_rate=target_sample_rate), "en")
+            wers.append(jiwer.wer(normalize(gen_text), normalize(transcript)))
+            sims.append(speaker_similarity(wave, audio, target_sample_rate))
+        rows.append(
+            dict(
+                schedule=guidance.spec,
+                seconds=f"{seconds:.2f}",
+                wer=f"{sum(wers) / len(wers):.3f}",
+                speaker_sim=f"{sum(sims) / len(sims):.3f}",
+            )
+        )
+        print(rows[-1])
+
+    full = next((float(row["seconds"]) for row in rows if row["schedule"] == "full"), None)
+    for row in rows:
+        row["cut"] = f"{1 - float(row['seconds']) / full:.0%}" if full else "-"
+
+    print()
+    print(f"{args.nfe_step} steps, cfg_strength {args.cfg_strength}, {duration} frames, seeds {args.seeds}")
+    print_table(rows, ["schedule", "seconds", "cut", "wer", "speaker_sim"])
+
+
+if __name__ == "__main__":
+    main()
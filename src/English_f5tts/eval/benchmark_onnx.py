@@ -0,0 +1,66 @@
+# PyTorch vs onnxruntime backend on CPU, end-to-end latency and output similarity
+# The onnx directory comes from infer/onnx_export.py run on the same checkpoint
+# python src/English_f5tts/eval/benchmark_onnx.py --onnx_dir onnx/F5TTS_v1_Base --sentences 1 4
+import argparse
+
+import torch
+
+from English_f5tts.eval.utils_benchmark import (
+    current_rss_mb,
+    gen_text_of,
+    load_tts,
+    print_table,
+    ref_audio,
+    ref_text,
+    set_threads,
+    speaker_similarity,
+    timeit,
+)
+
+
+parser = argparse.ArgumentParser(description="Benchmark the onnxruntime backend against PyTorch on CPU.")
+parser.add_argument("--onnx_dir", type=str, required=True)
+parser.add_argument("--ckpt_file", type=str, default="", help="the checkpoint the onnx directory was exported from")
+parser.add_argument("--sentences", type=int, nargs="+", default=[1, 4])
+parser.add_argument("--nfe_step", type=int, default=32)
+parser.add_argument("--repeat", type=int, default=3)
+parser.add_argument("--threads", type=int, default=0)
+args = parser.parse_args()
+
+
+def main():
+    set_threads(args.threads)
+    backends = {}
+    for name, kwargs in (
+        ("torch", dict(ckpt_file=args.ckpt_file, dtype="fp32")),
+        ("onnx", dict(backend="onnx", onnx_dir=args.onnx_dir)),
+    ):
+        rss = current_rss_mb()
+        backends[name] = load_tts(device="cpu", **kwargs)
+        print(f"{name} backend loaded, +{current_rss_mb() - rss:.0f} MB resident")
+
+    rows = []
+    for sentences in args.sentences:
+        waves = {}
+        row = dict(sentences=sentences)
+        for name, tts in backends.items():
+
+            def run():
+                wave, sr, _ = tts.infer(
+                    ref_audio, ref_text, gen_text_of(sentences), nfe_step=args.nfe_step, seed=0, return_spectrogram=False
+                )
+                return torch.from_numpy(wave), sr
+
+            seconds, (waves[name], sr) = timeit(run, repeat=args.repeat)
+            row[f"{name}_s"] = f"{seconds:.2f}"
+        n = min(len(waves["torch"]), len(waves["onnx"]))
+        row["speedup"] = f"{float(row['torch_s']) / float(row['onnx_s']):.2f}x"
+        row["max_abs_diff"] = f"{(waves['torch'][:n] - waves['onnx'][:n]).abs().max().item():.2e}"
+        row["spk_sim"] = f"{speaker_similarity(waves['onnx'][:n], waves['torch'][:n], sr):.3f}"
+        rows.append(row)
+
+    print_table(rows, ["sentences", "torch_s", "onnx_s", "speedup", "max_abs_diff", "spk_sim"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# DiT precision on CPU: one transformer step per dtype at several lengths, then full sampling drift against fp32
+# Mel extraction and the vocoder stay fp32, only the CFM is cast (the ode state stays fp32 under bf16)
+# Exits non-zero if any dtype's sampled mel drifts from fp32 by more than --max_mel_l1
+# python src/English_f5tts/eval/benchmark_precision.py --dtypes bf16 fp16 --frames 256 1024
+import argparse
+import copy
+import sys
+
+import torch
+
+from English_f5tts.eval.utils_benchmark import (
+    decode_mel,
+    gen_text_of,
+    load_ref_audio,
+    load_tts,
+    mel_l1,
+    print_table,
+    ref_text,
+    set_threads,
+    speaker_similarity,
+    timeit,
+)
+from English_f5tts.infer.utils_infer import hop_length, target_sample_rate
+from English_f5tts.model.precision import cpu_supports_bf16, dtype_name, resolve_dtype
+
+
+parser = argparse.ArgumentParser(description="Benchmark and check bf16 / fp16 DiT sampling against fp32 on CPU.")
+parser.add_argument("--dtypes", type=str, nargs="+", default=["bf16"], help="compared against fp32")
+parser.add_argument("--frames", type=int, nargs="+", default=[256, 512, 1024], help="step benchmark lengths")
+parser.add_argument("--nfe_step", type=int, default=32)
+parser.add_argument("--sentences", type=int, default=2)
+parser.add_argument("--repeat", type=int, default=3)
+parser.add_argument("--threads", type=int, default=0)
+parser.add_argument("--max_mel_l1", type=float, default=0.1, help="mean abs log-mel difference allowed against fp32")
+args = parser.parse_args()
+
+
+def step_seconds(dit, frames, dtype):
+    # one uncached cond forward, what each ode step costs without cfg
+    x = torch.randn(1, frames, dit.mel_dim, dtype=dtype)
+    cond = torch.zeros_like(x)
+    text = torch.randint(0, 100, (1, frames // 4))
+    time = torch.tensor(0.5, dtype=dtype)
+
+    def run():
+        with torch.inference_mode():
+            return dit(x=x, cond=cond, text=text, time=time, drop_audio_cond=False, drop_text=False)
+
+    return timeit(run, repeat=args.repeat)[0]
+
+
+def main():
+    set_threads(args.threads)
+    print(f"native cpu bf16 (avx512_bf16 / amx): {cpu_supports_bf16()}, auto policy: {dtype_name(resolve_dtype())}")
+
+    tts = load_tts(device="cpu", dtype="fp32")
+    audio, sr = load_ref_audio()
+    dtypes = ["fp32"] + [name for name in args.dtypes if name != "fp32"]
+    models = {name: copy.deepcopy(tts.ema_model).to(resolve_dtype(name)) for name in dtypes}
+
+    rows = []
+    for frames in args.frames:
+        row = dict(frames=frames)
+        for name, model in models.items():
+            row[f"{name}_ms"] = f"{step_seconds(model.transformer, frames, resolve_dtype(name)) * 1000:.1f}"
+        for name in dtypes[1:]:
+            row[f"{name}_speedup"] = f"{float(row['fp32_ms']) / float(row[f'{name}_ms']):.2f}x"
+        rows.append(row)
+    print_table(rows, list(rows[0]))
+
+    gen_text = gen_text_of(args.sentences)
+    ref_len = audio.shape[-1] // hop_length
+    duration = ref_len + int(ref_len / len(ref_text.encode("utf-8")) * len(gen_text.encode("utf-8")))
+
+    rows, mels, failed = [], {}, False
+    for name, model in models.items():
+
+        def run():
+            with torch.inference_mode():
+                return model.sample(
+                    cond=audio, text=[ref_text + " " + gen_text], duration=duration, steps=args.nfe_step,
+                    cfg_strength=2.0, sway_sampling_coef=-1.0, seed=0,
+                )[0]
+
+        seconds, mels[name] = timeit(run, repeat=args.repeat)
+        drift = mel_l1(mels[name], mels["fp32"])
+        with torch.inference_mode():
+            wave, reference = decode_mel(tts, mels[name][:, ref_len:]), decode_mel(tts, mels["fp32"][:, ref_len:])
+        rows.append(
+            dict(
+                dtype=name,
+                mel_dtype=dtype_name(mels[name].dtype),
+                seconds=f"{seconds:.2f}",
+                speedup=f"{float(rows[0]['seconds']) / seconds:.2f}x" if rows else "1.00x",
+                mel_l1=f"{drift:.4f}",
+                max_abs=f"{(mels[name].float() - mels['fp32']).abs().max().item():.3f}",
+                spk_sim_fp32=f"{speaker_similarity(wave, reference, target_sample_rate):.3f}",
+                ok=drift <= args.max_mel_l1,
+            )
+        )
+        failed |= not rows[-1]["ok"]
+
+    print_table(rows, list(rows[0]))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
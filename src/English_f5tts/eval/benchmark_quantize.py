@@ -0,0 +1,85 @@
+# fp32 vs int8 dynamic quantized CPU inference: load time, resident memory, latency and output similarity
+# The first int8 load quantizes the fp32 checkpoint and caches the result, the second one reads the cache
+# python src/English_f5tts/eval/benchmark_quantize.py --sentences 1 4
+import argparse
+import gc
+import time
+
+import torch
+
+from English_f5tts.eval.utils_benchmark import (
+    current_rss_mb,
+    gen_text_of,
+    load_ref_audio,
+    load_tts,
+    print_table,
+    ref_audio,
+    ref_text,
+    set_threads,
+    speaker_similarity,
+    timeit,
+)
+
+
+parser = argparse.ArgumentParser(description="Benchmark int8 dynamic quantization on CPU.")
+parser.add_argument("--sentences", type=int, nargs="+", default=[1, 4])
+parser.add_argument("--nfe_step", type=int, default=32)
+parser.add_argument("--repeat", type=int, default=3)
+parser.add_argument("--threads", type=int, default=0)
+args = parser.parse_args()
+
+
+def load(quantize):
+    gc.collect()
+    rss = current_rss_mb()
+    start = time.perf_counter()
+    tts = load_tts(device="cpu", quantize=quantize)
+    return tts, time.perf_counter() - start, current_rss_mb() - rss
+
+
+def main():
+    set_threads(args.threads)
+    ref_wave, ref_sr = load_ref_audio()
+
+    rows, float_waves = [], {}
+    for name, quantize in (("fp32", False), ("int8", True), ("int8_cached", True)):
+        tts, load_s, model_mb = load(quantize)
+        for sentences in args.sentences:
+
+            def run(tts=tts, sentences=sentences):
+                wave, sr, _ = tts.infer(
+                    ref_audio,
+                    ref_text,
+                    gen_text_of(sentences),
+                    nfe_step=args.nfe_step,
+                    seed=0,
+                    return_spectrogram=False,
+                )
+                return torch.from_numpy(wave), sr
+
+            seconds, (wave, sr) = timeit(run, repeat=args.repeat)
+            if not quantize:
+                float_waves[sentences] = wave
+            reference = float_waves[sentences]
+            n = min(len(wave), len(reference))
+            rows.append(
+                dict(
+                    mode=name,
+                    sentences=sentences,
+                    load_s=f"{load_s:.2f}",
+                    model_mb=f"{model_mb:.0f}",
+                    seconds=f"{seconds:.2f}",
+                    rtf=f"{seconds / (len(wave) / sr):.3f}",
+                    spk_sim_ref=f"{speaker_similarity(wave, ref_wave, sr):.3f}",
+                    spk_sim_fp32=f"{speaker_similarity(wave[:n], reference[:n], sr):.3f}",
+                )
+            )
+        del tts
+
+    print_table(
+        rows, ["mode", "sentences", "load_s", "model_mb", "seconds", "rtf", "spk_sim_ref", "spk_sim_fp32"]
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+# NumPy frame-RMS silence engine vs pydub, timings on the reference clipping / output trimming settings
+# Equivalence of the cut points is checked by tests/test_silence.py
+# python src/English_f5tts/eval/benchmark_silence.py --files my_prompt.wav --gaps 4
+import argparse
+
+import numpy as np
+from pydub import AudioSegment, silence
+
+from English_f5tts.eval.utils_benchmark import load_ref_audio, print_table, ref_audio, timeit
+from English_f5tts.infer import silence as np_silence
+
+
+parser = argparse.ArgumentParser(description="Benchmark the numpy silence detection against pydub.")
+parser.add_argument("--files", type=str, nargs="*", default=[ref_audio])
+parser.add_argument("--gaps", type=int, default=4, help="also test each file tiled with this many silent gaps")
+parser.add_argument("--repeat", type=int, default=3)
+args = parser.parse_args()
+
+# (name, min_silence_len, silence_thresh, keep_silence) as used by preprocess_ref_audio_text and
+# remove_silence_for_generated_wav
+split_settings = [
+    ("clip_long", 1000, -50, 1000),
+    ("clip_short", 100, -40, 1000),
+    ("output", 1000, -50, 500),
+]
+edge_threshold = -42  # remove_silence_edges
+
+
+def to_segment(wave, sample_rate):
+    pcm = (np.clip(wave, -1.0, 1.0) * 32767).astype("<i2")
+    return AudioSegment(pcm.T.tobytes(), frame_rate=sample_rate, sample_width=2, channels=pcm.shape[0])
+
+
+def pydub_trailing_silence(aseg, silence_threshold):
+    # the millisecond loop remove_silence_edges used
+    trailing = 0
+    for ms in reversed(aseg):
+        if ms.dBFS > silence_threshold:
+            break
+        trailing += 1
+    return trailing
+
+
+def pydub_split_ranges(aseg, min_silence_len, silence_thresh, keep_silence):
+    # split_on_silence itself also exports every segment, only the range computation is timed
+    ranges = [
+        [start - keep_silence, end + keep_silence]
+        for start, end in silence.detect_nonsilent(aseg, min_silence_len, silence_thresh, seek_step=10)
+    ]
+    for prev, next_ in zip(ranges, ranges[1:]):
+        if next_[0] < prev[1]:
+            prev[1] = (prev[1] + next_[0]) // 2
+            next_[0] = prev[1]
+    return [[max(start, 0), min(end, len(aseg))] for start, end in ranges]
+
+
+def with_gaps(wave, sample_rate, gaps):
+    gap = np.zeros((wave.shape[0], int(1.5 * sample_rate)), dtype=wave.dtype)
+    return np.concatenate([part for _ in range(gaps + 1) for part in (wave, gap)][:-1], axis=-1)
+
+
+def main():
+    inputs = []
+    for path in args.files:
+        audio, sr = load_ref_audio(path)
+        wave = audio.numpy()
+        inputs.append((path.split("/")[-1], wave, sr))
+        if args.gaps:
+            inputs.append((f"{path.split('/')[-1]} x{args.gaps + 1}", with_gaps(wave, sr, args.gaps), sr))
+
+    rows = []
+    for name, wave, sr in inputs:
+        # both sides see the same 16-bit samples
+        aseg = to_segment(wave, sr)
+        wave = np.frombuffer(aseg.raw_data, dtype="<i2").reshape(-1, aseg.channels).T / 32768.0
+
+        checks = [
+            (
+                "leading",
+                lambda: silence.detect_leading_silence(aseg, silence_threshold=edge_threshold),
+                lambda: np_silence.leading_silence(wave, sr, silence_threshold=edge_threshold),
+            ),
+            (
+                "trailing",
+                lambda: pydub_trailing_silence(aseg, edge_threshold),
+                lambda: np_silence.trailing_silence(wave, sr, silence_threshold=edge_threshold),
+            ),
+        ]
+        for setting, min_silence_len, silence_thresh, keep_silence in split_settings:
+            checks.append(
+                (
+                    setting,
+                    lambda m=min_silence_len, t=silence_thresh, k=keep_silence: pydub_split_ranges(aseg, m, t, k),
+                    lambda m=min_silence_len, t=silence_thresh, k=keep_silence: np_silence.split_on_silence(
+                        wave, sr, m, t, k, seek_step=10
+                    ),
+                )
+            )
+
+        for check, run_pydub, run_numpy in checks:
+            pydub_s, _ = timeit(run_pydub, repeat=args.repeat)
+            numpy_s, _ = timeit(run_numpy, repeat=args.repeat)
+            rows.append(
+                dict(
+                    audio=name,
+                    seconds=f"{wave.shape[-1] / sr:.1f}",
+                    check=check,
+                    pydub_ms=f"{pydub_s * 1000:.2f}",
+                    numpy_ms=f"{numpy_s * 1000:.2f}",
+                    speedup=f"{pydub_s / numpy_s:.1f}x",
+                )
+            )
+
+    print_table(rows, ["audio", "seconds", "check", "pydub_ms", "numpy_ms", "speedup"])
+
+
+if __name__ == "__main__":
+    main()
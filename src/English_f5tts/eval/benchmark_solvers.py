@@ -0,0 +1,94 @@
+# Quality / speed sweep of the fixed-step ODE solvers in model/solvers.py
+# solver x nfe (transformer calls, steps = nfe / evals per step) x sway coefficient, against a 64-step euler reference
+# reports wall time, mel L1 to the reference over the generated frames, and speaker similarity to the prompt
+# python src/English_f5tts/eval/benchmark_solvers.py --solvers euler heun ab2 dpmpp_2m --nfe 8 16 32 --sway -1 0
+import argparse
+
+import torch
+import torchaudio
+
+from English_f5tts.eval.utils_benchmark import (
+    decode_mel,
+    gen_text_of,
+    load_ref_audio,
+    load_tts,
+    mel_l1,
+    print_table,
+    ref_text,
+    set_threads,
+    speaker_similarity,
+    timeit,
+)
+from English_f5tts.infer.utils_infer import hop_length, target_sample_rate
+from English_f5tts.model.solvers import evals_per_step, fixed_step_solvers
+from English_f5tts.model.utils import convert_char_to_pinyin
+
+
+parser = argparse.ArgumentParser(description="Sweep ODE solvers x NFE x sway sampling on CPU.")
+parser.add_argument("--solvers", nargs="+", default=list(fixed_step_solvers), choices=list(fixed_step_solvers))
+parser.add_argument("--nfe", type=int, nargs="+", default=[8, 12, 16, 32])
+parser.add_argument("--sway", type=float, nargs="+", default=[-1.0, 0.0])
+parser.add_argument("--reference_steps", type=int, default=64)
+parser.add_argument("--sentences", type=int, default=1)
+parser.add_argument("--cfg_strength", type=float, default=2.0)
+parser.add_argument("--repeat", type=int, default=1)
+parser.add_argument("--threads", type=int, default=0)
+args = parser.parse_args()
+
+
+def main():
+    set_threads(args.threads)
+    tts = load_tts(device="cpu")
+    model = tts.ema_model
+    audio, sr = load_ref_audio()
+    if sr != target_sample_rate:
+        audio = torchaudio.functional.resample(audio, sr, target_sample_rate)
+
+    gen_text = gen_text_of(args.sentences)
+    text = convert_char_to_pinyin([ref_text + " " + gen_text])
+    ref_len = audio.shape[-1] // hop_length
+    duration = ref_len + int(ref_len / len(ref_text.encode("utf-8")) * len(gen_text.encode("utf-8")))
+
+    def sample(method, steps, sway):
+        model.odeint_kwargs = dict(method=method)
+        with torch.inference_mode():
+            mel, _ = model.sample(
+                cond=audio, text=text, duration=duration, steps=steps, cfg_strength=args.cfg_strength,
+                sway_sampling_coef=sway, seed=0,
+            )
+        return mel[:, ref_len:]
+
+    default_method = model.odeint_kwargs["method"]
+    reference = sample("euler", args.reference_steps, -1.0)
+    with torch.inference_mode():
+        reference_sim = speaker_similarity(decode_mel(tts, reference), audio, target_sample_rate)
+    print(f"reference: euler, {args.reference_steps} steps, sway -1, speaker similarity {reference_sim:.3f}")
+
+    rows = []
+    for method in args.solvers:
+        for nfe in args.nfe:
+            steps = max(nfe // evals_per_step[method], 1)
+            for sway in args.sway:
+                seconds, mel = timeit(lambda: sample(method, steps, sway), repeat=args.repeat, warmup=0)
+                with torch.inference_mode():
+                    sim = speaker_similarity(decode_mel(tts, mel), audio, target_sample_rate)
+                rows.append(
+                    dict(
+                        solver=method,
+                        nfe=steps * evals_per_step[method],
+                        steps=steps,
+                        sway=sway,
+                        seconds=f"{seconds:.2f}",
+                        mel_l1=f"{mel_l1(mel, reference):.4f}",
+                        speaker_sim=f"{sim:.3f}",
+                    )
+                )
+                print(rows[-1])
+    model.odeint_kwargs = dict(method=default_method)
+
+    print()
+    print_table(rows, ["solver", "nfe", "steps", "sway", "seconds", "mel_l1", "speaker_sim"])
+
+
+if __name__ == "__main__":
+    main()
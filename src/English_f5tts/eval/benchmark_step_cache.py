@@ -0,0 +1,94 @@
+# Step-invariant precomputation in the DiT ODE loop (rotary freqs, timestep embeddings, cond/text input projection)
+# Checks each cached piece against the per-step computation, then times full sampling with the cache on and off
+# python src/English_f5tts/eval/benchmark_step_cache.py --nfe_step 16 32
+import argparse
+
+import torch
+
+from English_f5tts.eval.utils_benchmark import (
+    gen_text_of,
+    load_ref_audio,
+    load_tts,
+    print_table,
+    ref_text,
+    set_threads,
+    timeit,
+)
+from English_f5tts.infer.utils_infer import hop_length
+from English_f5tts.model.utils import convert_char_to_pinyin, list_str_to_idx
+
+
+parser = argparse.ArgumentParser(description="Benchmark and check the DiT step cache on CPU.")
+parser.add_argument("--nfe_step", type=int, nargs="+", default=[16, 32])
+parser.add_argument("--sentences", type=int, default=2)
+parser.add_argument("--repeat", type=int, default=3)
+parser.add_argument("--threads", type=int, default=0)
+args = parser.parse_args()
+
+
+def check_components(dit, cond, text, duration, nfe_step):
+    # each precomputed piece against what a step computes on its own
+    t = torch.linspace(0, 1, nfe_step + 1)
+    t = t - (torch.cos(torch.pi / 2 * t) - 1 + t)
+    dit.clear_cache()
+    dit.prepare_sampling(t)
+    time_exact = all(
+        torch.equal(dit.get_time_embed(step, 1, cache=True), dit.time_embed(step.repeat(1))) for step in t
+    )
+    rope_exact = torch.equal(dit.get_rope(duration, cache=True)[0], dit.rotary_embed.forward_from_seq_len(duration)[0])
+
+    x = torch.randn(1, duration, cond.shape[-1])
+    cond = torch.nn.functional.pad(cond, (0, 0, 0, duration - cond.shape[1]))
+    text_embed = dit.text_embed(text, duration)
+    reference = dit.input_embed(x, cond, text_embed)
+    cached = dit.input_embed(x, cond, text_embed, static=dit.input_embed.project_static(dit.mel_dim, cond, text_embed))
+    dit.clear_cache()
+    return time_exact, rope_exact, (reference - cached).abs().max().item()
+
+
+def main():
+    set_threads(args.threads)
+    tts = load_tts(device="cpu")
+    model, dit = tts.ema_model, tts.ema_model.transformer
+    audio, sr = load_ref_audio()
+
+    gen_text = gen_text_of(args.sentences)
+    text_list = convert_char_to_pinyin([ref_text + " " + gen_text])
+    ref_len = audio.shape[-1] // hop_length
+    duration = ref_len + int(ref_len / len(ref_text.encode("utf-8")) * len(gen_text.encode("utf-8")))
+
+    with torch.inference_mode():
+        cond = model.mel_spec(audio).permute(0, 2, 1)
+        text = list_str_to_idx(text_list, model.vocab_char_map)
+        time_exact, rope_exact, proj_diff = check_components(dit, cond, text, duration, max(args.nfe_step))
+    print(f"timestep embeddings bit-exact: {time_exact}")
+    print(f"rotary freqs bit-exact: {rope_exact}")
+    print(f"split input projection max abs diff: {proj_diff:.2e} (summation order differs, not bit-exact)")
+
+    rows = []
+    for nfe_step in args.nfe_step:
+        row = dict(nfe_step=nfe_step, frames=duration)
+        outputs = {}
+        for name, step_cache in (("per_step", False), ("cached", True)):
+            dit.step_cache = step_cache
+
+            def run():
+                with torch.inference_mode():
+                    return model.sample(
+                        cond=audio, text=text_list, duration=duration, steps=nfe_step, cfg_strength=2.0,
+                        sway_sampling_coef=-1.0, seed=0,
+                    )[0]
+
+            seconds, outputs[name] = timeit(run, repeat=args.repeat)
+            row[f"{name}_s"] = f"{seconds:.2f}"
+        row["speedup"] = f"{float(row['per_step_s']) / float(row['cached_s']):.2f}x"
+        row["bit_exact"] = torch.equal(outputs["per_step"], outputs["cached"])
+        row["max_abs_diff"] = f"{(outputs['per_step'] - outputs['cached']).abs().max().item():.2e}"
+        rows.append(row)
+    dit.step_cache = True
+
+    print_table(rows, ["nfe_step", "frames", "per_step_s", "cached_s", "speedup", "bit_exact", "max_abs_diff"])
+
+
+if __name__ == "__main__":
+    main()
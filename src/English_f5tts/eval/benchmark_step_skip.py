@@ -0,0 +1,87 @@
+# Speed / quality sweep of DiT step skipping (CFM.sample skip_threshold, DiT.run_or_skip_blocks)
+# threshold 0 runs every step and is the reference; reports transformer evaluations skipped, wall time, mel L1 to the
+# reference over the generated frames and speaker similarity to the prompt
+# python src/English_f5tts/eval/benchmark_step_skip.py --thresholds 0 0.05 0.1 0.2 0.3 --nfe_step 32
+import argparse
+
+import torch
+import torchaudio
+
+from English_f5tts.eval.utils_benchmark import (
+    decode_mel,
+    gen_text_of,
+    load_ref_audio,
+    load_tts,
+    mel_l1,
+    print_table,
+    ref_text,
+    set_threads,
+    speaker_similarity,
+    timeit,
+)
+from English_f5tts.infer.utils_infer import hop_length, target_sample_rate
+from English_f5tts.model.utils import convert_char_to_pinyin
+
+
+parser = argparse.ArgumentParser(description="Sweep the DiT step skipping threshold on CPU.")
+parser.add_argument("--thresholds", type=float, nargs="+", default=[0.0, 0.05, 0.1, 0.2, 0.3])
+parser.add_argument("--nfe_step", type=int, default=32)
+parser.add_argument("--sentences", type=int, default=2)
+parser.add_argument("--cfg_strength", type=float, default=2.0)
+parser.add_argument("--fold_cfg", type=int, default=1, help="0 runs the cond and uncond branch as separate passes")
+parser.add_argument("--repeat", type=int, default=2)
+parser.add_argument("--threads", type=int, default=0)
+args = parser.parse_args()
+
+
+def main():
+    set_threads(args.threads)
+    tts = load_tts(device="cpu")
+    model = tts.ema_model
+    model.fold_cfg = bool(args.fold_cfg)
+    audio, sr = load_ref_audio()
+    if sr != target_sample_rate:
+        audio = torchaudio.functional.resample(audio, sr, target_sample_rate)
+
+    gen_text = gen_text_of(args.sentences)
+    text = convert_char_to_pinyin([ref_text + " " + gen_text])
+    ref_len = audio.shape[-1] // hop_length
+    duration = ref_len + int(ref_len / len(ref_text.encode("utf-8")) * len(gen_text.encode("utf-8")))
+
+    def sample(threshold):
+        with torch.inference_mode():
+            mel, _ = model.sample(
+                cond=audio, text=text, duration=duration, steps=args.nfe_step, cfg_strength=args.cfg_strength,
+                sway_sampling_coef=-1.0, seed=0, skip_threshold=threshold,
+            )
+        return mel[:, ref_len:]
+
+    reference_seconds, reference = timeit(lambda: sample(0.0), repeat=args.repeat)
+    rows = []
+    for threshold in args.thresholds:
+        if threshold > 0:
+            seconds, mel = timeit(lambda: sample(threshold), repeat=args.repeat)
+            stats = model.transformer.skip_stats  # transformer evaluations of the last call, per branch
+        else:
+            seconds, mel, stats = reference_seconds, reference, dict(steps=0, skipped=0)
+        with torch.inference_mode():
+            sim = speaker_similarity(decode_mel(tts, mel), audio, target_sample_rate)
+        rows.append(
+            dict(
+                threshold=threshold,
+                skipped=f"{stats['skipped']}/{stats['steps']}",
+                seconds=f"{seconds:.2f}",
+                saved=f"{1 - seconds / reference_seconds:.0%}",
+                mel_l1=f"{mel_l1(mel, reference):.4f}",
+                speaker_sim=f"{sim:.3f}",
+            )
+        )
+        print(rows[-1])
+
+    print()
+    print(f"{args.nfe_step} steps, cfg {'folded' if model.fold_cfg else 'as two passes'}, {duration} frames")
+    print_table(rows, ["threshold", "skipped", "seconds", "saved", "mel_l1", "speaker_sim"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# Shared helpers for the CPU benchmarks in this folder
+import gc
+import os
+import resource
+import statistics
+import time
+from importlib.resources import files
+
+import torch
+import torch.nn.functional as F
+import torchaudio
+from speechbrain.pretrained import SpeakerRecognition
+
+from English_f5tts.api import F5TTS
+
+
+# -----------------------------------------
+
+ref_audio = str(files("English_f5tts").joinpath("infer/examples/basic/basic_ref_en.wav"))
+ref_text = "Some call me nature, others call me mother nature."
+gen_sentence = "I've been a silent spectator, watching species evolve, empires rise and fall. "
+speaker_model_source = "speechbrain/spkrec-ecapa-voxceleb"  # same verifier as the synthesize routes
+speaker_model_savedir = "pretrained_models/spkrec-ecapa-voxceleb"
+
+# -----------------------------------------
+
+
+def load_tts(model="F5TTS_v1_Base", ckpt_file="", device="cpu", **kwargs):
+    return F5TTS(model=model, ckpt_file=ckpt_file, device=device, **kwargs)
+
+
+def load_ref_audio(path=ref_audio, device="cpu"):
+    audio, sr = torchaudio.load(path)
+    return audio.to(device), sr
+
+
+def gen_text_of(sentences):
+    return (gen_sentence * sentences).strip()
+
+
+def timeit(fn, repeat=3, warmup=1):
+    # returns (median seconds, last result)
+    for _ in range(warmup):
+        result = fn()
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def current_rss_mb():
+    # resident set size now, unlike peak_rss_mb it goes down when memory is released
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return peak_rss_mb()
+
+
+def set_threads(threads):
+    if threads:
+        torch.set_num_threads(threads)
+        os.environ["OMP_NUM_THREADS"] = str(threads)
+
+
+def print_table(rows, columns):
+    widths = [max(len(c), *(len(f"{row[c]}") for row in rows)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(f"{row[c]}".ljust(w) for c, w in zip(columns, widths)))
+
+
+def decode_mel(tts, mel):
+    # mel "b n d" -> wave "b nw"
+    mel = mel.to(torch.float32).permute(0, 2, 1)
+    if tts.mel_spec_type == "vocos":
+        return tts.vocoder.decode(mel)
+    return tts.vocoder(mel).squeeze(1)
+
+
+def mel_l1(mel, reference):
+    return (mel.to(torch.float32) - reference.to(torch.float32)).abs().mean().item()
+
+
+_speaker_model = None
+
+
+def speaker_similarity(wave, ref_wave, sample_rate):
+    # cosine similarity of ECAPA speaker embeddings, both waves "nw" or "1 nw"
+    global _speaker_model
+    if _speaker_model is None:
+        _speaker_model = SpeakerRecognition.from_hparams(source=speaker_model_source, savedir=speaker_model_savedir)
+
+    embeddings = []
+    for w in (wave, ref_wave):
+        w = torchaudio.functional.resample(w.reshape(1, -1).to(torch.float32).cpu(), sample_rate, 16000)
+        embeddings.append(_speaker_model.encode_batch(w).squeeze())
+    return F.cosine_similarity(embeddings[0], embeddings[1], dim=-1).item()
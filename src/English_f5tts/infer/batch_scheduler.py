@@ -0,0 +1,215 @@
+# Cross-request dynamic micro-batching in front of CFM.sample
+# Chunk jobs from concurrent requests on the same model are collected for a short wait window, grouped by
+# sampling params and similar target duration, then run as one padded batch (CFM.sample masks the padding)
+import threading
+import time
+
+import torch
+from torch.nn.utils.rnn import pad_sequence
+
+
+# -----------------------------------------
+
+max_batch_size = 8
+max_batch_frames = 8192  # budget on padded mel frames per batch, i.e. batch size x longest duration
+max_wait_ms = 20  # how long the oldest pending job may wait for others to join
+duration_tolerance = 0.25  # relative target duration difference allowed within one batch
+worker_idle_seconds = 60  # the worker exits when idle, so an evicted model isn't kept alive by it
+
+# -----------------------------------------
+
+
+class _Job:
+    __slots__ = ("cond", "text", "duration", "seed", "params", "enqueued", "event", "result", "error")
+
+    def __init__(self, cond, text, duration, seed, params):
+        self.cond = cond
+        self.text = text
+        self.duration = duration
+        self.seed = seed
+        self.params = params
+        self.enqueued = time.perf_counter()
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BatchScheduler:
+    def __init__(
+        self,
+        model,
+        max_batch_size=max_batch_size,
+        max_batch_frames=max_batch_frames,
+        max_wait_ms=max_wait_ms,
+        duration_tolerance=duration_tolerance,
+    ):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_batch_frames = max_batch_frames
+        self.max_wait = max_wait_ms / 1000
+        self.duration_tolerance = duration_tolerance
+
+        self._queue = []
+        self._cv = threading.Condition()
+        self._metrics_lock = threading.Lock()
+        self._metrics = dict(batches=0, jobs=0, real_frames=0, padded_frames=0, wait_seconds=0.0, sample_seconds=0.0)
+
+        # a single worker owns the model, so sample calls (and the DiT text cache) never overlap
+        self._worker = None
+
+    def submit(
+        self,
+        cond,
+        text,
+        duration,
+        steps=32,
+        cfg_strength=2.0,
+        sway_sampling_coef=-1.0,
+        skip_threshold=0.0,
+        guidance=None,
+        seed=None,
+    ):
+        # cond: raw wave "1 nw" or mel "1 n d", text: one (pinyin converted) text, duration: target frames
+        # seed: the job's initial noise, as CFM.sample(seed=seed) on this job alone would draw it
+        # returns the generated mel "1 n d" of this job, trimmed to its own duration
+        return self.submit_many(
+            cond, [text], [duration], steps, cfg_strength, sway_sampling_coef, skip_threshold, guidance, [seed]
+        )[0]
+
+    def submit_many(
+        self,
+        cond,
+        texts,
+        durations,
+        steps=32,
+        cfg_strength=2.0,
+        sway_sampling_coef=-1.0,
+        skip_threshold=0.0,
+        guidance=None,
+        seeds=None,
+    ):
+        # one job per text on the same cond, all queued at once so they batch with each other without waiting
+        # for one to finish before the next is submitted; returns their mels in the order of texts
+        if cond.ndim == 2:
+            cond = self.model.mel_spec(cond).permute(0, 2, 1)
+        cond = cond[0]
+        seeds = seeds if seeds is not None else [None] * len(texts)
+
+        jobs = []
+        for text, duration, seed in zip(texts, durations, seeds):
+            # same lower bound as CFM.sample, so the job is trimmed to what a batch-of-one call would return
+            duration = min(max(max(len(text), cond.shape[0]) + 1, int(duration)), 4096)
+            # only jobs with equal params share a batch, guidance schedules compare by value
+            params = (steps, cfg_strength, sway_sampling_coef, skip_threshold, guidance)
+            jobs.append(_Job(cond, text, duration, seed, params))
+
+        with self._cv:
+            self._queue.extend(jobs)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="cfm-batch-scheduler", daemon=True)
+                self._worker.start()
+            self._cv.notify()
+
+        for job in jobs:
+            job.event.wait()
+        for job in jobs:
+            if job.error is not None:
+                raise job.error
+        return [job.result for job in jobs]
+
+    def _take_batch(self):
+        # called with self._cv held; the oldest job anchors the batch so nothing starves
+        anchor = self._queue[0]
+        candidates = [
+            job
+            for job in self._queue[1:]
+            if job.params == anchor.params
+            and abs(job.duration - anchor.duration) <= self.duration_tolerance * max(job.duration, anchor.duration)
+        ]
+        candidates.sort(key=lambda job: abs(job.duration - anchor.duration))
+
+        batch, longest = [anchor], anchor.duration
+        for job in candidates:
+            if len(batch) >= self.max_batch_size:
+                break
+            if (len(batch) + 1) * max(longest, job.duration) > self.max_batch_frames:
+                continue
+            batch.append(job)
+            longest = max(longest, job.duration)
+
+        taken = set(map(id, batch))
+        self._queue = [job for job in self._queue if id(job) not in taken]
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cv:
+                while not self._queue:
+                    if not self._cv.wait(worker_idle_seconds) and not self._queue:
+                        self._worker = None
+                        return
+                deadline = self._queue[0].enqueued + self.max_wait
+                while len(self._queue) < self.max_batch_size:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cv.wait(remaining)
+                batch = self._take_batch()
+
+            self._sample(batch)
+
+    def _sample(self, batch):
+        start = time.perf_counter()
+        steps, cfg_strength, sway_sampling_coef, skip_threshold, guidance = batch[0].params
+        try:
+            cond = pad_sequence([job.cond for job in batch], batch_first=True)
+            lens = torch.tensor([job.cond.shape[0] for job in batch], device=cond.device)
+            duration = torch.tensor([job.duration for job in batch], device=cond.device)
+            with torch.inference_mode():
+                generated, _ = self.model.sample(
+                    cond=cond,
+                    text=[job.text for job in batch],
+                    duration=duration,
+                    lens=lens,
+                    seed=[job.seed for job in batch],
+                    steps=steps,
+                    cfg_strength=cfg_strength,
+                    sway_sampling_coef=sway_sampling_coef,
+                    skip_threshold=skip_threshold,
+                    guidance=guidance,
+                )
+            del _
+            for i, job in enumerate(batch):
+                job.result = generated[i : i + 1, : job.duration]
+        except Exception as e:
+            for job in batch:
+                job.error = e
+        finally:
+            for job in batch:
+                job.event.set()
+
+        with self._metrics_lock:
+            self._metrics["batches"] += 1
+            self._metrics["jobs"] += len(batch)
+            self._metrics["real_frames"] += sum(job.duration for job in batch)
+            self._metrics["padded_frames"] += len(batch) * max(job.duration for job in batch)
+            self._metrics["wait_seconds"] += sum(start - job.enqueued for job in batch)
+            self._metrics["sample_seconds"] += time.perf_counter() - start
+
+    def metrics(self):
+        with self._metrics_lock:
+            m = dict(self._metrics)
+        batches, jobs = max(m["batches"], 1), max(m["jobs"], 1)
+        return dict(
+            max_batch_size=self.max_batch_size,
+            max_batch_frames=self.max_batch_frames,
+            max_wait_ms=self.max_wait * 1000,
+            pending=len(self._queue),
+            batches=m["batches"],
+            jobs=m["jobs"],
+            mean_batch_size=m["jobs"] / batches,
+            occupancy=m["jobs"] / batches / self.max_batch_size,
+            padding_efficiency=m["real_frames"] / max(m["padded_frames"], 1),
+            mean_wait_ms=m["wait_seconds"] / jobs * 1000,
+            mean_sample_ms=m["sample_seconds"] / batches * 1000,
+        )
@@ -0,0 +1,109 @@
+# torch.compile'd DiT inference with duration bucketing
+# Every chunk samples a different number of frames, which would make any compiled graph recompile constantly.
+# With a compiled model, CFM.sample pads the frame count up to the next bucket edge and masks the padding, so the
+# transformer blocks (DiT.run_blocks) only see a few sequence lengths and each graph is built once per process.
+# Embeddings, the step cache and the ODE loop stay eager
+import threading
+from collections import Counter
+
+import torch
+
+
+# -----------------------------------------
+
+duration_buckets = (256, 384, 512, 768, 1024, 1536, 2048, 3072, 4096)  # mel frames, 4096 is CFM.sample's maximum
+compile_mode = None  # torch.compile mode, "max-autotune-no-cudagraphs" builds faster kernels with a longer warm-up
+graphs_per_bucket = 4  # dynamo graph cache room per bucket (batch sizes, cfg folding, dtypes)
+
+# -----------------------------------------
+
+
+def bucket_for(frames, buckets=duration_buckets):
+    # smallest edge holding frames, frames itself past the last edge
+    return next((edge for edge in buckets if edge >= frames), frames)
+
+
+def _raise_graph_limit(limit):
+    # dynamo keeps a bounded number of graphs per function and falls back to eager past it
+    config = torch._dynamo.config
+    name = "recompile_limit" if hasattr(config, "recompile_limit") else "cache_size_limit"
+    setattr(config, name, max(getattr(config, name), limit))
+
+
+class CompiledBlocks:
+    # stands in for DiT.run_blocks, one graph per (batch, frames, dtype, masked) shape key
+    def __init__(self, dit, buckets=duration_buckets, mode=compile_mode):
+        self.dit = dit
+        self.buckets = tuple(sorted(buckets))
+        self.compiled = torch.compile(dit.run_blocks, mode=mode, dynamic=False)
+        _raise_graph_limit(graphs_per_bucket * len(self.buckets))
+
+        self._compile_lock = threading.Lock()  # graph building is not thread-safe
+        self._stats_lock = threading.Lock()
+        self._ready = set()
+        self.calls = Counter()  # shape key -> calls
+        self.compiles = 0
+        self.recompiles = 0  # graphs built after warm-up, each one stalled a request
+        self.unbucketed = 0  # graphs built for a length that is not a bucket edge
+        self.warmed_up = False
+
+    def __call__(self, x, t, mask, rope):
+        key = (x.shape[0], x.shape[1], x.dtype, mask is not None)
+        with self._stats_lock:
+            self.calls[key] += 1
+        if key in self._ready:
+            return self.compiled(x, t, mask, rope)
+
+        with self._compile_lock:
+            if key not in self._ready:
+                with self._stats_lock:
+                    self.compiles += 1
+                    self.recompiles += self.warmed_up
+                    self.unbucketed += x.shape[1] not in self.buckets
+            output = self.compiled(x, t, mask, rope)
+            self._ready.add(key)
+        return output
+
+    def warmup(self, batch_sizes=(1,), buckets=None):
+        # builds the graphs of every bucket up front, batch sizes as seen by the blocks (doubled with cfg folding)
+        param = next(self.dit.parameters())
+        for frames in buckets or self.buckets:
+            rope = self.dit.rotary_embed.forward_from_seq_len(frames)
+            for batch in batch_sizes:
+                x = torch.zeros(batch, frames, self.dit.dim, dtype=param.dtype, device=param.device)
+                t = torch.zeros(batch, self.dit.dim, dtype=param.dtype, device=param.device)
+                mask = torch.ones(batch, frames, dtype=torch.bool, device=param.device)
+                with torch.no_grad():  # as in CFM.sample, grad mode is part of the graph guards
+                    self(x, t, mask, rope)
+        self.warmed_up = True
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(
+                buckets=self.buckets,
+                graphs=len(self._ready),
+                compiles=self.compiles,
+                recompiles=self.recompiles,
+                unbucketed=self.unbucketed,
+                calls=sum(self.calls.values()),
+            )
+
+
+def compile_model_(model, buckets=duration_buckets, mode=compile_mode):
+    # model: CFM, in place; returns the CompiledBlocks, None for backbones without run_blocks (UNetT, MMDiT)
+    dit = model.transformer
+    if not hasattr(dit, "run_blocks"):
+        print(f"torch.compile with duration buckets supports DiT only, {type(dit).__name__} stays eager")
+        return None
+    dit.compiled_blocks = CompiledBlocks(dit, buckets, mode)
+    model.duration_buckets = dit.compiled_blocks.buckets
+    return dit.compiled_blocks
+
+
+def warmup_model(model, batch_sizes=None):
+    # batch_sizes default to single requests, doubled when cfg is folded into one forward
+    compiled = getattr(model.transformer, "compiled_blocks", None)
+    if compiled is None:
+        return None
+    compiled.warmup(batch_sizes or ((2,) if model.fold_cfg else (1,)))
+    return compiled.stats()
@@ -24,7 +24,7 @@ from English_f5tts.infer.utils_infer import (
     mel_spec_type,
     nfe_step,
     preprocess_ref_audio_text,
-    remove_silence_for_generated_wav,
+    remove_silence_from_wave,
     speed,
     sway_sampling_coef,
     target_rms,
@@ -356,11 +356,11 @@ def main():
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
+        # Remove silence
+        if remove_silence:
+            final_wave = remove_silence_from_wave(final_wave, final_sample_rate)
         with open(wave_path, "wb") as f:
             sf.write(f.name, final_wave, final_sample_rate)
-            # Remove silence
-            if remove_silence:
-                remove_silence_for_generated_wav(f.name)
             print(f.name)
 
 
@@ -0,0 +1,144 @@
+# onnxruntime backend, the DiT step and the Vocos decoder exported by infer/onnx_export.py run on the CPU execution
+# provider. CFM keeps the ODE loop, text tokenization and reference mel extraction, with an OnnxDiT in place of the
+# DiT; OnnxVocos replaces vocos.Vocos for decode
+import json
+import os
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from English_f5tts.model import CFM
+from English_f5tts.model.utils import get_tokenizer
+
+
+# -----------------------------------------
+
+dit_onnx = "dit.onnx"
+vocos_onnx = "vocos.onnx"
+onnx_config = "config.json"
+onnx_vocab = "vocab.txt"
+onnx_opset = 17
+onnx_threads = 0  # intra-op threads per session, 0 for the onnxruntime default (one per physical core)
+
+# -----------------------------------------
+
+
+def onnx_session(path, threads=onnx_threads):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    return ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+def load_onnx_config(onnx_dir):
+    with open(os.path.join(onnx_dir, onnx_config), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _numpy(tensor, dtype=np.float32):
+    return np.ascontiguousarray(tensor.detach().cpu().numpy(), dtype=dtype)
+
+
+class OnnxDiT(nn.Module):
+    # stands in for DiT inside CFM, one session run per ode step with the cond and uncond pass stacked along batch
+    def __init__(self, session, dim, mel_dim):
+        super().__init__()
+        self.session = session
+        self.dim = dim
+        self.mel_dim = mel_dim
+        # CFM reads its device and dtype from the first parameter
+        self.anchor = nn.Parameter(torch.zeros(0), requires_grad=False)
+
+    def clear_cache(self):
+        pass
+
+    def forward(self, x, cond, text, time, drop_audio_cond, drop_text, mask=None, cache=False, cfg_infer=False):
+        batch, seq_len = x.shape[0], x.shape[1]
+        if time.ndim == 0:
+            time = time.repeat(batch)
+        if mask is None:
+            mask = torch.ones(batch, seq_len, dtype=torch.bool)
+
+        (flow,) = self.session.run(
+            None,
+            dict(
+                x=_numpy(x),
+                cond=_numpy(cond),
+                text=_numpy(text, np.int64),
+                time=_numpy(time),
+                mask=_numpy(mask, np.bool_),
+            ),
+        )
+        flow = torch.from_numpy(flow)
+        if cfg_infer:
+            return flow
+        # a single pass (cfg off or not folded), half of the stacked output
+        return flow[batch:] if drop_audio_cond and drop_text else flow[:batch]
+
+
+def istft(real, imag, n_fft, hop_length, win_length, padding="same"):
+    # inverse of vocos.spectral_ops.ISTFT, "b (n_fft // 2 + 1) t" real and imaginary parts -> "b nw"
+    assert win_length == n_fft and n_fft % hop_length == 0, "exported Vocos heads use win_length == n_fft"
+    frames = np.fft.irfft(real + 1j * imag, n=n_fft, axis=1).astype(np.float32)
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(win_length) / win_length)).astype(np.float32)  # periodic hann
+    frames *= window[None, :, None]
+
+    # overlap-add, frame i's r-th hop-sized block lands on output block i + r
+    batch, _, num_frames = frames.shape
+    ratio = n_fft // hop_length
+    blocks = frames.reshape(batch, ratio, hop_length, num_frames)
+    envelope_blocks = np.square(window).reshape(ratio, hop_length)
+    wave = np.zeros((batch, (num_frames + ratio - 1) * hop_length), dtype=np.float32)
+    envelope = np.zeros(wave.shape[1], dtype=np.float32)
+    for r in range(ratio):
+        span = slice(r * hop_length, (r + num_frames) * hop_length)
+        wave[:, span] += blocks[:, r].transpose(0, 2, 1).reshape(batch, -1)
+        envelope[span] += np.tile(envelope_blocks[r], num_frames)
+
+    pad = n_fft // 2 if padding == "center" else (win_length - hop_length) // 2
+    wave, envelope = wave[:, pad : wave.shape[1] - pad], envelope[pad : envelope.shape[0] - pad]
+    return wave / np.maximum(envelope, 1e-11)
+
+
+class OnnxVocos:
+    # decode-only Vocos, backbone and head projection in the session, the inverse STFT in numpy
+    def __init__(self, session, n_fft, hop_length, win_length, padding):
+        self.session = session
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.win_length = win_length
+        self.padding = padding
+
+    def decode(self, mel):
+        # mel "b d n" -> wave "b nw"
+        real, imag = self.session.run(None, dict(mel=_numpy(mel)))
+        return torch.from_numpy(istft(real, imag, self.n_fft, self.hop_length, self.win_length, self.padding))
+
+
+def load_onnx_vocoder(onnx_dir, threads=onnx_threads):
+    config = load_onnx_config(onnx_dir)
+    return OnnxVocos(onnx_session(os.path.join(onnx_dir, vocos_onnx), threads), **config["istft"])
+
+
+def load_onnx_model(onnx_dir, ode_method="euler", threads=onnx_threads):
+    # CFM with the exported DiT, vocab and mel settings as written by infer/onnx_export.py
+    config = load_onnx_config(onnx_dir)
+    vocab_char_map, vocab_size = get_tokenizer(os.path.join(onnx_dir, onnx_vocab), "custom")
+    assert vocab_size == config["vocab_size"], f"{onnx_vocab} does not match the exported text embedding"
+
+    print("\nvocab : ", os.path.join(onnx_dir, onnx_vocab))
+    print("model : ", os.path.join(onnx_dir, dit_onnx), "(onnxruntime)\n")
+
+    transformer = OnnxDiT(onnx_session(os.path.join(onnx_dir, dit_onnx), threads), config["dim"], config["mel_dim"])
+    return CFM(
+        transformer=transformer,
+        mel_spec_kwargs=config["mel_spec"],
+        odeint_kwargs=dict(method=ode_method),
+        vocab_char_map=vocab_char_map,
+        fold_cfg=True,
+    ).eval()
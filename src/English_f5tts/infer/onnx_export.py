@@ -0,0 +1,192 @@
+# Export a checkpoint to ONNX for the onnxruntime backend (infer/onnx_backend.py, F5TTS(backend="onnx"))
+# Writes dit.onnx (one cfg-folded ode step), vocos.onnx (mel -> complex spectrogram), config.json and vocab.txt,
+# with dynamic batch / frame / text axes, then checks both graphs against PyTorch at shapes unlike the traced ones
+# python src/English_f5tts/infer/onnx_export.py -p my_project/model_last.pt -v my_project/vocab.txt -o onnx/my_project
+import argparse
+import json
+import os
+import shutil
+import sys
+from importlib.resources import files
+
+import numpy as np
+import torch
+import torch.nn as nn
+from hydra.utils import get_class
+from omegaconf import OmegaConf
+
+from English_f5tts.infer.onnx_backend import (
+    OnnxVocos,
+    dit_onnx,
+    onnx_config,
+    onnx_opset,
+    onnx_session,
+    onnx_vocab,
+    vocos_onnx,
+)
+from English_f5tts.infer.utils_infer import load_model, load_vocoder
+
+
+class DiTStep(nn.Module):
+    # cond and uncond flow of one ode step stacked along batch, DiT.forward(cfg_infer=True) without the step cache
+    def __init__(self, dit):
+        super().__init__()
+        self.dit = dit
+
+    def forward(self, x, cond, text, time, mask):
+        return self.dit(
+            x=x, cond=cond, text=text, time=time, mask=mask, drop_audio_cond=False, drop_text=False, cfg_infer=True
+        )
+
+
+class VocosSpectrum(nn.Module):
+    # Vocos.decode up to the complex spectrogram as real and imaginary parts, the inverse STFT runs in numpy
+    def __init__(self, vocos):
+        super().__init__()
+        self.backbone = vocos.backbone
+        self.out = vocos.head.out
+
+    def forward(self, mel):
+        x = self.out(self.backbone(mel)).transpose(1, 2)
+        mag, phase = x.chunk(2, dim=1)
+        mag = torch.clip(torch.exp(mag), max=1e2)
+        return mag * torch.cos(phase), mag * torch.sin(phase)
+
+
+def dit_inputs(dit, batch, frames, text_len):
+    return (
+        torch.randn(batch, frames, dit.mel_dim),
+        torch.randn(batch, frames, dit.mel_dim),
+        torch.randint(0, 64, (batch, text_len)),
+        torch.rand(batch),
+        torch.ones(batch, frames, dtype=torch.bool),
+    )
+
+
+def export_dit(model, path, opset=onnx_opset):
+    dit = model.transformer.float().eval()
+    torch.onnx.export(
+        DiTStep(dit),
+        dit_inputs(dit, 2, 300, 120),
+        path,
+        input_names=["x", "cond", "text", "time", "mask"],
+        output_names=["flow"],
+        dynamic_axes=dict(
+            x={0: "batch", 1: "frames"},
+            cond={0: "batch", 1: "frames"},
+            text={0: "batch", 1: "text_len"},
+            time={0: "batch"},
+            mask={0: "batch", 1: "frames"},
+            flow={0: "batch2", 1: "frames"},
+        ),
+        opset_version=opset,
+        do_constant_folding=True,
+    )
+
+
+def export_vocos(vocos, path, opset=onnx_opset):
+    torch.onnx.export(
+        VocosSpectrum(vocos.float().eval()),
+        (torch.randn(1, vocos.backbone.input_channels, 300),),
+        path,
+        input_names=["mel"],
+        output_names=["real", "imag"],
+        dynamic_axes=dict(
+            mel={0: "batch", 2: "frames"},
+            real={0: "batch", 2: "frames"},
+            imag={0: "batch", 2: "frames"},
+        ),
+        opset_version=opset,
+        do_constant_folding=True,
+    )
+
+
+def check_export(model, vocos, output_dir):
+    # max abs difference to PyTorch at a batch size and lengths the graphs were not traced with
+    dit = model.transformer
+    inputs = dit_inputs(dit, 3, 517, 201)
+    with torch.inference_mode():
+        expected = DiTStep(dit)(*inputs).numpy()
+        mel = torch.randn(2, vocos.backbone.input_channels, 411)
+        expected_wave = vocos.decode(mel).numpy()
+
+    session = onnx_session(os.path.join(output_dir, dit_onnx))
+    names = ["x", "cond", "text", "time", "mask"]
+    (flow,) = session.run(None, {name: tensor.numpy() for name, tensor in zip(names, inputs)})
+
+    istft = vocos.head.istft
+    session = onnx_session(os.path.join(output_dir, vocos_onnx))
+    onnx_vocos = OnnxVocos(session, istft.n_fft, istft.hop_length, istft.win_length, istft.padding)
+    wave = onnx_vocos.decode(mel).numpy()
+    return dict(dit=float(np.abs(flow - expected).max()), vocos=float(np.abs(wave - expected_wave).max()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a checkpoint and Vocos to ONNX for the onnxruntime backend.")
+    parser.add_argument("-m", "--model", type=str, default="F5TTS_v1_Base", help="model config name under configs/")
+    parser.add_argument("-p", "--ckpt_file", type=str, required=True, help="project checkpoint .pt / .safetensors")
+    parser.add_argument("-v", "--vocab_file", type=str, default="", help="vocab.txt the checkpoint was trained with")
+    parser.add_argument("-o", "--output_dir", type=str, required=True)
+    parser.add_argument("--no_ema", action="store_true", help="export the online model instead of the ema weights")
+    parser.add_argument("--vocoder_local_path", type=str, default=None)
+    parser.add_argument("--opset", type=int, default=onnx_opset)
+    parser.add_argument("--tolerance", type=float, default=1e-3, help="max abs difference allowed against PyTorch")
+    args = parser.parse_args()
+
+    model_cfg = OmegaConf.load(str(files("English_f5tts").joinpath(f"configs/{args.model}.yaml")))
+    model_cls = get_class(f"English_f5tts.model.{model_cfg.model.backbone}")
+    mel_spec = model_cfg.model.mel_spec
+    if mel_spec.mel_spec_type != "vocos":
+        sys.exit("Only vocos models can be exported, the onnxruntime backend has no BigVGAN decoder")
+    vocab_file = args.vocab_file or str(files("English_f5tts").joinpath("infer/examples/vocab.txt"))
+
+    model = load_model(
+        model_cls,
+        model_cfg.model.arch,
+        args.ckpt_file,
+        mel_spec_type="vocos",
+        vocab_file=vocab_file,
+        use_ema=not args.no_ema,
+        device="cpu",
+        quantize=False,
+        dtype="fp32",
+        compile_dit=False,
+    )
+    vocos = load_vocoder("vocos", args.vocoder_local_path is not None, args.vocoder_local_path, "cpu", quantize=False)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    export_dit(model, os.path.join(args.output_dir, dit_onnx), args.opset)
+    export_vocos(vocos, os.path.join(args.output_dir, vocos_onnx), args.opset)
+    shutil.copyfile(vocab_file, os.path.join(args.output_dir, onnx_vocab))
+
+    istft = vocos.head.istft
+    config = dict(
+        model=args.model,
+        ckpt_file=os.path.abspath(args.ckpt_file),
+        dim=model.transformer.dim,
+        mel_dim=model.transformer.mel_dim,
+        vocab_size=model.transformer.text_embed.text_embed.num_embeddings - 1,
+        mel_spec=dict(
+            n_fft=mel_spec.n_fft,
+            hop_length=mel_spec.hop_length,
+            win_length=mel_spec.win_length,
+            n_mel_channels=mel_spec.n_mel_channels,
+            target_sample_rate=mel_spec.target_sample_rate,
+            mel_spec_type=mel_spec.mel_spec_type,
+        ),
+        istft=dict(n_fft=istft.n_fft, hop_length=istft.hop_length, win_length=istft.win_length, padding=istft.padding),
+        opset=args.opset,
+        torch=torch.__version__,
+    )
+    with open(os.path.join(args.output_dir, onnx_config), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=4)
+    print(f"Exported {args.ckpt_file} to {args.output_dir}")
+
+    diffs = check_export(model, vocos, args.output_dir)
+    print(f"max abs difference to PyTorch: {diffs}")
+    if max(diffs.values()) > args.tolerance:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
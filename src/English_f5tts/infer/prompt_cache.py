@@ -0,0 +1,195 @@
+# Content-addressed cache of preprocessed reference prompts
+# Keyed by the hash of the raw upload, so a voice prompt sent again (e.g. every row of a CSV job) skips silence
+# clipping, resampling, transcription and the reference mel. Entries live on disk (clipped wav + tensors) with an
+# in-memory LRU in front, and the disk part is bounded in bytes with least-recently-used eviction. Eviction only
+# deletes the files: a request that already holds the wav path keeps resolving it to the in-memory prompt
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import torch
+
+from English_f5tts.model.modules import resample
+
+
+# -----------------------------------------
+
+ref_prompt_cache_dir = os.path.join(tempfile.gettempdir(), "English_f5tts_ref_prompts")
+ref_prompt_cache_max_bytes = 512 * 1024 * 1024  # on disk
+ref_prompt_memory_entries = 64
+
+# -----------------------------------------
+
+
+class RefPrompt:
+    __slots__ = ("key", "wav_path", "audio", "rms", "target_rms", "mels", "ref_text")
+
+    def __init__(self, key, wav_path, audio, rms, target_rms, mels=None, ref_text=None):
+        self.key = key
+        self.wav_path = wav_path  # clipped waveform, as written by preprocess_ref_audio_text
+        self.audio = audio  # "1 nw" mono, rms normalized to target_rms (if quieter), at target sample rate, cpu
+        self.rms = rms  # rms of the clipped waveform before normalization, generated audio is scaled back to it
+        self.target_rms = target_rms
+        self.mels = mels or {}  # mel_spec_type -> reference mel "1 n d", cpu
+        self.ref_text = ref_text  # asr transcription, custom ref_text is never stored
+
+    def state(self):
+        return dict(audio=self.audio, rms=self.rms, target_rms=self.target_rms, mels=self.mels, ref_text=self.ref_text)
+
+
+def condition_prompt_audio(audio, sr, target_rms, target_sample_rate):
+    # same conditioning as infer_batch_process: mono, rms boosted to target_rms, resampled
+    audio = audio.float()
+    if audio.shape[0] > 1:
+        audio = torch.mean(audio, dim=0, keepdim=True)
+    rms = torch.sqrt(torch.mean(torch.square(audio))).item()
+    if rms < target_rms:
+        audio = audio * target_rms / rms
+    audio = resample(audio, sr, target_sample_rate)
+    return audio, rms
+
+
+class RefPromptCache:
+    def __init__(
+        self,
+        cache_dir=ref_prompt_cache_dir,
+        max_bytes=ref_prompt_cache_max_bytes,
+        memory_entries=ref_prompt_memory_entries,
+    ):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> RefPrompt, least recently used first
+        self._disk = None  # key -> bytes on disk, least recently used first, scanned on first use
+        self.stats = dict(hits=0, disk_hits=0, misses=0, evictions=0)
+
+    def key(self, ref_audio_orig, clip_short=True):
+        h = hashlib.sha256()
+        with open(ref_audio_orig, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        return f"{h.hexdigest()}{'' if clip_short else '_full'}"
+
+    def wav_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.wav")
+
+    def _state_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pt")
+
+    def _scan(self):
+        # called with self._lock held
+        if self._disk is not None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".pt"):
+                continue
+            key = name[:-3]
+            paths = (self._state_path(key), self.wav_path(key))
+            if not os.path.isfile(paths[1]):
+                continue
+            entries.append((os.path.getmtime(paths[0]), key, sum(os.path.getsize(p) for p in paths)))
+        self._disk = OrderedDict((key, nbytes) for _, key, nbytes in sorted(entries))
+
+    def get(self, key):
+        with self._lock:
+            self._scan()
+            prompt = self._memory.get(key)
+            if prompt is not None:
+                self._memory.move_to_end(key)
+                if key in self._disk:
+                    self._touch(key)
+                self.stats["hits"] += 1
+                return prompt
+            if key not in self._disk:
+                self.stats["misses"] += 1
+                return None
+
+            try:
+                state = torch.load(self._state_path(key), map_location="cpu", weights_only=True)  # tensors and floats
+            except Exception:  # partially written or removed by hand
+                self._remove(key)
+                self.stats["misses"] += 1
+                return None
+            prompt = RefPrompt(key, self.wav_path(key), **state)
+            self._remember(prompt)
+            self._touch(key)
+            self.stats["disk_hits"] += 1
+            return prompt
+
+    def find(self, wav_path):
+        # prompt for a clipped wav path handed out by preprocess_ref_audio_text, None for any other file
+        if os.path.dirname(os.path.abspath(wav_path)) != os.path.abspath(self.cache_dir):
+            return None
+        return self.get(os.path.splitext(os.path.basename(wav_path))[0])
+
+    def on_disk(self, prompt):
+        # False once the prompt was evicted, its wav is gone and only the in-memory tensors are left
+        with self._lock:
+            self._scan()
+            return prompt.key in self._disk
+
+    def put(self, prompt):
+        # writes (or rewrites, e.g. after a transcription or a new mel was added) the entry
+        with self._lock:
+            self._scan()
+            if not os.path.isfile(prompt.wav_path):
+                # evicted while in use, updated in memory only
+                self._remember(prompt)
+                return prompt
+            state_path = self._state_path(prompt.key)
+            tmp_path = f"{state_path}.{threading.get_ident()}.tmp"
+            torch.save(prompt.state(), tmp_path)
+            os.replace(tmp_path, state_path)
+
+            self._disk[prompt.key] = os.path.getsize(state_path) + os.path.getsize(prompt.wav_path)
+            self._disk.move_to_end(prompt.key)
+            self._remember(prompt)
+            self._evict()
+        return prompt
+
+    def _remember(self, prompt):
+        self._memory[prompt.key] = prompt
+        self._memory.move_to_end(prompt.key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _touch(self, key):
+        self._disk.move_to_end(key)
+        try:
+            os.utime(self._state_path(key))  # mtime orders the entries again after a restart
+        except OSError:
+            pass
+
+    def _remove(self, key, forget=True):
+        self._disk.pop(key, None)
+        if forget:
+            self._memory.pop(key, None)
+        for path in (self._state_path(key), self.wav_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _evict(self):
+        # never evicts the most recently used entry; evicted prompts stay in the memory LRU, so requests that hold
+        # their wav path (infer_process, through find) still get the conditioned audio and mels without the file
+        while len(self._disk) > 1 and sum(self._disk.values()) > self.max_bytes:
+            key = next(iter(self._disk))
+            self._remove(key, forget=False)
+            self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._scan()
+            for key in list(self._disk):
+                self._remove(key)
+            self._memory.clear()
+
+
+ref_prompt_cache = RefPromptCache()
@@ -87,14 +87,36 @@ class InputEmbedding(nn.Module):
         self.proj = nn.Linear(mel_dim * 2 + text_dim, out_dim)
         self.conv_pos_embed = ConvPositionEmbedding(dim=out_dim)
 
-    def forward(self, x: float["b n d"], cond: float["b n d"], text_embed: float["b n d"], drop_audio_cond=False):  # noqa: F722
-        if drop_audio_cond:  # cfg for cond audio
-            cond = torch.zeros_like(cond)
+    def forward(
+        self,
+        x: float["b n d"],  # noqa: F722
+        cond: float["b n d"],  # noqa: F722
+        text_embed: float["b n d"],  # noqa: F722
+        drop_audio_cond=False,
+        static: tuple | None = None,  # from project_static, cond and text_embed are then ignored
+        mask: bool["b n"] | None = None,  # noqa: F722
+    ):
+        if static is not None:
+            proj_x_weight, static_proj = static
+            x = F.linear(x, proj_x_weight) + static_proj
+        else:
+            if drop_audio_cond:  # cfg for cond audio
+                cond = torch.zeros_like(cond)
 
-        x = self.proj(torch.cat((x, cond, text_embed), dim=-1))
-        x = self.conv_pos_embed(x) + x
+            x = self.proj(torch.cat((x, cond, text_embed), dim=-1))
+        x = self.conv_pos_embed(x, mask) + x
         return x
 
+    def project_static(self, mel_dim, cond: float["b n d"], text_embed: float["b n d"], drop_audio_cond=False):  # noqa: F722
+        # proj is linear over cat(x, cond, text), so the cond and text part (with bias) is fixed for all ode steps
+        if drop_audio_cond:
+            cond = torch.zeros_like(cond)
+        weight, bias = self.proj.weight, self.proj.bias
+        if callable(weight):  # int8 dynamic quantized proj (infer/quantize.py), weight-only int8 from here on
+            weight, bias = weight().dequantize(), bias()
+        static_proj = F.linear(torch.cat((cond, text_embed), dim=-1), weight[:, mel_dim:], bias)
+        return weight[:, :mel_dim].contiguous(), static_proj
+
 
 # Transformer backbone using DiT blocks
 
@@ -128,7 +150,18 @@ class DiT(nn.Module):
             text_num_embeds, text_dim, mask_padding=text_mask_padding, conv_layers=conv_layers
         )
         self.text_cond, self.text_uncond = None, None  # text cache
+        self.text_cfg = None  # text cache of the cond and uncond pass stacked along batch, for cfg_infer
         self.input_embed = InputEmbedding(mel_dim, text_dim, dim)
+        self.mel_dim = mel_dim
+
+        # prepared sampling context, step-invariant work reused across ode steps when forward is called with cache
+        self.step_cache = True
+        self.rope_cache = None  # rotary freqs for the sample's seq_len
+        self.time_cache = {}  # time value -> timestep embedding, filled for the whole schedule by prepare_sampling
+        self.input_cache = {}  # (drop_audio_cond, drop_text, cfg_infer) -> cond/text contribution to input proj
+        self.compiled_blocks = None  # torch.compile'd run_blocks used for inference (infer/compiled.py)
+        self.skip_state = {}  # (drop_audio_cond, drop_text, cfg_infer) -> step skipping state, see run_or_skip_blocks
+        self.skip_stats = dict(steps=0, skipped=0)  # of the last sample call
 
         self.rotary_embed = RotaryEmbedding(dim_head)
 
@@ -156,6 +189,11 @@ class DiT(nn.Module):
 
         self.checkpoint_activations = checkpoint_activations
 
+        # adaptive norm linears of all blocks and norm_out in one GEMM for inference, set by fuse_projections_
+        self.register_buffer("modulation_weight", None, persistent=False)
+        self.register_buffer("modulation_bias", None, persistent=False)
+        self.modulation_splits = None
+
         self.initialize_weights()
 
     def initialize_weights(self):
@@ -178,8 +216,70 @@ class DiT(nn.Module):
 
         return ckpt_forward
 
+    def fuse_projections_(self):
+        # inference only, fused qkv in every block and one modulation GEMM per step (it depends on t alone).
+        # Parameters become views into the fused weights, so state dicts load and save in the original layout
+        fused_qkv = [block.attn.fuse_qkv_() for block in self.transformer_blocks]
+        linears = [block.attn_norm.linear for block in self.transformer_blocks] + [self.norm_out.linear]
+        if not all(isinstance(linear, nn.Linear) for linear in linears):
+            return all(fused_qkv)
+        self.modulation_weight = torch.cat([linear.weight.data for linear in linears])
+        self.modulation_bias = torch.cat([linear.bias.data for linear in linears])
+        self.modulation_splits = [linear.out_features for linear in linears]
+        weights = self.modulation_weight.split(self.modulation_splits)
+        biases = self.modulation_bias.split(self.modulation_splits)
+        for linear, weight, bias in zip(linears, weights, biases):
+            linear.weight.data, linear.bias.data = weight, bias
+        return all(fused_qkv)
+
+    def _apply(self, fn, *args, **kwargs):
+        # .to() / .half() give the parameters new storage, fuse again so they stay views of the fused weights
+        super()._apply(fn, *args, **kwargs)
+        if self.modulation_weight is not None:
+            self.fuse_projections_()
+        return self
+
     def clear_cache(self):
         self.text_cond, self.text_uncond = None, None
+        self.text_cfg = None
+        self.rope_cache = None
+        self.time_cache = {}
+        self.input_cache = {}
+        self.skip_state = {}
+
+    def prepare_sampling(self, times: float["s"]):  # noqa: F821
+        # timestep embeddings of the full ode schedule in one batched call (midpoint evaluations fill in lazily)
+        self.skip_stats = dict(steps=0, skipped=0)
+        if self.step_cache:
+            self.time_cache = dict(zip(times.tolist(), self.time_embed(times).unbind(0)))
+
+    def get_time_embed(self, time, batch, cache=False):
+        if not (cache and self.step_cache and time.ndim == 0):
+            if time.ndim == 0:
+                time = time.repeat(batch)
+            return self.time_embed(time)
+        key = time.item()
+        if key not in self.time_cache:
+            self.time_cache[key] = self.time_embed(time.reshape(1))[0]
+        return self.time_cache[key].unsqueeze(0).repeat(batch, 1)
+
+    def get_rope(self, seq_len, cache=False):
+        if not (cache and self.step_cache):
+            return self.rotary_embed.forward_from_seq_len(seq_len)
+        if self.rope_cache is None:
+            self.rope_cache = self.rotary_embed.forward_from_seq_len(seq_len)
+        return self.rope_cache
+
+    def get_text_embed(self, text, seq_len, drop_text=False, cache=False):
+        if not cache:
+            return self.text_embed(text, seq_len, drop_text=drop_text)
+        if drop_text:
+            if self.text_uncond is None:
+                self.text_uncond = self.text_embed(text, seq_len, drop_text=True)
+            return self.text_uncond
+        if self.text_cond is None:
+            self.text_cond = self.text_embed(text, seq_len, drop_text=False)
+        return self.text_cond
 
     def forward(
         self,
@@ -191,42 +291,106 @@ class DiT(nn.Module):
         drop_text,  # cfg for text
         mask: bool["b n"] | None = None,  # noqa: F722
         cache=False,
+        cfg_infer=False,  # cond and uncond (drop audio cond and text) pass in one forward, output b n d -> 2b n d
+        skip_threshold=0.0,  # > 0 reuses the last blocks residual while the input changed less, see run_or_skip_blocks
     ):
         batch, seq_len = x.shape[0], x.shape[1]
-        if time.ndim == 0:
-            time = time.repeat(batch)
 
         # t: conditioning time, text: text, x: noised audio + cond audio + text
-        t = self.time_embed(time)
-        if cache:
-            if drop_text:
-                if self.text_uncond is None:
-                    self.text_uncond = self.text_embed(text, seq_len, drop_text=True)
-                text_embed = self.text_uncond
-            else:
-                if self.text_cond is None:
-                    self.text_cond = self.text_embed(text, seq_len, drop_text=False)
-                text_embed = self.text_cond
-        else:
-            text_embed = self.text_embed(text, seq_len, drop_text=drop_text)
-        x = self.input_embed(x, cond, text_embed, drop_audio_cond=drop_audio_cond)
-
-        rope = self.rotary_embed.forward_from_seq_len(seq_len)
-
-        if self.long_skip_connection is not None:
-            residual = x
-
-        for block in self.transformer_blocks:
+        t = self.get_time_embed(time, batch, cache=cache)
+
+        # with the step cache, only the x-dependent part of the input projection runs after the first step
+        step_cache = cache and self.step_cache
+        static_key = (drop_audio_cond, drop_text, cfg_infer)
+        static = self.input_cache.get(static_key) if step_cache else None
+        text_embed = None
+
+        if cfg_infer:  # cond and uncond pass stacked along batch
+            if static is None:
+                if cache and self.text_cfg is not None:
+                    text_embed = self.text_cfg
+                else:
+                    text_embed = torch.cat(
+                        (
+                            self.get_text_embed(text, seq_len, drop_text=False),
+                            self.get_text_embed(text, seq_len, drop_text=True),
+                        ),
+                        dim=0,
+                    )
+                    if cache:
+                        self.text_cfg = text_embed
+                cond = torch.cat((cond, torch.zeros_like(cond)), dim=0)
+            x = torch.cat((x, x), dim=0)
+            t = torch.cat((t, t), dim=0)
+            if mask is not None:
+                mask = torch.cat((mask, mask), dim=0)
+            drop_audio_cond = False
+        elif static is None:
+            text_embed = self.get_text_embed(text, seq_len, drop_text=drop_text, cache=cache)
+
+        if step_cache and static is None:
+            static = self.input_cache[static_key] = self.input_embed.project_static(
+                self.mel_dim, cond, text_embed, drop_audio_cond=drop_audio_cond
+            )
+        # masked, so batch padding does not leak into a row's last frames through the conv position embedding and a
+        # row samples the same as it would alone (training passes no mask)
+        x = self.input_embed(x, cond, text_embed, drop_audio_cond=drop_audio_cond, static=static, mask=mask)
+
+        rope = self.get_rope(seq_len, cache=cache)
+
+        if skip_threshold > 0 and step_cache and not self.training:
+            return self.run_or_skip_blocks(x, t, mask, rope, static_key, skip_threshold)
+        if self.compiled_blocks is not None and not self.training:
+            return self.compiled_blocks(x, t, mask, rope)
+        return self.run_blocks(x, t, mask, rope)
+
+    def get_modulations(self, t):
+        # adaptive norm modulations of every block and norm_out, one GEMM when fused, else each layer runs its own
+        if self.modulation_weight is None or self.training:
+            return [None] * (self.depth + 1)
+        return F.linear(F.silu(t), self.modulation_weight, self.modulation_bias).split(self.modulation_splits, dim=-1)
+
+    def run_body(self, x, t, mask, rope, modulations):
+        for block, modulation in zip(self.transformer_blocks, modulations):
             if self.checkpoint_activations:
                 # https://pytorch.org/docs/stable/checkpoint.html#torch.utils.checkpoint.checkpoint
-                x = torch.utils.checkpoint.checkpoint(self.ckpt_wrapper(block), x, t, mask, rope, use_reentrant=False)
+                x = torch.utils.checkpoint.checkpoint(
+                    self.ckpt_wrapper(block), x, t, mask, rope, modulation, use_reentrant=False
+                )
             else:
-                x = block(x, t, mask=mask, rope=rope)
+                x = block(x, t, mask=mask, rope=rope, modulation=modulation)
+        return x
 
+    def run_head(self, x, residual, t, modulation=None):
         if self.long_skip_connection is not None:
             x = self.long_skip_connection(torch.cat((x, residual), dim=-1))
 
-        x = self.norm_out(x, t)
-        output = self.proj_out(x)
-
-        return output
+        x = self.norm_out(x, t, modulation=modulation)
+        return self.proj_out(x)
+
+    def run_blocks(self, x, t, mask, rope):
+        # transformer blocks and output projection, pure tensor code so it can be compiled
+        modulations = self.get_modulations(t)
+        hidden = self.run_body(x, t, mask, rope, modulations[:-1])
+        return self.run_head(hidden, x, t, modulations[-1])
+
+    def run_or_skip_blocks(self, x, t, mask, rope, key, threshold):
+        # TeaCache-style step skipping, per branch (key): the relative L1 change of the first block's modulated
+        # input since the last step is accumulated, and while it stays under threshold the blocks are skipped by
+        # adding the residual they produced on the last full run. Runs eager, also on a compiled model
+        modulations = self.get_modulations(t)
+        modulated = self.transformer_blocks[0].attn_norm(x, emb=t, modulation=modulations[0])[0]
+        state = self.skip_state.get(key)
+        self.skip_stats["steps"] += 1
+
+        if state is not None:
+            previous = state["modulated"]
+            state["modulated"] = modulated
+            state["change"] += ((modulated - previous).abs().mean() / previous.abs().mean()).item()
+            if state["change"] < threshold:
+                self.skip_stats["skipped"] += 1
+                return self.run_head(x + state["residual"], x, t, modulations[-1])
+
+        hidden = self.run_body(x, t, mask, rope, modulations[:-1])
+        self.skip_state[key] = dict(modulated=modulated, residual=hidden - x, change=0.0)
+        return self.run_head(hidden, x, t, modulations[-1])
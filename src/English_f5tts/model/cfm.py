@@ -9,6 +9,7 @@ d - dimension
 
 from __future__ import annotations
 
+import inspect
 from random import random
 from typing import Callable
 
@@ -18,7 +19,9 @@ from torch import nn
 from torch.nn.utils.rnn import pad_sequence
 from torchdiffeq import odeint
 
+from English_f5tts.model.guidance import GuidanceSchedule, full_guidance
 from English_f5tts.model.modules import MelSpec
+from English_f5tts.model.solvers import fixed_step_solvers, integrate
 from English_f5tts.model.utils import (
     default,
     exists,
@@ -46,6 +49,7 @@ class CFM(nn.Module):
         mel_spec_kwargs: dict = dict(),
         frac_lengths_mask: tuple[float, float] = (0.7, 1.0),
         vocab_char_map: dict[str:int] | None = None,
+        fold_cfg=False,
     ):
         super().__init__()
 
@@ -70,6 +74,10 @@ class CFM(nn.Module):
 
         # sampling related
         self.odeint_kwargs = odeint_kwargs
+        # cfg as one forward on a doubled batch per ode step instead of two, for backbones supporting cfg_infer
+        self.fold_cfg = fold_cfg and "cfg_infer" in inspect.signature(transformer.forward).parameters
+        # sorted frame counts sampling pads up to, for shape-stable compiled backbones (infer/compiled.py)
+        self.duration_buckets = None
 
         # vocab map for tokenization
         self.vocab_char_map = vocab_char_map
@@ -89,13 +97,16 @@ class CFM(nn.Module):
         steps=32,
         cfg_strength=1.0,
         sway_sampling_coef=None,
-        seed: int | None = None,
+        seed: int | list[int | None] | None = None,  # one seed for all rows or one per row
         max_duration=4096,
         vocoder: Callable[[float["b d n"]], float["b nw"]] | None = None,  # noqa: F722
         no_ref_audio=False,
         duplicate_test=False,
         t_inter=0.1,
         edit_mask=None,
+        return_trajectory=False,  # keep every ode state, for debugging, else the returned trajectory is None
+        skip_threshold=0.0,  # > 0 skips DiT blocks on steps whose input barely changed, higher skips more (DiT only)
+        guidance: GuidanceSchedule | None = None,  # when the unconditional pass runs, model/guidance.py; None: full
     ):
         self.eval()
         # raw wave
@@ -105,7 +116,11 @@ class CFM(nn.Module):
             cond = cond.permute(0, 2, 1)
             assert cond.shape[-1] == self.num_channels
 
-        cond = cond.to(next(self.parameters()).dtype)
+        # bf16 keeps 8 mantissa bits, so under bf16 the ode state and schedule stay in fp32 and only the transformer
+        # runs in bf16; fp16 / fp32 models integrate in their own dtype
+        model_dtype = next(self.parameters()).dtype
+        state_dtype = torch.float32 if model_dtype == torch.bfloat16 else model_dtype
+        cond = cond.to(state_dtype)
 
         batch, cond_seq_len, device = *cond.shape[:2], cond.device
         if not exists(lens):
@@ -133,7 +148,10 @@ class CFM(nn.Module):
             torch.maximum((text != -1).sum(dim=-1), lens) + 1, duration
         )  # duration at least text/audio prompt length plus one token, so something is generated
         duration = duration.clamp(max=max_duration)
-        max_duration = duration.amax()
+        max_duration = sample_duration = duration.amax()
+        if self.duration_buckets:
+            # pad to the next bucket edge, the padding is masked and cut off again after sampling
+            max_duration = next((edge for edge in self.duration_buckets if edge >= max_duration), max_duration)
 
         # duplicate test corner for inner time step oberservation
         if duplicate_test:
@@ -148,39 +166,75 @@ class CFM(nn.Module):
         step_cond = torch.where(
             cond_mask, cond, torch.zeros_like(cond)
         )  # allow direct control (cut cond audio) with lens passed in
+        model_cond = step_cond.to(model_dtype)
 
-        if batch > 1:
-            mask = lens_to_mask(duration)
+        if batch > 1 or self.duration_buckets:
+            mask = lens_to_mask(duration, length=max_duration)
         else:  # save memory and speed up, as single inference need no mask currently
             mask = None
 
         # neural ode
 
+        if skip_threshold > 0 and not hasattr(self.transformer, "run_or_skip_blocks"):
+            print(f"Step skipping supports DiT only, {type(self.transformer).__name__} runs every step")
+            skip_threshold = 0.0
+        skip_kwargs = dict(skip_threshold=skip_threshold) if skip_threshold > 0 else {}
+
+        def flow(x, t, **kwargs):
+            # transformer in the model dtype, flow back in the state dtype (no-op casts unless bf16)
+            return self.transformer(
+                x=x.to(model_dtype),
+                cond=model_cond,
+                text=text,
+                time=t.to(model_dtype),
+                mask=mask,
+                cache=True,
+                **skip_kwargs,
+                **kwargs,
+            ).to(state_dtype)
+
+        guidance = guidance or full_guidance
+        guided = dict(evaluations=0, delta=None)  # guidance delta (pred - null_pred) of the last unconditional pass
+
         def fn(t, x):
             # at each step, conditioning is fixed
             # step_cond = torch.where(cond_mask, cond, torch.zeros_like(cond))
+            strength = guidance.strength(t, cfg_strength)
+            evaluation = guided["evaluations"]
+            guided["evaluations"] += 1
+
+            if strength >= 1e-5 and guided["delta"] is not None and guidance.reuses_delta(evaluation):
+                return flow(x, t, drop_audio_cond=False, drop_text=False) + guided["delta"] * strength
+
+            if self.fold_cfg and strength >= 1e-5:
+                pred, null_pred = flow(x, t, drop_audio_cond=False, drop_text=False, cfg_infer=True).chunk(2, dim=0)
+                guided["delta"] = pred - null_pred
+                return pred + guided["delta"] * strength
 
             # predict flow
-            pred = self.transformer(
-                x=x, cond=step_cond, text=text, time=t, mask=mask, drop_audio_cond=False, drop_text=False, cache=True
-            )
-            if cfg_strength < 1e-5:
+            pred = flow(x, t, drop_audio_cond=False, drop_text=False)
+            if strength < 1e-5:
                 return pred
 
-            null_pred = self.transformer(
-                x=x, cond=step_cond, text=text, time=t, mask=mask, drop_audio_cond=True, drop_text=True, cache=True
-            )
-            return pred + (pred - null_pred) * cfg_strength
+            null_pred = flow(x, t, drop_audio_cond=True, drop_text=True)
+            guided["delta"] = pred - null_pred
+            return pred + guided["delta"] * strength
 
         # noise input
         # to make sure batch inference result is same with different batch size, and for sure single inference
         # still some difference maybe due to convolutional layers
+        # each seeded row draws from its own generator, so its noise depends on its seed and duration only, not on
+        # the rows batched with it or on other threads using the global rng
         y0 = []
-        for dur in duration:
-            if exists(seed):
-                torch.manual_seed(seed)
-            y0.append(torch.randn(dur, self.num_channels, device=self.device, dtype=step_cond.dtype))
+        seeds = seed if isinstance(seed, (list, tuple)) else [seed] * batch
+        for dur, row_seed in zip(duration, seeds):
+            generator = torch.Generator(device=self.device).manual_seed(row_seed) if exists(row_seed) else None
+            y0.append(
+                torch.randn(dur, self.num_channels, device=self.device, dtype=step_cond.dtype, generator=generator)
+            )
         y0 = pad_sequence(y0, padding_value=0, batch_first=True)
+        if self.duration_buckets:
+            y0 = F.pad(y0, (0, 0, 0, max_duration - y0.shape[1]), value=0.0)
 
         t_start = 0
 
@@ -194,12 +248,29 @@ class CFM(nn.Module):
         if sway_sampling_coef is not None:
             t = t + sway_sampling_coef * (torch.cos(torch.pi / 2 * t) - 1 + t)
 
-        trajectory = odeint(fn, y0, t, **self.odeint_kwargs)
+        # drop anything left by an interrupted call, then precompute what stays fixed across ode steps
+        self.transformer.clear_cache()
+        if hasattr(self.transformer, "prepare_sampling"):
+            self.transformer.prepare_sampling(t.to(model_dtype))
+
+        if set(self.odeint_kwargs) == {"method"} and self.odeint_kwargs["method"] in fixed_step_solvers:
+            # in-place fixed-step integration, no trajectory unless asked for
+            sampled, trajectory = integrate(
+                fn, y0, t, method=self.odeint_kwargs["method"], return_trajectory=return_trajectory
+            )
+        else:
+            trajectory = odeint(fn, y0, t, **self.odeint_kwargs)
+            sampled = trajectory[-1]
+            if not return_trajectory:
+                trajectory = None
         self.transformer.clear_cache()
 
-        sampled = trajectory[-1]
         out = sampled
         out = torch.where(cond_mask, cond, out)
+        if self.duration_buckets:
+            out = out[:, :sample_duration]
+            if trajectory is not None:
+                trajectory = trajectory[:, :, :sample_duration]
 
         if exists(vocoder):
             out = out.permute(0, 2, 1)
@@ -0,0 +1,83 @@
+# Classifier-free guidance schedules for CFM.sample
+# "full" applies cfg_strength at every transformer evaluation, the unconditional pass doubling the work. The others
+# run the unconditional pass on fewer evaluations:
+#   interval  guidance only while t_start <= t <= t_end, the conditional pass alone elsewhere
+#   every_k   the unconditional pass every `every` evaluations, in between the last guidance delta is reused
+#   decay     cfg_strength * (1 - t) ** power, guidance off once that drops below min_strength
+# t runs from 0 (noise) to 1 (mel). Schedules are written as "name" or "name:key=value,...", e.g. "interval:t_end=0.4"
+from typing import NamedTuple
+
+
+# -----------------------------------------
+
+guidance_schedules = ("full", "interval", "every_k", "decay")
+schedule_defaults = dict(
+    full=dict(),
+    interval=dict(t_start=0.0, t_end=0.5),
+    every_k=dict(every=2),
+    decay=dict(power=1.0, min_strength=0.2),
+)
+
+# -----------------------------------------
+
+
+class GuidanceSchedule(NamedTuple):
+    # hashable, so requests with equal schedules can share a sampling batch
+    name: str = "full"
+    t_start: float = 0.0
+    t_end: float = 1.0
+    every: int = 1
+    power: float = 1.0
+    min_strength: float = 0.0
+
+    def strength(self, t, cfg_strength):
+        # guidance strength at time t, 0 runs the conditional pass alone
+        t = float(t)
+        if self.name == "interval" and not self.t_start <= t <= self.t_end:
+            return 0.0
+        if self.name == "decay":
+            strength = cfg_strength * (1 - t) ** self.power
+            return strength if strength >= self.min_strength else 0.0
+        return cfg_strength
+
+    def reuses_delta(self, evaluation):
+        # whether this transformer evaluation (0-based) takes the last guidance delta instead of an unconditional pass
+        return self.name == "every_k" and evaluation % self.every != 0
+
+    @property
+    def spec(self):
+        fields = schedule_defaults[self.name]
+        if not fields:
+            return self.name
+        return f"{self.name}:" + ",".join(f"{key}={getattr(self, key)}" for key in fields)
+
+
+full_guidance = GuidanceSchedule()
+
+
+def parse_guidance(spec):
+    # "name" or "name:key=value,..." -> GuidanceSchedule, raises ValueError on anything else
+    spec = (spec or "full").strip()
+    name, _, options = spec.partition(":")
+    if name not in guidance_schedules:
+        raise ValueError(f"Unknown guidance schedule '{name}', expected one of {list(guidance_schedules)}")
+
+    fields = dict(schedule_defaults[name])
+    for option in filter(None, (option.strip() for option in options.split(","))):
+        key, _, value = option.partition("=")
+        key = key.strip()
+        if key not in fields:
+            raise ValueError(f"'{name}' guidance takes {sorted(fields) or 'no options'}, got '{key}'")
+        try:
+            fields[key] = type(fields[key])(value)
+        except ValueError:
+            raise ValueError(f"Invalid value for guidance option '{key}': '{value}'")
+
+    schedule = GuidanceSchedule(name, **fields)
+    if not 0 <= schedule.t_start <= schedule.t_end <= 1:
+        raise ValueError("interval guidance needs 0 <= t_start <= t_end <= 1")
+    if schedule.every < 1:
+        raise ValueError("every_k guidance needs every >= 1")
+    if schedule.power < 0 or schedule.min_strength < 0:
+        raise ValueError("decay guidance needs power >= 0 and min_strength >= 0")
+    return schedule
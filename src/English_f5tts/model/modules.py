@@ -10,6 +10,7 @@ d - dimension
 from __future__ import annotations
 
 import math
+from contextlib import nullcontext
 from typing import Optional
 
 import torch
@@ -25,6 +26,23 @@ from x_transformers.x_transformers import apply_rotary_pos_emb
 
 mel_basis_cache = {}
 hann_window_cache = {}
+mel_stft_cache = {}
+resampler_cache = {}
+autocast_device_types = ("cuda", "cpu", "xpu")  # accept a disabled torch.autocast context in torch >= 2.0
+
+
+def get_resampler(orig_freq, new_freq, device="cpu"):
+    # Resample kernels built once per (source rate, target rate, device) and shared process-wide
+    key = f"{orig_freq}_{new_freq}_{device}"
+    if key not in resampler_cache:
+        resampler_cache[key] = torchaudio.transforms.Resample(orig_freq, new_freq).to(device)
+    return resampler_cache[key]
+
+
+def resample(waveform, orig_freq, new_freq):
+    if orig_freq == new_freq:
+        return waveform
+    return get_resampler(orig_freq, new_freq, waveform.device)(waveform)
 
 
 def get_bigvgan_mel_spectrogram(
@@ -80,17 +98,22 @@ def get_vocos_mel_spectrogram(
     hop_length=256,
     win_length=1024,
 ):
-    mel_stft = torchaudio.transforms.MelSpectrogram(
-        sample_rate=target_sample_rate,
-        n_fft=n_fft,
-        win_length=win_length,
-        hop_length=hop_length,
-        n_mels=n_mel_channels,
-        power=1,
-        center=True,
-        normalized=False,
-        norm=None,
-    ).to(waveform.device)
+    device = waveform.device
+    key = f"{n_fft}_{n_mel_channels}_{target_sample_rate}_{hop_length}_{win_length}_{device}"
+
+    if key not in mel_stft_cache:  # filterbank and stft window built once per config and device
+        mel_stft_cache[key] = torchaudio.transforms.MelSpectrogram(
+            sample_rate=target_sample_rate,
+            n_fft=n_fft,
+            win_length=win_length,
+            hop_length=hop_length,
+            n_mels=n_mel_channels,
+            power=1,
+            center=True,
+            normalized=False,
+            norm=None,
+        ).to(device)
+    mel_stft = mel_stft_cache[key]
     if len(waveform.shape) == 3:
         waveform = waveform.squeeze(1)  # 'b 1 nw -> b nw'
 
@@ -131,14 +154,21 @@ class MelSpec(nn.Module):
         if self.dummy.device != wav.device:
             self.to(wav.device)
 
-        mel = self.extractor(
-            waveform=wav,
-            n_fft=self.n_fft,
-            n_mel_channels=self.n_mel_channels,
-            target_sample_rate=self.target_sample_rate,
-            hop_length=self.hop_length,
-            win_length=self.win_length,
-        )
+        # fp32 whatever the model dtype, also under the trainer's mixed precision autocast; torch < 2.5 rejects an
+        # autocast context (even a disabled one) on mps, where the float() input keeps the extraction in fp32 anyway
+        if wav.device.type in autocast_device_types:
+            no_autocast = torch.autocast(device_type=wav.device.type, enabled=False)
+        else:
+            no_autocast = nullcontext()
+        with no_autocast:
+            mel = self.extractor(
+                waveform=wav.float(),
+                n_fft=self.n_fft,
+                n_mel_channels=self.n_mel_channels,
+                target_sample_rate=self.target_sample_rate,
+                hop_length=self.hop_length,
+                win_length=self.win_length,
+            )
 
         return mel
 
@@ -307,9 +337,11 @@ class AdaLayerNorm(nn.Module):
 
         self.norm = nn.LayerNorm(dim, elementwise_affine=False, eps=1e-6)
 
-    def forward(self, x, emb=None):
-        emb = self.linear(self.silu(emb))
-        shift_msa, scale_msa, gate_msa, shift_mlp, scale_mlp, gate_mlp = torch.chunk(emb, 6, dim=1)
+    def forward(self, x, emb=None, modulation=None):
+        # modulation: linear(silu(emb)) computed by the caller, e.g. batched across blocks by DiT
+        if modulation is None:
+            modulation = self.linear(self.silu(emb))
+        shift_msa, scale_msa, gate_msa, shift_mlp, scale_mlp, gate_mlp = torch.chunk(modulation, 6, dim=1)
 
         x = self.norm(x) * (1 + scale_msa[:, None]) + shift_msa[:, None]
         return x, gate_msa, shift_mlp, scale_mlp, gate_mlp
@@ -328,9 +360,10 @@ class AdaLayerNorm_Final(nn.Module):
 
         self.norm = nn.LayerNorm(dim, elementwise_affine=False, eps=1e-6)
 
-    def forward(self, x, emb):
-        emb = self.linear(self.silu(emb))
-        scale, shift = torch.chunk(emb, 2, dim=1)
+    def forward(self, x, emb, modulation=None):
+        if modulation is None:
+            modulation = self.linear(self.silu(emb))
+        scale, shift = torch.chunk(modulation, 2, dim=1)
 
         x = self.norm(x) * (1 + scale)[:, None, :] + shift[:, None, :]
         return x
@@ -387,6 +420,9 @@ class Attention(nn.Module):
         self.to_q = nn.Linear(dim, self.inner_dim)
         self.to_k = nn.Linear(dim, self.inner_dim)
         self.to_v = nn.Linear(dim, self.inner_dim)
+        # q, k and v projection in one GEMM for inference, set by fuse_qkv_ (not saved, state dicts keep to_q/k/v)
+        self.register_buffer("qkv_weight", None, persistent=False)
+        self.register_buffer("qkv_bias", None, persistent=False)
 
         if qk_norm is None:
             self.q_norm = None
@@ -415,6 +451,25 @@ class Attention(nn.Module):
         if self.context_dim is not None and not self.context_pre_only:
             self.to_out_c = nn.Linear(self.inner_dim, context_dim)
 
+    def fuse_qkv_(self):
+        # to_q / to_k / to_v weights become views into qkv_weight, so loading a state dict still updates the fused
+        # projection; returns False for projections that are not plain nn.Linear (e.g. int8 quantized)
+        linears = (self.to_q, self.to_k, self.to_v)
+        if not all(isinstance(linear, nn.Linear) for linear in linears):
+            return False
+        self.qkv_weight = torch.cat([linear.weight.data for linear in linears])
+        self.qkv_bias = torch.cat([linear.bias.data for linear in linears])
+        for linear, weight, bias in zip(linears, self.qkv_weight.chunk(3), self.qkv_bias.chunk(3)):
+            linear.weight.data, linear.bias.data = weight, bias
+        return True
+
+    def _apply(self, fn, *args, **kwargs):
+        # .to() / .half() give the parameters new storage, fuse again so they stay views of qkv_weight
+        super()._apply(fn, *args, **kwargs)
+        if self.qkv_weight is not None:
+            self.fuse_qkv_()
+        return self
+
     def forward(
         self,
         x: float["b n d"],  # noised input x  # noqa: F722
@@ -449,9 +504,12 @@ class AttnProcessor:
         batch_size = x.shape[0]
 
         # `sample` projections
-        query = attn.to_q(x)
-        key = attn.to_k(x)
-        value = attn.to_v(x)
+        if attn.qkv_weight is not None and not attn.training:
+            query, key, value = F.linear(x, attn.qkv_weight, attn.qkv_bias).chunk(3, dim=-1)
+        else:
+            query = attn.to_q(x)
+            key = attn.to_k(x)
+            value = attn.to_v(x)
 
         # attention
         inner_dim = key.shape[-1]
@@ -480,10 +538,11 @@ class AttnProcessor:
                 key = apply_rotary_pos_emb(key, freqs, k_xpos_scale)
 
         # mask. e.g. inference got a batch with different target durations, mask out the padding
+        # kept as a broadcastable key-padding mask, expanding it to 'b h n n' costs O(b h n^2) memory once sdpa
+        # turns it into an additive float mask
         if mask is not None:
             attn_mask = mask
             attn_mask = attn_mask.unsqueeze(1).unsqueeze(1)  # 'b n -> b 1 1 n'
-            attn_mask = attn_mask.expand(batch_size, attn.heads, query.shape[-2], key.shape[-2])
         else:
             attn_mask = None
 
@@ -574,8 +633,7 @@ class JointAttnProcessor:
         # mask. e.g. inference got a batch with different target durations, mask out the padding
         if mask is not None:
             attn_mask = F.pad(mask, (0, c.shape[1]), value=True)  # no mask for c (text)
-            attn_mask = attn_mask.unsqueeze(1).unsqueeze(1)  # 'b n -> b 1 1 n'
-            attn_mask = attn_mask.expand(batch_size, attn.heads, query.shape[-2], key.shape[-2])
+            attn_mask = attn_mask.unsqueeze(1).unsqueeze(1)  # 'b n -> b 1 1 n', broadcast over heads and queries
         else:
             attn_mask = None
 
@@ -624,9 +682,9 @@ class DiTBlock(nn.Module):
         self.ff_norm = nn.LayerNorm(dim, elementwise_affine=False, eps=1e-6)
         self.ff = FeedForward(dim=dim, mult=ff_mult, dropout=dropout, approximate="tanh")
 
-    def forward(self, x, t, mask=None, rope=None):  # x: noised input, t: time embedding
+    def forward(self, x, t, mask=None, rope=None, modulation=None):  # x: noised input, t: time embedding
         # pre-norm & modulation for attention input
-        norm, gate_msa, shift_mlp, scale_mlp, gate_mlp = self.attn_norm(x, emb=t)
+        norm, gate_msa, shift_mlp, scale_mlp, gate_mlp = self.attn_norm(x, emb=t, modulation=modulation)
 
         # attention
         attn_output = self.attn(x=norm, mask=mask, rope=rope)
@@ -0,0 +1,68 @@
+# dtype policy, which floating point type the CFM / DiT runs in on a given device
+# "auto" picks fp16 on CUDA (sm >= 7), bf16 on CPUs with native bf16 matmul (AVX512-BF16 / AMX) and fp32 otherwise.
+# Mel extraction and the vocoder stay in fp32 whatever the policy, only the CFM parameters are cast
+import functools
+
+import torch
+
+
+# -----------------------------------------
+
+dtype_names = {
+    "fp32": torch.float32,
+    "float32": torch.float32,
+    "fp16": torch.float16,
+    "float16": torch.float16,
+    "bf16": torch.bfloat16,
+    "bfloat16": torch.bfloat16,
+}
+cpu_bf16_flags = ("avx512_bf16", "amx_bf16")  # /proc/cpuinfo flags of CPUs running bf16 matmuls natively
+auto_cpu_bf16 = True  # "auto" uses bf16 on such CPUs, else fp32
+
+# -----------------------------------------
+
+
+@functools.lru_cache(maxsize=None)
+def cpu_supports_bf16():
+    if not torch.backends.mkldnn.is_available():
+        return False
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return any(flag in line.split() for flag in cpu_bf16_flags)
+    except OSError:  # not Linux
+        pass
+    return False
+
+
+def cuda_supports_fp16(device="cuda"):
+    return torch.cuda.get_device_properties(device).major >= 7 and not torch.cuda.get_device_name().endswith("[ZLUDA]")
+
+
+def resolve_dtype(dtype=None, device="cpu"):
+    # dtype: None or "auto" for the device default, a name from dtype_names or a torch.dtype
+    if isinstance(dtype, torch.dtype):
+        return dtype
+    if dtype not in (None, "auto"):
+        if dtype not in dtype_names:
+            raise ValueError(f"Unknown dtype '{dtype}', expected 'auto' or one of {sorted(dtype_names)}")
+        return dtype_names[dtype]
+
+    device = str(device)
+    if "cuda" in device and cuda_supports_fp16(device):
+        return torch.float16
+    if device == "cpu" and auto_cpu_bf16 and cpu_supports_bf16():
+        return torch.bfloat16
+    return torch.float32
+
+
+def dtype_name(dtype):
+    # "fp32" / "fp16" / "bf16", for logs and model registry keys
+    return {torch.float32: "fp32", torch.float16: "fp16", torch.bfloat16: "bf16"}.get(dtype, str(dtype))
+
+
+def mixed_precision_of(dtype, device="cpu"):
+    # accelerate's mixed_precision setting ("no" / "fp16" / "bf16") for a training dtype
+    name = dtype_name(resolve_dtype(dtype, device))
+    return "no" if name == "fp32" else name
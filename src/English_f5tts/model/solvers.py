@@ -0,0 +1,111 @@
+"""
+ein notation:
+b - batch
+n - sequence
+d - dimension
+s - ode steps
+"""
+
+from __future__ import annotations
+
+from typing import Callable
+
+import torch
+
+
+# fixed-step ode solvers for CFM.sample
+# euler / midpoint follow torchdiffeq's update rules, but every solver updates the state in place and, unless asked
+# for, only the final sample is kept instead of the (steps + 1) x b x n x d trajectory
+# a step is fn(flow field), y (updated in place), t0, t1, state (dict kept across the steps of one integration)
+
+
+def euler_step(fn: Callable, y: float["b n d"], t0: float[""], t1: float[""], state: dict):  # noqa: F722
+    dy = fn(t0, y)
+    dy.mul_(t1 - t0)
+    y.add_(dy)
+
+
+def midpoint_step(fn: Callable, y: float["b n d"], t0: float[""], t1: float[""], state: dict):  # noqa: F722
+    dt = t1 - t0
+    half_dt = 0.5 * dt
+    y_mid = fn(t0, y).mul_(half_dt).add_(y)
+    dy = fn(t0 + half_dt, y_mid)
+    dy.mul_(dt)
+    y.add_(dy)
+
+
+def heun_step(fn: Callable, y: float["b n d"], t0: float[""], t1: float[""], state: dict):  # noqa: F722
+    # explicit trapezoid, euler predictor then the mean of both slopes
+    dt = t1 - t0
+    k1 = fn(t0, y)
+    k2 = fn(t1, y + k1 * dt)
+    k1.add_(k2).mul_(0.5 * dt)
+    y.add_(k1)
+
+
+def adams_bashforth2_step(fn: Callable, y: float["b n d"], t0: float[""], t1: float[""], state: dict):  # noqa: F722
+    # two-step adams-bashforth on the flow field, variable step size (sway sampling makes the grid non-uniform)
+    # one evaluation per step, the first step is euler
+    dt = t1 - t0
+    f = fn(t0, y)
+    prev = state.get("prev")
+    state["prev"] = (f, dt)
+    if prev is None:
+        y.add_(f * dt)
+    else:
+        f_prev, dt_prev = prev
+        r = dt / dt_prev
+        y.add_((f * (1 + 0.5 * r) - f_prev * (0.5 * r)) * dt)
+
+
+def dpm_solver_2m_step(fn: Callable, y: float["b n d"], t0: float[""], t1: float[""], state: dict):  # noqa: F722
+    # dpm-solver++(2m) on the flow path x_t = t * data + (1 - t) * noise, i.e. alpha_t = t, sigma_t = 1 - t
+    # data prediction from the flow field: x + (1 - t) * v; first order (equal to euler) where log snr is infinite,
+    # so at the first step from t = 0 and the last one to t = 1
+    lambda0 = torch.log(t0 / (1 - t0))
+    lambda1 = torch.log(t1 / (1 - t1))
+    h = lambda1 - lambda0
+
+    data = fn(t0, y).mul_(1 - t0).add_(y)
+    prev = state.get("prev")
+    state["prev"] = (data, h)
+
+    d = data
+    if prev is not None and torch.isfinite(h) and torch.isfinite(prev[1]):
+        data_prev, h_prev = prev
+        r = h_prev / h
+        d = data * (1 + 0.5 / r) - data_prev * (0.5 / r)
+
+    sigma_ratio = (1 - t1) / (1 - t0)
+    y.mul_(sigma_ratio).add_(d * (t1 - t0 * sigma_ratio))
+
+
+fixed_step_solvers = dict(
+    euler=euler_step,
+    midpoint=midpoint_step,
+    heun=heun_step,
+    ab2=adams_bashforth2_step,
+    dpmpp_2m=dpm_solver_2m_step,
+)
+evals_per_step = dict(euler=1, midpoint=2, heun=2, ab2=1, dpmpp_2m=1)  # transformer calls (nfe) per step
+
+
+def integrate(
+    fn: Callable,
+    y0: float["b n d"],  # noqa: F722
+    t: float["s"],  # noqa: F821
+    method="euler",
+    return_trajectory=False,
+):
+    # y0 is overwritten with the result; returns (final state, trajectory "s b n d" or None)
+    step = fixed_step_solvers[method]
+    state = {}
+    trajectory = [y0.clone()] if return_trajectory else None
+
+    y = y0
+    for t0, t1 in zip(t[:-1], t[1:]):
+        step(fn, y, t0, t1, state)
+        if return_trajectory:
+            trajectory.append(y.clone())
+
+    return y, torch.stack(trajectory) if return_trajectory else None
@@ -0,0 +1,75 @@
+# Overlap-add assembly of generated chunks with linear cross-fades
+# Same result as fading the tail of the output so far into the head of the next chunk, chunk by chunk, but written
+# into one preallocated float32 buffer (or emitted incrementally when streaming) with cached fade ramps
+import threading
+
+import numpy as np
+
+
+_fade_windows = {}  # overlap samples -> (fade_out, fade_in)
+_fade_windows_lock = threading.Lock()
+
+
+def fade_windows(n):
+    with _fade_windows_lock:
+        if n not in _fade_windows:
+            fade_in = np.linspace(0, 1, n, dtype=np.float32)
+            _fade_windows[n] = (np.ascontiguousarray(fade_in[::-1]), fade_in)
+        return _fade_windows[n]
+
+
+def overlaps(lengths, cross_fade_samples):
+    # overlap before each chunk, never longer than the output so far or the chunk itself
+    result, total = [], 0
+    for i, length in enumerate(lengths):
+        overlap = 0 if i == 0 else max(min(cross_fade_samples, total, length), 0)
+        result.append(overlap)
+        total += length - overlap
+    return result, total
+
+
+def cross_fade_concat(waves, cross_fade_samples):
+    # all chunks known: total length computed up front, every chunk written once
+    overlap_list, total = overlaps([len(w) for w in waves], cross_fade_samples)
+    out = np.empty(total, dtype=np.float32)
+
+    end = 0
+    for wave, overlap in zip(waves, overlap_list):
+        if overlap > 0:
+            fade_out, fade_in = fade_windows(overlap)
+            region = out[end - overlap : end]
+            region *= fade_out
+            region += wave[:overlap] * fade_in
+        out[end : end + len(wave) - overlap] = wave[overlap:]
+        end += len(wave) - overlap
+    return out
+
+
+class StreamingCrossFade:
+    # incremental version: push each chunk as it is generated, get back the samples that are final
+    # (all but the last cross_fade_samples, kept to fade into the next chunk), flush at the end
+    def __init__(self, cross_fade_samples):
+        self.cross_fade_samples = max(int(cross_fade_samples), 0)
+        self.tail = np.zeros(0, dtype=np.float32)
+        self.started = False
+
+    def push(self, wave):
+        wave = np.asarray(wave, dtype=np.float32)
+        if self.started:
+            # the held tail is min(cross_fade_samples, output so far) long, as in cross_fade_concat
+            overlap = min(len(self.tail), len(wave))
+            if overlap > 0:
+                fade_out, fade_in = fade_windows(overlap)
+                head = self.tail[len(self.tail) - overlap :] * fade_out + wave[:overlap] * fade_in
+                wave = np.concatenate([self.tail[: len(self.tail) - overlap], head, wave[overlap:]])
+            else:
+                wave = np.concatenate([self.tail, wave])
+        self.started = True
+
+        keep = min(self.cross_fade_samples, len(wave))
+        self.tail = wave[len(wave) - keep :]
+        return wave[: len(wave) - keep]
+
+    def flush(self):
+        tail, self.tail = self.tail, np.zeros(0, dtype=np.float32)
+        return tail
@@ -0,0 +1,151 @@
+# Process-wide registry of loaded inference models
+# Keeps several checkpoints resident, evicts least-recently-used ones, and serializes loads per key
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+
+import torch
+
+
+# -----------------------------------------
+
+max_resident_models = 2  # number of models kept in memory at once
+max_resident_bytes = None  # optional RAM/VRAM budget over parameters + buffers, None for no limit
+
+# -----------------------------------------
+
+
+def registry_key(ckpt_path, use_ema=True, dtype=None, device=None):
+    # mtime is part of the key, so a checkpoint overwritten by training is reloaded on next use
+    ckpt_path = os.path.abspath(ckpt_path)
+    return (ckpt_path, os.path.getmtime(ckpt_path), bool(use_ema), str(dtype), str(device))
+
+
+def estimate_nbytes(obj):
+    if isinstance(obj, torch.nn.Module):
+        modules = [obj]
+    else:
+        modules = [v for v in vars(obj).values() if isinstance(v, torch.nn.Module)]
+
+    seen, total = set(), 0
+    for module in modules:
+        for tensor in (*module.parameters(), *module.buffers()):
+            if tensor.data_ptr() in seen:
+                continue
+            seen.add(tensor.data_ptr())
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+
+class _Entry:
+    __slots__ = ("model", "nbytes", "lock")
+
+    def __init__(self, model, nbytes):
+        self.model = model
+        self.nbytes = nbytes
+        self.lock = threading.Lock()  # held while a request runs on this model (DiT keeps per-call text cache)
+
+
+class ModelRegistry:
+    def __init__(self, max_models=max_resident_models, max_bytes=max_resident_bytes):
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> _Entry, least recently used first
+        self._load_locks = {}  # key -> Lock, so concurrent requests for one checkpoint trigger a single load
+        self._stats = defaultdict(lambda: dict(hits=0, misses=0, loads=0, evictions=0, load_seconds=0.0))
+
+    def _get_entry(self, key, loader):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats[key]["hits"] += 1
+                return entry
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:  # loaded by another request while we waited
+                    self._entries.move_to_end(key)
+                    self._stats[key]["hits"] += 1
+                    return entry
+                self._stats[key]["misses"] += 1
+
+            start = time.perf_counter()
+            model = loader()
+            entry = _Entry(model, estimate_nbytes(model))
+
+            with self._lock:
+                self._stats[key]["loads"] += 1
+                self._stats[key]["load_seconds"] += time.perf_counter() - start
+                self._entries[key] = entry
+                self._evict()
+                self._load_locks.pop(key, None)
+
+        return entry
+
+    def _evict(self):
+        # called with self._lock held, never evicts the most recently used entry
+        evicted = False
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_models
+            or (self.max_bytes is not None and self.resident_bytes() > self.max_bytes)
+        ):
+            key, _ = self._entries.popitem(last=False)
+            self._stats[key]["evictions"] += 1
+            evicted = True
+
+        if evicted:
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def get(self, key, loader):
+        return self._get_entry(key, loader).model
+
+    @contextmanager
+    def use(self, key, loader, exclusive=True):
+        # evicting an entry only drops the registry reference, a running request keeps its model alive
+        # exclusive=False for models that serialize sampling themselves (F5TTS with batch_requests)
+        entry = self._get_entry(key, loader)
+        if not exclusive:
+            yield entry.model
+            return
+        with entry.lock:
+            yield entry.model
+
+    def resident_bytes(self):
+        return sum(entry.nbytes for entry in self._entries.values())
+
+    def stats(self):
+        with self._lock:
+            resident = set(self._entries)
+            return [
+                dict(
+                    ckpt_path=key[0],
+                    mtime=key[1],
+                    use_ema=key[2],
+                    dtype=key[3],
+                    device=key[4],
+                    resident=key in resident,
+                    nbytes=self._entries[key].nbytes if key in resident else 0,
+                    **stats,
+                )
+                for key, stats in self._stats.items()
+            ]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+
+model_registry = ModelRegistry()
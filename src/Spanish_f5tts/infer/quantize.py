@@ -0,0 +1,87 @@
+# int8 dynamic quantization for CPU inference
+# nn.Linear layers of the transformer blocks (attention, feed-forward, adaptive norms) and of the input embedding are
+# swapped for dynamically quantized ones (int8 weights, activations quantized per call), as are those of the Vocos
+# backbone. The quantized DiT state is cached next to the checkpoint, so later loads skip the fp32 checkpoint entirely.
+# The cache holds only the state dict (int8 tensors, scales, dtypes) and is read with weights_only=True, it is loaded
+# into a freshly quantized module, so a file replaced in an uploaded project folder cannot run code on load
+import os
+
+import torch
+import torch.nn as nn
+from torch.ao.quantization import quantize_dynamic
+
+from Spanish_f5tts.model.modules import Attention, DiTBlock, FeedForward, MMDiTBlock
+
+
+# -----------------------------------------
+
+quantized_cache_suffix = "int8.pt"
+quantized_blocks = (DiTBlock, MMDiTBlock, Attention, FeedForward)
+
+# -----------------------------------------
+
+
+def quantize_linear_(module):
+    # in place, returns the module
+    quantize_dynamic(module, {nn.Linear}, dtype=torch.qint8, inplace=True)
+    return module
+
+
+def quantize_transformer_(model):
+    # model: CFM, other submodules (time / text embedding, output norm and projection) stay in float
+    transformer = model.transformer
+    targets = [m for m in transformer.modules() if isinstance(m, quantized_blocks)]
+    for name in ("input_embed", "audio_embed"):
+        if isinstance(getattr(transformer, name, None), nn.Module):
+            targets.append(getattr(transformer, name))
+    for module in targets:
+        quantize_linear_(module)  # nested targets are already converted, a second pass is a no-op
+    return model
+
+
+def quantize_vocoder_(vocoder):
+    # Vocos only, BigVGAN is convolutional
+    backbone = getattr(vocoder, "backbone", None)
+    if backbone is not None:
+        quantize_linear_(backbone)
+    return vocoder
+
+
+def quantized_cache_path(ckpt_path, use_ema=True):
+    return f"{os.path.splitext(ckpt_path)[0]}.{'ema' if use_ema else 'model'}.{quantized_cache_suffix}"
+
+
+def _source_info(ckpt_path):
+    stat = os.stat(ckpt_path)
+    return dict(size=stat.st_size, mtime=stat.st_mtime, torch=torch.__version__)
+
+
+def load_quantized_checkpoint(model, ckpt_path, load_checkpoint, use_ema=True):
+    # model: CFM on cpu, not yet loaded; load_checkpoint: the float loader (utils_infer.load_checkpoint)
+    cache_path = quantized_cache_path(ckpt_path, use_ema)
+    source = _source_info(ckpt_path)
+
+    if os.path.isfile(cache_path):
+        try:
+            cached = torch.load(cache_path, map_location="cpu", weights_only=True)
+            if cached["source"] == source:
+                model = quantize_transformer_(model.to(torch.float32))
+                model.load_state_dict(cached["state_dict"])
+                print(f"Loaded int8 weights from {cache_path}")
+                return model.eval()
+        except Exception as e:  # another torch version, partially written or not weights only, rebuilt below
+            print(f"Ignoring int8 cache {cache_path}: {e}")
+
+    model = load_checkpoint(model, ckpt_path, "cpu", dtype=torch.float32, use_ema=use_ema)
+    model = quantize_transformer_(model).eval()
+
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        torch.save(dict(source=source, state_dict=model.state_dict()), tmp_path)
+        os.replace(tmp_path, cache_path)
+        print(f"Cached int8 weights to {cache_path}")
+    except OSError as e:  # read-only checkpoint folder, quantized again on next load
+        print(f"Could not cache int8 weights next to {ckpt_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return model
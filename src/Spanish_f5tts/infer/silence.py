@@ -0,0 +1,126 @@
+# Frame-RMS silence detection on numpy arrays
+# Follows pydub.silence (same millisecond positions, dBFS thresholds, seek steps and keep_silence merging), but every
+# window rms comes from one cumulative sum of squares instead of slicing an AudioSegment per window, and nothing has
+# to be decoded from or exported to a file. Waves are "n" or "c n" float arrays in [-1, 1], positions are in ms
+import numpy as np
+
+
+def as_channels(wave):
+    # "c n" view of a mono "n" or multichannel "c n" wave
+    wave = np.asarray(wave)
+    return wave[None] if wave.ndim == 1 else wave
+
+
+def duration_ms(wave, sample_rate):
+    # len() of the equivalent AudioSegment
+    return round(1000 * as_channels(wave).shape[-1] / sample_rate)
+
+
+def ms_to_frame(ms, sample_rate):
+    return (np.asarray(ms, dtype=np.float64) * (sample_rate / 1000.0)).astype(np.int64)
+
+
+def slice_ms(wave, sample_rate, start_ms, end_ms):
+    return wave[..., int(ms_to_frame(start_ms, sample_rate)) : int(ms_to_frame(end_ms, sample_rate))]
+
+
+def db_to_amplitude(db):
+    return 10 ** (db / 20)
+
+
+class FrameRMS:
+    # rms of any [start, end) ms windows of one wave, computed from a cumulative sum of squares over all channels
+    # windows reaching past the end count the missing frames as silence, as AudioSegment slicing pads them
+    def __init__(self, wave, sample_rate):
+        wave = as_channels(wave)
+        self.sample_rate = sample_rate
+        self.channels = wave.shape[0]
+        self.num_frames = wave.shape[-1]
+        self.duration_ms = duration_ms(wave, sample_rate)
+        energy = np.square(wave, dtype=np.float64).sum(axis=0)
+        self.cumsum = np.concatenate([np.zeros(1), np.cumsum(energy)])
+
+    def __call__(self, start_ms, end_ms):
+        start = ms_to_frame(start_ms, self.sample_rate)
+        end = ms_to_frame(end_ms, self.sample_rate)
+        frames = end - start
+        energy = self.cumsum[np.minimum(end, self.num_frames)] - self.cumsum[np.minimum(start, self.num_frames)]
+        energy = np.maximum(energy, 0.0)  # rounding of the cumulative sum
+        return np.sqrt(energy / np.maximum(frames * self.channels, 1)) * (frames > 0)
+
+
+def detect_silence(wave, sample_rate, min_silence_len=1000, silence_thresh=-16, seek_step=1, frame_rms=None):
+    frame_rms = frame_rms or FrameRMS(wave, sample_rate)
+    seg_len = frame_rms.duration_ms
+    if seg_len < min_silence_len:
+        return []
+
+    last_slice_start = seg_len - min_silence_len
+    starts = np.arange(0, last_slice_start + 1, seek_step)
+    if last_slice_start % seek_step:
+        starts = np.append(starts, last_slice_start)
+
+    silence_starts = starts[frame_rms(starts, starts + min_silence_len) <= db_to_amplitude(silence_thresh)]
+    if len(silence_starts) == 0:
+        return []
+
+    # a new range starts where the next silent window neither follows on nor overlaps the previous one
+    gaps = np.diff(silence_starts)
+    breaks = np.flatnonzero((gaps != seek_step) & (gaps > min_silence_len))
+    range_starts = np.concatenate([silence_starts[:1], silence_starts[breaks + 1]])
+    range_ends = np.concatenate([silence_starts[breaks], silence_starts[-1:]]) + min_silence_len
+    return [[int(start), int(end)] for start, end in zip(range_starts, range_ends)]
+
+
+def detect_nonsilent(wave, sample_rate, min_silence_len=1000, silence_thresh=-16, seek_step=1, frame_rms=None):
+    frame_rms = frame_rms or FrameRMS(wave, sample_rate)
+    seg_len = frame_rms.duration_ms
+    silent_ranges = detect_silence(wave, sample_rate, min_silence_len, silence_thresh, seek_step, frame_rms)
+
+    if not silent_ranges:
+        return [[0, seg_len]]
+    if silent_ranges[0] == [0, seg_len]:
+        return []
+
+    prev_end, nonsilent_ranges = 0, []
+    for start, end in silent_ranges:
+        nonsilent_ranges.append([prev_end, start])
+        prev_end = end
+    if silent_ranges[-1][1] != seg_len:
+        nonsilent_ranges.append([prev_end, seg_len])
+    if nonsilent_ranges[0] == [0, 0]:
+        nonsilent_ranges.pop(0)
+    return nonsilent_ranges
+
+
+def split_on_silence(wave, sample_rate, min_silence_len=1000, silence_thresh=-16, keep_silence=100, seek_step=1):
+    # [start, end) ms of each chunk, take them with slice_ms
+    seg_len = duration_ms(wave, sample_rate)
+    ranges = [
+        [start - keep_silence, end + keep_silence]
+        for start, end in detect_nonsilent(wave, sample_rate, min_silence_len, silence_thresh, seek_step)
+    ]
+    # overlapping kept silence is split halfway between neighbouring chunks
+    for prev, next_ in zip(ranges, ranges[1:]):
+        if next_[0] < prev[1]:
+            prev[1] = (prev[1] + next_[0]) // 2
+            next_[0] = prev[1]
+    return [[max(start, 0), min(end, seg_len)] for start, end in ranges]
+
+
+def leading_silence(wave, sample_rate, silence_threshold=-50.0, chunk_size=10):
+    # ms of silence at the start, measured in chunk_size steps (pydub detect_leading_silence)
+    frame_rms = FrameRMS(wave, sample_rate)
+    seg_len = frame_rms.duration_ms
+    starts = np.arange(0, seg_len, chunk_size)
+    loud = np.flatnonzero(frame_rms(starts, np.minimum(starts + chunk_size, seg_len)) >= db_to_amplitude(silence_threshold))
+    return int(starts[loud[0]]) if len(loud) else seg_len
+
+
+def trailing_silence(wave, sample_rate, silence_threshold=-50.0):
+    # number of 1 ms frames at the end that are not louder than the threshold
+    frame_rms = FrameRMS(wave, sample_rate)
+    seg_len = frame_rms.duration_ms
+    starts = np.arange(seg_len)
+    loud = np.flatnonzero(frame_rms(starts, np.minimum(starts + 1, seg_len)) > db_to_amplitude(silence_threshold))
+    return int(seg_len - 1 - loud[-1]) if len(loud) else seg_len
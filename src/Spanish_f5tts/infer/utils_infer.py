@@ -2,13 +2,12 @@
 # Make adjustments inside functions, and consider both gradio and cli scripts if need to change func output format
 import os
 import sys
-from concurrent.futures import ThreadPoolExecutor
 
 
 os.environ["PYTORCH_ENABLE_MPS_FALLBACK"] = "1"  # for MPS device compatibility
 sys.path.append(f"{os.path.dirname(os.path.abspath(__file__))}/../../third_party/BigVGAN/")
 
-import hashlib
+import math
 import re
 import tempfile
 from importlib.resources import files
@@ -20,20 +19,26 @@ matplotlib.use("Agg")
 
 import matplotlib.pylab as plt
 import numpy as np
+import soundfile as sf
 import torch
 import torchaudio
 import tqdm
 from huggingface_hub import hf_hub_download
-from pydub import AudioSegment, silence
+from torch.nn.utils.rnn import pad_sequence
 from transformers import pipeline
 from vocos import Vocos
 
+from Spanish_f5tts.infer.compiled import compile_model_
+from Spanish_f5tts.infer.cross_fade import StreamingCrossFade, cross_fade_concat
+from Spanish_f5tts.infer.prompt_cache import RefPrompt, condition_prompt_audio, ref_prompt_cache
+from Spanish_f5tts.infer.quantize import load_quantized_checkpoint, quantize_vocoder_
+from Spanish_f5tts.infer.silence import duration_ms, leading_silence, slice_ms, split_on_silence, trailing_silence
 from Spanish_f5tts.model import CFM
+from Spanish_f5tts.model.modules import resample
+from Spanish_f5tts.model.precision import dtype_name, resolve_dtype
 from Spanish_f5tts.model.utils import convert_char_to_pinyin, get_tokenizer
 
 
-_ref_audio_cache = {}
-
 device = (
     "cuda"
     if torch.cuda.is_available()
@@ -54,12 +59,20 @@ n_fft = 1024
 mel_spec_type = "vocos"
 target_rms = 0.1
 cross_fade_duration = 0.15
-ode_method = "euler"
+ode_method = "euler"  # euler | midpoint | heun | ab2 | dpmpp_2m (model/solvers.py), or another torchdiffeq method
 nfe_step = 32  # 16, 32
 cfg_strength = 2.0
 sway_sampling_coef = -1.0
+skip_threshold = 0.0  # > 0 skips DiT blocks on ODE steps whose input barely changed (DiT.run_or_skip_blocks)
 speed = 1.0
 fix_duration = None
+batch_chunks = True  # sample all text chunks of a request in padded batches, else one chunk after the other
+max_chunk_batch_frames = 16384  # padded mel frame budget per chunk batch (batch size x longest chunk)
+fold_cfg = True  # cond and uncond DiT pass as one forward on a doubled batch per ODE step
+quantize = False  # int8 dynamic quantization of DiT and Vocos linear layers, cpu only (infer/quantize.py)
+model_dtype = "auto"  # fp16 on cuda sm >= 7, bf16 on cpus with avx512_bf16 / amx, else fp32 (model/precision.py)
+compile_dit = False  # torch.compile the DiT blocks, sampling padded to duration buckets (infer/compiled.py)
+fuse_projections = False  # fused qkv and one adaptive norm GEMM per DiT step, state dicts keep the original layout
 
 # -----------------------------------------
 
@@ -98,7 +111,7 @@ def chunk_text(text, max_chars=135):
 
 
 # load vocoder
-def spanish_load_vocoder(vocoder_name="vocos", is_local=False, local_path="", device=device, hf_cache_dir=None):
+def spanish_load_vocoder(vocoder_name="vocos", is_local=False, local_path="", device=device, hf_cache_dir=None, quantize=quantize):
     if vocoder_name == "vocos":
         # vocoder = Vocos.from_pretrained("charactr/vocos-mel-24khz").to(device)
         if is_local:
@@ -137,6 +150,12 @@ def spanish_load_vocoder(vocoder_name="vocos", is_local=False, local_path="", de
 
         vocoder.remove_weight_norm()
         vocoder = vocoder.eval().to(device)
+
+    if quantize and vocoder_name == "vocos":
+        if device != "cpu":
+            print(f"int8 quantization runs on cpu only, keeping the vocoder in float on {device}")
+        else:
+            vocoder = quantize_vocoder_(vocoder)
     return vocoder
 
 
@@ -182,15 +201,8 @@ def spanish_transcribe(ref_audio, language=None):
 # load model checkpoint for inference
 
 
-def load_checkpoint(model, ckpt_path, device: str, dtype=None, use_ema=True):
-    if dtype is None:
-        dtype = (
-            torch.float16
-            if "cuda" in device
-            and torch.cuda.get_device_properties(device).major >= 7
-            and not torch.cuda.get_device_name().endswith("[ZLUDA]")
-            else torch.float32
-        )
+def load_checkpoint(model, ckpt_path, device: str, dtype=None, use_ema=True, fuse=False):
+    dtype = resolve_dtype(dtype, device)
     model = model.to(dtype)
 
     ckpt_type = ckpt_path.split(".")[-1]
@@ -224,7 +236,14 @@ def load_checkpoint(model, ckpt_path, device: str, dtype=None, use_ema=True):
     del checkpoint
     torch.cuda.empty_cache()
 
-    return model.to(device)
+    model = model.to(device)
+    if fuse:
+        # inference layout, see DiT.fuse_projections_
+        if hasattr(model.transformer, "fuse_projections_"):
+            model.transformer.fuse_projections_()
+        else:
+            print(f"Fused projections support DiT only, {type(model.transformer).__name__} is loaded unfused")
+    return model
 
 
 # load model for inference
@@ -239,6 +258,11 @@ def load_spanish_model(
     ode_method=ode_method,
     use_ema=True,
     device=device,
+    fold_cfg=fold_cfg,
+    quantize=quantize,
+    dtype=model_dtype,
+    compile_dit=compile_dit,
+    fuse=fuse_projections,
 ):
     if vocab_file == "":
         vocab_file = str(files("Spanish_f5tts").joinpath("infer/examples/vocab.txt"))
@@ -263,89 +287,123 @@ def load_spanish_model(
             method=ode_method,
         ),
         vocab_char_map=vocab_char_map,
+        fold_cfg=fold_cfg,
     ).to(device)
 
-    dtype = torch.float32 if mel_spec_type == "bigvgan" else None
-    model = load_checkpoint(model, ckpt_path, device, dtype=dtype, use_ema=use_ema)
+    if quantize and device != "cpu":
+        print(f"int8 quantization runs on cpu only, loading the model in float on {device}")
+    elif quantize:
+        if compile_dit:
+            print("torch.compile is not used with int8 quantization, the quantized model stays eager")
+        # int8 weights are cached next to the checkpoint after the first load
+        return load_quantized_checkpoint(model, ckpt_path, load_checkpoint, use_ema=use_ema)
+
+    if mel_spec_type == "bigvgan" and dtype in (None, "auto"):
+        dtype = torch.float32
+    dtype = resolve_dtype(dtype, device)
+    print("dtype : ", dtype_name(dtype), "\n")
+    model = load_checkpoint(model, ckpt_path, device, dtype=dtype, use_ema=use_ema, fuse=fuse)
+
+    if compile_dit:
+        # graphs are built lazily per bucket, see infer/compiled.py warmup_model to build them up front
+        compile_model_(model)
 
     return model
 
 
-def remove_silence_edges(audio, silence_threshold=-42):
+def remove_silence_edges(wave, sample_rate, silence_threshold=-42):
     # Remove silence from the start
-    non_silent_start_idx = silence.detect_leading_silence(audio, silence_threshold=silence_threshold)
-    audio = audio[non_silent_start_idx:]
+    non_silent_start_ms = leading_silence(wave, sample_rate, silence_threshold=silence_threshold)
+    wave = slice_ms(wave, sample_rate, non_silent_start_ms, 1000 * wave.shape[-1] / sample_rate)
 
     # Remove silence from the end
-    non_silent_end_duration = audio.duration_seconds
-    for ms in reversed(audio):
-        if ms.dBFS > silence_threshold:
+    non_silent_end_ms = wave.shape[-1] * 1000 / sample_rate - trailing_silence(wave, sample_rate, silence_threshold)
+    trimmed_wave = slice_ms(wave, sample_rate, 0, int(non_silent_end_ms))
+
+    return trimmed_wave
+
+
+def join_nonsilent(wave, sample_rate, min_silence_len, silence_thresh, keep_silence, seek_step=10, max_ms=None):
+    # non-silent chunks (with keep_silence around them) joined back together, stops before exceeding max_ms once
+    # over half of it is kept; returns (joined wave, whether it stopped early)
+    chunks = split_on_silence(wave, sample_rate, min_silence_len, silence_thresh, keep_silence, seek_step)
+    kept, num_frames, clipped = [], 0, False
+    for start, end in chunks:
+        chunk = slice_ms(wave, sample_rate, start, end)
+        if max_ms is not None and (
+            round(1000 * num_frames / sample_rate) > max_ms / 2
+            and round(1000 * (num_frames + chunk.shape[-1]) / sample_rate) > max_ms
+        ):
+            clipped = True
             break
-        non_silent_end_duration -= 0.001
-    trimmed_audio = audio[: int(non_silent_end_duration * 1000)]
-
-    return trimmed_audio
+        kept.append(chunk)
+        num_frames += chunk.shape[-1]
+    if not kept:
+        return wave[..., :0], clipped
+    return np.concatenate(kept, axis=-1), clipped
 
 
 # preprocess reference audio and text
 
 
 def preprocess_spanish_ref_audio_text(ref_audio_orig, ref_text, clip_short=True, show_info=print):
-    show_info("Converting audio...")
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as f:
-        aseg = AudioSegment.from_file(ref_audio_orig)
+    # cached by the upload's content, the returned path is the clipped wav inside the prompt cache
+    key = ref_prompt_cache.key(ref_audio_orig, clip_short)
+    prompt = ref_prompt_cache.get(key)
+    if prompt is not None and not ref_prompt_cache.on_disk(prompt):
+        prompt = None  # evicted, only in memory for the requests still using it; clipped and written again
+
+    if prompt is not None:
+        show_info("Using cached reference audio...")
+    else:
+        show_info("Converting audio...")
+        wave, sr = torchaudio.load(ref_audio_orig)
+        wave = wave.numpy()
 
         if clip_short:
-            # 1. try to find long silence for clipping
-            non_silent_segs = silence.split_on_silence(
-                aseg, min_silence_len=1000, silence_thresh=-50, keep_silence=1000, seek_step=10
-            )
-            non_silent_wave = AudioSegment.silent(duration=0)
-            for non_silent_seg in non_silent_segs:
-                if len(non_silent_wave) > 6000 and len(non_silent_wave + non_silent_seg) > 12000:
-                    show_info("Audio is over 12s, clipping short. (1)")
-                    break
-                non_silent_wave += non_silent_seg
-
-            # 2. try to find short silence for clipping if 1. failed
-            if len(non_silent_wave) > 12000:
-                non_silent_segs = silence.split_on_silence(
-                    aseg, min_silence_len=100, silence_thresh=-40, keep_silence=1000, seek_step=10
+            # 1. try to find long silence for clipping, 2. try to find short silence for clipping if 1. failed
+            for attempt, (min_silence_len, silence_thresh) in enumerate([(1000, -50), (100, -40)], start=1):
+                clipped_wave, clipped = join_nonsilent(
+                    wave, sr, min_silence_len, silence_thresh, keep_silence=1000, max_ms=12000
                 )
-                non_silent_wave = AudioSegment.silent(duration=0)
-                for non_silent_seg in non_silent_segs:
-                    if len(non_silent_wave) > 6000 and len(non_silent_wave + non_silent_seg) > 12000:
-                        show_info("Audio is over 12s, clipping short. (2)")
-                        break
-                    non_silent_wave += non_silent_seg
-
-            aseg = non_silent_wave
+                if clipped:
+                    show_info(f"Audio is over 12s, clipping short. ({attempt})")
+                if duration_ms(clipped_wave, sr) <= 12000:
+                    break
+            wave = clipped_wave
 
             # 3. if no proper silence found for clipping
-            if len(aseg) > 12000:
-                aseg = aseg[:12000]
+            if duration_ms(wave, sr) > 12000:
+                wave = slice_ms(wave, sr, 0, 12000)
                 show_info("Audio is over 12s, clipping short. (3)")
 
-        aseg = remove_silence_edges(aseg) + AudioSegment.silent(duration=50)
-        aseg.export(f.name, format="wav")
-        ref_audio = f.name
+        wave = remove_silence_edges(wave, sr)
+        wave = np.concatenate([wave, np.zeros((wave.shape[0], int(0.05 * sr)), dtype=wave.dtype)], axis=-1)
+
+        wav_path = ref_prompt_cache.wav_path(key)
+        os.makedirs(os.path.dirname(wav_path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav", dir=os.path.dirname(wav_path)) as f:
+            sf.write(f.name, wave.T, sr, subtype="PCM_16")
+        os.replace(f.name, wav_path)  # concurrent requests with the same upload never see a partial file
+
+        # conditioned from the clipped wave in memory, the wav is kept for the returned path and for the cache
+        audio, rms = condition_prompt_audio(torch.from_numpy(wave), sr, target_rms, target_sample_rate)
+        prompt = ref_prompt_cache.put(RefPrompt(key, wav_path, audio, rms, target_rms))
 
-    # Compute a hash of the reference audio file
-    with open(ref_audio, "rb") as audio_file:
-        audio_data = audio_file.read()
-        audio_hash = hashlib.md5(audio_data).hexdigest()
+    ref_audio = prompt.wav_path
 
     if not ref_text.strip():
-        global _ref_audio_cache
-        if audio_hash in _ref_audio_cache:
+        if prompt.ref_text:
             # Use cached asr transcription
             show_info("Using cached reference text...")
-            ref_text = _ref_audio_cache[audio_hash]
+            ref_text = prompt.ref_text
         else:
             show_info("No reference text provided, transcribing reference audio...")
-            ref_text = spanish_transcribe(ref_audio)
+            # from memory, the wav may be evicted by a concurrent request meanwhile
+            ref_text = spanish_transcribe(dict(raw=prompt.audio[0].numpy(), sampling_rate=target_sample_rate))
             # Cache the transcribed text (not caching custom ref_text, enabling users to do manual tweak)
-            _ref_audio_cache[audio_hash] = ref_text
+            prompt.ref_text = ref_text
+            ref_prompt_cache.put(prompt)
     else:
         show_info("Using custom reference text...")
 
@@ -378,12 +436,27 @@ def spanish_infer_process(
     nfe_step=nfe_step,
     cfg_strength=cfg_strength,
     sway_sampling_coef=sway_sampling_coef,
+    skip_threshold=skip_threshold,
+    guidance=None,
+    seed=None,
     speed=speed,
     fix_duration=fix_duration,
     device=device,
+    batch_scheduler=None,
+    batch_chunks=batch_chunks,
+    streaming=False,
+    chunk_size=2048,
+    return_spectrogram=True,
 ):
+    # prompts from preprocess_spanish_ref_audio_text come conditioned from the cache, other files are loaded as before
+    ref_prompt = ref_prompt_cache.find(ref_audio)
+    if ref_prompt is not None and ref_prompt.target_rms == target_rms:
+        audio, sr = ref_prompt.audio, target_sample_rate
+    else:
+        ref_prompt = None
+        audio, sr = torchaudio.load(ref_audio)
+
     # Split the input text into batches
-    audio, sr = torchaudio.load(ref_audio)
     max_chars = int(len(ref_text.encode("utf-8")) / (audio.shape[-1] / sr) * (22 - audio.shape[-1] / sr))
     gen_text_batches = chunk_text(gen_text, max_chars=max_chars)
     for i, gen_text in enumerate(gen_text_batches):
@@ -391,25 +464,36 @@ def spanish_infer_process(
     print("\n")
 
     show_info(f"Generating audio in {len(gen_text_batches)} batches...")
-    return next(
-        infer_batch_process(
-            (audio, sr),
-            ref_text,
-            gen_text_batches,
-            model_obj,
-            vocoder,
-            mel_spec_type=mel_spec_type,
-            progress=progress,
-            target_rms=target_rms,
-            cross_fade_duration=cross_fade_duration,
-            nfe_step=nfe_step,
-            cfg_strength=cfg_strength,
-            sway_sampling_coef=sway_sampling_coef,
-            speed=speed,
-            fix_duration=fix_duration,
-            device=device,
-        )
+    generator = infer_batch_process(
+        (audio, sr),
+        ref_text,
+        gen_text_batches,
+        model_obj,
+        vocoder,
+        mel_spec_type=mel_spec_type,
+        progress=progress,
+        target_rms=target_rms,
+        cross_fade_duration=cross_fade_duration,
+        nfe_step=nfe_step,
+        cfg_strength=cfg_strength,
+        sway_sampling_coef=sway_sampling_coef,
+        skip_threshold=skip_threshold,
+        guidance=guidance,
+        seed=seed,
+        speed=speed,
+        fix_duration=fix_duration,
+        device=device,
+        batch_scheduler=batch_scheduler,
+        batch_chunks=batch_chunks,
+        streaming=streaming,
+        chunk_size=chunk_size,
+        ref_prompt=ref_prompt,
+        return_spectrogram=return_spectrogram,
     )
+    if streaming:
+        # (wave piece, sample rate) as soon as each text chunk is vocoded
+        return generator
+    return next(generator)
 
 
 # infer batches
@@ -428,22 +512,31 @@ def infer_batch_process(
     nfe_step=32,
     cfg_strength=2.0,
     sway_sampling_coef=-1,
+    skip_threshold=0.0,
+    guidance=None,
+    seed=None,
     speed=1,
     fix_duration=None,
     device=None,
     streaming=False,
     chunk_size=2048,
+    batch_scheduler=None,
+    batch_chunks=True,
+    ref_prompt=None,
+    return_spectrogram=True,
 ):
     audio, sr = ref_audio
-    if audio.shape[0] > 1:
-        audio = torch.mean(audio, dim=0, keepdim=True)
-
-    rms = torch.sqrt(torch.mean(torch.square(audio)))
-    if rms < target_rms:
-        audio = audio * target_rms / rms
-    if sr != target_sample_rate:
-        resampler = torchaudio.transforms.Resample(sr, target_sample_rate)
-        audio = resampler(audio)
+    if ref_prompt is not None:
+        # already mono, normalized to target_rms and at target_sample_rate
+        rms = ref_prompt.rms
+    else:
+        if audio.shape[0] > 1:
+            audio = torch.mean(audio, dim=0, keepdim=True)
+
+        rms = torch.sqrt(torch.mean(torch.square(audio)))
+        if rms < target_rms:
+            audio = audio * target_rms / rms
+        audio = resample(audio, sr, target_sample_rate)
     audio = audio.to(device)
 
     generated_waves = []
@@ -452,7 +545,24 @@ def infer_batch_process(
     if len(ref_text[-1].encode("utf-8")) == 1:
         ref_text = ref_text + " "
 
-    def process_batch(gen_text):
+    ref_audio_len = audio.shape[-1] // hop_length
+
+    def reference_mel():
+        # "1 n d", kept with the cached prompt so a resent prompt skips it
+        if ref_prompt is None:
+            return model_obj.mel_spec(audio).permute(0, 2, 1)
+        mel = ref_prompt.mels.get(mel_spec_type)
+        if mel is None:
+            mel = model_obj.mel_spec(audio).permute(0, 2, 1).cpu()
+            ref_prompt.mels[mel_spec_type] = mel
+            ref_prompt_cache.put(ref_prompt)
+        return mel.to(device)
+
+    # reference mel computed once per request and passed as cond, instead of CFM.sample redoing it per chunk
+    with torch.inference_mode():
+        ref_mel = reference_mel()
+
+    def prepare_text_and_duration(gen_text):
         local_speed = speed
         if len(gen_text.encode("utf-8")) < 10:
             local_speed = 0.3
@@ -461,7 +571,6 @@ def infer_batch_process(
         text_list = [ref_text + gen_text]
         final_text_list = convert_char_to_pinyin(text_list)
 
-        ref_audio_len = audio.shape[-1] // hop_length
         if fix_duration is not None:
             duration = int(fix_duration * target_sample_rate / hop_length)
         else:
@@ -470,17 +579,47 @@ def infer_batch_process(
             gen_text_len = len(gen_text.encode("utf-8"))
             duration = ref_audio_len + int(ref_audio_len / ref_text_len * gen_text_len / local_speed)
 
+        return final_text_list, duration
+
+    if seed is None:
+        # drawn from the global rng, so callers that seeded it (seed_everything) still get reproducible output
+        seed = int(torch.randint(0, 2**31 - 1, (1,)))
+
+    def chunk_seed(i):
+        # one seed per text chunk, the same whether the chunk is sampled alone or batched with others
+        return seed + i
+
+    def process_batch(i, gen_text):
+        final_text_list, duration = prepare_text_and_duration(gen_text)
+
         # inference
         with torch.inference_mode():
-            generated, _ = model_obj.sample(
-                cond=audio,
-                text=final_text_list,
-                duration=duration,
-                steps=nfe_step,
-                cfg_strength=cfg_strength,
-                sway_sampling_coef=sway_sampling_coef,
-            )
-            del _
+            if batch_scheduler is not None:
+                # sampled in one padded batch with pending chunks of concurrent requests on the same model
+                generated = batch_scheduler.submit(
+                    cond=ref_mel,
+                    text=final_text_list[0],
+                    duration=duration,
+                    steps=nfe_step,
+                    cfg_strength=cfg_strength,
+                    sway_sampling_coef=sway_sampling_coef,
+                    skip_threshold=skip_threshold,
+                    guidance=guidance,
+                    seed=chunk_seed(i),
+                )
+            else:
+                generated, _ = model_obj.sample(
+                    cond=ref_mel,
+                    text=final_text_list,
+                    duration=duration,
+                    seed=chunk_seed(i),
+                    steps=nfe_step,
+                    cfg_strength=cfg_strength,
+                    sway_sampling_coef=sway_sampling_coef,
+                    skip_threshold=skip_threshold,
+                    guidance=guidance,
+                )
+                del _
 
             generated = generated.to(torch.float32)  # generated mel spectrogram
             generated = generated[:, ref_audio_len:, :]
@@ -495,68 +634,119 @@ def infer_batch_process(
             # wav -> numpy
             generated_wave = generated_wave.squeeze().cpu().numpy()
 
-            if streaming:
-                for j in range(0, len(generated_wave), chunk_size):
-                    yield generated_wave[j : j + chunk_size], target_sample_rate
+            if streaming or not return_spectrogram:
+                yield generated_wave, None
             else:
                 generated_cpu = generated[0].cpu().numpy()
                 del generated
                 yield generated_wave, generated_cpu
 
+    def process_batches_at_once(gen_text_batches):
+        # all chunks of the request, each paired with the reference prompt, sampled as padded batches: queued on the
+        # batch scheduler at once when there is one (where they also batch with concurrent requests), else in
+        # CFM.sample calls of up to max_chunk_batch_frames
+        prepared = [prepare_text_and_duration(gen_text) for gen_text in gen_text_batches]
+        results = [None] * len(prepared)
+
+        with torch.inference_mode():
+            cond = ref_mel
+            cond_len = cond.shape[1]
+            # the lower bound CFM.sample applies, to know where each chunk ends in the padded output
+            durations = [
+                min(max(max(len(final_text_list[0]), cond_len) + 1, duration), 4096)
+                for final_text_list, duration in prepared
+            ]
+
+            # packed longest first, so each group pads to lengths close to its own and the first chunk is its longest
+            groups, group = [], []
+            for i in sorted(range(len(durations)), key=lambda i: durations[i], reverse=True):
+                if group and (len(group) + 1) * durations[group[0]] > max_chunk_batch_frames:
+                    groups.append(group)
+                    group = []
+                group.append(i)
+            groups.append(group)
+
+            if batch_scheduler is not None:
+                sampled = batch_scheduler.submit_many(
+                    cond=cond,
+                    texts=[final_text_list[0] for final_text_list, _ in prepared],
+                    durations=durations,
+                    steps=nfe_step,
+                    cfg_strength=cfg_strength,
+                    sway_sampling_coef=sway_sampling_coef,
+                    skip_threshold=skip_threshold,
+                    guidance=guidance,
+                    seeds=[chunk_seed(i) for i in range(len(prepared))],
+                )
+
+            # vocoded in the same groups either way
+            for group in progress.tqdm(groups) if progress is not None else groups:
+                if batch_scheduler is not None:
+                    generated = pad_sequence([sampled[i][0] for i in group], batch_first=True)
+                else:
+                    generated, _ = model_obj.sample(
+                        cond=cond.expand(len(group), -1, -1),
+                        text=[prepared[i][0][0] for i in group],
+                        duration=torch.tensor([durations[i] for i in group], device=cond.device),
+                        seed=[chunk_seed(i) for i in group],
+                        steps=nfe_step,
+                        cfg_strength=cfg_strength,
+                        sway_sampling_coef=sway_sampling_coef,
+                        skip_threshold=skip_threshold,
+                        guidance=guidance,
+                    )
+                    del _
+
+                generated = generated.to(torch.float32)  # generated mel spectrograms
+                lengths = [durations[i] - ref_audio_len for i in group]
+                mels = [generated[k, ref_audio_len : durations[i], :] for k, i in enumerate(group)]
+                # pad with log-mel floor (silence), decode in one vocoder pass, trim back per chunk
+                generated = pad_sequence(mels, batch_first=True, padding_value=math.log(1e-5)).permute(0, 2, 1)
+                if mel_spec_type == "vocos":
+                    generated_wave = vocoder.decode(generated)
+                elif mel_spec_type == "bigvgan":
+                    generated_wave = vocoder(generated)
+                if rms < target_rms:
+                    generated_wave = generated_wave * rms / target_rms
+                generated_wave = generated_wave.reshape(len(group), -1).cpu().numpy()
+                generated = generated.cpu().numpy() if return_spectrogram else None
+
+                for k, (i, length) in enumerate(zip(group, lengths)):
+                    mel = generated[k, :, :length] if return_spectrogram else None
+                    results[i] = (generated_wave[k, : length * hop_length], mel)  # back in chunk order
+
+        return results
+
     if streaming:
-        for gen_text in progress.tqdm(gen_text_batches) if progress is not None else gen_text_batches:
-            for chunk in process_batch(gen_text):
-                yield chunk
+        # chunks cross-faded as in the non-streaming output, only the held back overlap waits for the next chunk
+        cross_fade = StreamingCrossFade(int(cross_fade_duration * target_sample_rate))
+        chunks = list(enumerate(gen_text_batches))
+        for i, gen_text in progress.tqdm(chunks) if progress is not None else chunks:
+            for generated_wave, _ in process_batch(i, gen_text):
+                generated_wave = cross_fade.push(generated_wave)
+                for j in range(0, len(generated_wave), chunk_size):
+                    yield generated_wave[j : j + chunk_size], target_sample_rate
+        generated_wave = cross_fade.flush()
+        for j in range(0, len(generated_wave), chunk_size):
+            yield generated_wave[j : j + chunk_size], target_sample_rate
     else:
-        with ThreadPoolExecutor() as executor:
-            futures = [executor.submit(process_batch, gen_text) for gen_text in gen_text_batches]
-            for future in progress.tqdm(futures) if progress is not None else futures:
-                result = future.result()
-                if result:
-                    generated_wave, generated_mel_spec = next(result)
-                    generated_waves.append(generated_wave)
-                    spectrograms.append(generated_mel_spec)
+        if batch_chunks:
+            results = process_batches_at_once(gen_text_batches)
+        else:
+            # one chunk after the other
+            chunks = list(enumerate(gen_text_batches))
+            chunks = progress.tqdm(chunks) if progress is not None else chunks
+            results = (next(process_batch(i, gen_text)) for i, gen_text in chunks)
+        for generated_wave, generated_mel_spec in results:
+            generated_waves.append(generated_wave)
+            spectrograms.append(generated_mel_spec)
 
         if generated_waves:
-            if cross_fade_duration <= 0:
-                # Simply concatenate
-                final_wave = np.concatenate(generated_waves)
-            else:
-                # Combine all generated waves with cross-fading
-                final_wave = generated_waves[0]
-                for i in range(1, len(generated_waves)):
-                    prev_wave = final_wave
-                    next_wave = generated_waves[i]
-
-                    # Calculate cross-fade samples, ensuring it does not exceed wave lengths
-                    cross_fade_samples = int(cross_fade_duration * target_sample_rate)
-                    cross_fade_samples = min(cross_fade_samples, len(prev_wave), len(next_wave))
-
-                    if cross_fade_samples <= 0:
-                        # No overlap possible, concatenate
-                        final_wave = np.concatenate([prev_wave, next_wave])
-                        continue
-
-                    # Overlapping parts
-                    prev_overlap = prev_wave[-cross_fade_samples:]
-                    next_overlap = next_wave[:cross_fade_samples]
-
-                    # Fade out and fade in
-                    fade_out = np.linspace(1, 0, cross_fade_samples)
-                    fade_in = np.linspace(0, 1, cross_fade_samples)
-
-                    # Cross-faded overlap
-                    cross_faded_overlap = prev_overlap * fade_out + next_overlap * fade_in
-
-                    # Combine
-                    new_wave = np.concatenate(
-                        [prev_wave[:-cross_fade_samples], cross_faded_overlap, next_wave[cross_fade_samples:]]
-                    )
-
-                    final_wave = new_wave
+            # overlap-add into one preallocated buffer, cross_fade_duration <= 0 simply concatenates
+            final_wave = cross_fade_concat(generated_waves, int(cross_fade_duration * target_sample_rate))
 
             # Create a combined spectrogram
-            combined_spectrogram = np.concatenate(spectrograms, axis=1)
+            combined_spectrogram = np.concatenate(spectrograms, axis=1) if return_spectrogram else None
 
             yield final_wave, target_sample_rate, combined_spectrogram
 
@@ -567,16 +757,15 @@ def infer_batch_process(
 # remove silence from generated wav
 
 
+def spanish_remove_silence_from_wave(wave, sample_rate):
+    # long silences (over 1s) cut down to 500ms on each side, in memory
+    wave, _ = join_nonsilent(wave, sample_rate, min_silence_len=1000, silence_thresh=-50, keep_silence=500)
+    return wave
+
+
 def spanish_remove_silence_for_generated_wav(filename):
-    aseg = AudioSegment.from_file(filename)
-    non_silent_segs = silence.split_on_silence(
-        aseg, min_silence_len=1000, silence_thresh=-50, keep_silence=500, seek_step=10
-    )
-    non_silent_wave = AudioSegment.silent(duration=0)
-    for non_silent_seg in non_silent_segs:
-        non_silent_wave += non_silent_seg
-    aseg = non_silent_wave
-    aseg.export(filename, format="wav")
+    wave, sr = sf.read(filename, dtype="float32", always_2d=True)
+    sf.write(filename, spanish_remove_silence_from_wave(wave.T, sr).T, sr)
 
 
 # save spectrogram
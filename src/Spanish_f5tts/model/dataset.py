@@ -10,7 +10,7 @@ from torch import nn
 from torch.utils.data import Dataset, Sampler
 from tqdm import tqdm
 
-from Spanish_f5tts.model.modules import MelSpec
+from Spanish_f5tts.model.modules import MelSpec, resample
 from Spanish_f5tts.model.utils import default
 
 
@@ -62,8 +62,7 @@ class HFDataset(Dataset):
         audio_tensor = torch.from_numpy(audio).float()
 
         if sample_rate != self.target_sample_rate:
-            resampler = torchaudio.transforms.Resample(sample_rate, self.target_sample_rate)
-            audio_tensor = resampler(audio_tensor)
+            audio_tensor = resample(audio_tensor, sample_rate, self.target_sample_rate)
 
         audio_tensor = audio_tensor.unsqueeze(0)  # 't -> 1 t')
 
@@ -149,8 +148,7 @@ class CustomDataset(Dataset):
 
             # resample if necessary
             if source_sample_rate != self.target_sample_rate:
-                resampler = torchaudio.transforms.Resample(source_sample_rate, self.target_sample_rate)
-                audio = resampler(audio)
+                audio = resample(audio, source_sample_rate, self.target_sample_rate)
 
             # to mel spectrogram
             mel_spec = self.mel_spectrogram(audio)
@@ -0,0 +1,102 @@
+# A seeded request samples the same mel whether the batch scheduler runs it alone or batched with other requests
+# python -m pytest tests/test_batch_seed.py
+import threading
+
+import pytest
+
+
+torch = pytest.importorskip("torch")
+
+from English_f5tts.infer.batch_scheduler import BatchScheduler  # noqa: E402
+from English_f5tts.model import CFM, DiT  # noqa: E402
+
+
+# -----------------------------------------
+
+mel_dim = 16
+steps = 4
+texts = ["a short sentence", "and a somewhat longer sentence to go with it"]
+durations = [80, 96]
+seeds = [11, 12]
+
+# -----------------------------------------
+
+
+@pytest.fixture(scope="module")
+def model():
+    torch.manual_seed(0)
+    transformer = DiT(dim=64, depth=2, heads=2, dim_head=32, ff_mult=2, mel_dim=mel_dim, text_dim=32, conv_layers=1)
+    model = CFM(transformer=transformer, mel_spec_kwargs=dict(n_mel_channels=mel_dim))
+    # proj_out starts at zero, which would make every flow zero and every sample equal to its noise
+    for param in model.parameters():
+        param.data.normal_(0, 0.05)
+    return model.eval()
+
+
+@pytest.fixture(scope="module")
+def cond():
+    return torch.randn(1, 24, mel_dim, generator=torch.Generator().manual_seed(1))
+
+
+def sample_alone(model, cond, i):
+    with torch.inference_mode():
+        generated, _ = model.sample(
+            cond=cond, text=[texts[i]], duration=durations[i], steps=steps, cfg_strength=2.0,
+            sway_sampling_coef=-1.0, seed=seeds[i],
+        )
+    return generated
+
+
+def test_per_row_seeds_match_alone(model, cond):
+    with torch.inference_mode():
+        batched, _ = model.sample(
+            cond=cond.expand(2, -1, -1),
+            text=texts,
+            duration=torch.tensor(durations),
+            steps=steps,
+            cfg_strength=2.0,
+            sway_sampling_coef=-1.0,
+            seed=seeds,
+        )
+    for i in range(2):
+        torch.testing.assert_close(batched[i : i + 1, : durations[i]], sample_alone(model, cond, i), atol=1e-4, rtol=0)
+
+
+def test_scheduler_batched_matches_alone(model, cond):
+    scheduler = BatchScheduler(model, max_wait_ms=500)
+    alone = scheduler.submit(cond, texts[0], durations[0], steps=steps, seed=seeds[0])
+    assert scheduler.metrics()["batches"] == 1
+
+    results = [None, None]
+    barrier = threading.Barrier(2)
+
+    def submit(i):
+        barrier.wait()
+        results[i] = scheduler.submit(cond, texts[i], durations[i], steps=steps, seed=seeds[i])
+
+    threads = [threading.Thread(target=submit, args=(i,)) for i in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # the two concurrent jobs shared one batch
+    assert scheduler.metrics()["batches"] == 2
+    torch.testing.assert_close(results[0], alone, atol=1e-4, rtol=0)
+    for i in range(2):
+        torch.testing.assert_close(results[i], sample_alone(model, cond, i), atol=1e-4, rtol=0)
+
+
+def test_other_seed_changes_the_sample(model, cond):
+    scheduler = BatchScheduler(model, max_wait_ms=0)
+    first = scheduler.submit(cond, texts[0], durations[0], steps=steps, seed=seeds[0])
+    other = scheduler.submit(cond, texts[0], durations[0], steps=steps, seed=seeds[0] + 1)
+    assert not torch.allclose(first, other)
+
+
+def test_submit_many_matches_alone(model, cond):
+    scheduler = BatchScheduler(model, max_wait_ms=0)
+    results = scheduler.submit_many(cond, texts, durations, steps=steps, seeds=seeds)
+    assert scheduler.metrics()["batches"] == 1
+    for i in range(2):
+        torch.testing.assert_close(results[i], sample_alone(model, cond, i), atol=1e-4, rtol=0)
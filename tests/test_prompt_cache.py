@@ -0,0 +1,43 @@
+# A prompt evicted from disk while a request still holds its wav path resolves to the in-memory prompt
+# python -m pytest tests/test_prompt_cache.py
+import os
+
+import pytest
+
+
+torch = pytest.importorskip("torch")
+
+from English_f5tts.infer.prompt_cache import RefPrompt, RefPromptCache  # noqa: E402
+
+
+def add_prompt(cache, key):
+    wav_path = cache.wav_path(key)
+    os.makedirs(cache.cache_dir, exist_ok=True)
+    with open(wav_path, "wb") as f:
+        f.write(b"\0" * 4096)
+    return cache.put(RefPrompt(key, wav_path, torch.zeros(1, 1024), 0.1, 0.1))
+
+
+def test_evicted_prompt_stays_in_memory(tmp_path):
+    cache = RefPromptCache(cache_dir=str(tmp_path), max_bytes=1)
+    first = add_prompt(cache, "first")
+    add_prompt(cache, "second")
+
+    assert cache.stats["evictions"] == 1
+    assert not os.path.exists(first.wav_path)
+    assert not cache.on_disk(first)
+    assert cache.find(first.wav_path) is first
+
+    # updates of an evicted prompt (a new mel, a transcription) stay in memory instead of failing on the missing wav
+    first.mels["vocos"] = torch.zeros(1, 4, 100)
+    cache.put(first)
+    assert not cache.on_disk(first)
+    assert cache.find(first.wav_path).mels["vocos"] is first.mels["vocos"]
+
+
+def test_clear_forgets_evicted_prompts(tmp_path):
+    cache = RefPromptCache(cache_dir=str(tmp_path), max_bytes=1)
+    first = add_prompt(cache, "first")
+    add_prompt(cache, "second")
+    cache.clear()
+    assert cache.find(first.wav_path) is None
@@ -0,0 +1,100 @@
+# infer/silence.py finds the same cut points as pydub.silence (and the ms loop remove_silence_edges used), within 1 ms
+# python -m pytest tests/test_silence.py
+import pytest
+
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("pydub")
+
+from pydub import AudioSegment, silence  # noqa: E402
+
+from English_f5tts.infer import silence as np_silence  # noqa: E402
+
+
+# -----------------------------------------
+
+sample_rate = 24000
+tolerance_ms = 1
+# (min_silence_len, silence_thresh, keep_silence) of preprocess_ref_audio_text's two clipping passes and of
+# remove_silence_for_generated_wav, as split_settings in eval/benchmark_silence.py
+split_settings = [
+    (1000, -50, 1000),
+    (100, -40, 1000),
+    (1000, -50, 500),
+]
+edge_threshold = -42  # remove_silence_edges
+
+# -----------------------------------------
+
+
+def synthetic_wave():
+    # tones with silent gaps longer and shorter than min_silence_len, and a quiet tone between the -50 and -40 dBFS
+    # thresholds, so the settings cut it differently
+    def tone(seconds, db):
+        t = np.arange(int(seconds * sample_rate)) / sample_rate
+        return np.sqrt(2) * 10 ** (db / 20) * np.sin(2 * np.pi * 220 * t)
+
+    def gap(seconds):
+        return np.zeros(int(seconds * sample_rate))
+
+    parts = [gap(0.3), tone(2.0, -12), gap(1.5), tone(0.5, -20), gap(0.15), tone(1.0, -12), gap(0.4)]
+    parts += [tone(0.4, -45), gap(1.2), tone(0.8, -15), gap(1.1)]
+    return np.concatenate(parts)
+
+
+@pytest.fixture(scope="module")
+def audio():
+    # both sides see the same 16-bit samples
+    pcm = (np.clip(synthetic_wave(), -1.0, 1.0) * 32767).astype("<i2")
+    aseg = AudioSegment(pcm.tobytes(), frame_rate=sample_rate, sample_width=2, channels=1)
+    return aseg, pcm / 32768.0
+
+
+def pydub_split_ranges(aseg, min_silence_len, silence_thresh, keep_silence):
+    # the ranges pydub.silence.split_on_silence slices its segments at
+    ranges = [
+        [start - keep_silence, end + keep_silence]
+        for start, end in silence.detect_nonsilent(aseg, min_silence_len, silence_thresh, seek_step=10)
+    ]
+    for prev, next_ in zip(ranges, ranges[1:]):
+        if next_[0] < prev[1]:
+            prev[1] = (prev[1] + next_[0]) // 2
+            next_[0] = prev[1]
+    return [[max(start, 0), min(end, len(aseg))] for start, end in ranges]
+
+
+def pydub_trailing_silence(aseg, silence_threshold):
+    # the millisecond loop remove_silence_edges used
+    trailing = 0
+    for ms in reversed(aseg):
+        if ms.dBFS > silence_threshold:
+            break
+        trailing += 1
+    return trailing
+
+
+@pytest.mark.parametrize("min_silence_len, silence_thresh, keep_silence", split_settings)
+def test_split_on_silence(audio, min_silence_len, silence_thresh, keep_silence):
+    aseg, wave = audio
+    expected = pydub_split_ranges(aseg, min_silence_len, silence_thresh, keep_silence)
+    result = np_silence.split_on_silence(wave, sample_rate, min_silence_len, silence_thresh, keep_silence, seek_step=10)
+    assert len(expected) > 1
+    assert len(result) == len(expected)
+    for expected_range, result_range in zip(expected, result):
+        assert np.abs(np.subtract(expected_range, result_range)).max() <= tolerance_ms
+
+
+def test_leading_silence(audio):
+    aseg, wave = audio
+    expected = silence.detect_leading_silence(aseg, silence_threshold=edge_threshold)
+    assert expected > 0
+    result = np_silence.leading_silence(wave, sample_rate, silence_threshold=edge_threshold)
+    assert abs(result - expected) <= tolerance_ms
+
+
+def test_trailing_silence(audio):
+    aseg, wave = audio
+    expected = pydub_trailing_silence(aseg, edge_threshold)
+    assert expected > 0
+    result = np_silence.trailing_silence(wave, sample_rate, silence_threshold=edge_threshold)
+    assert abs(result - expected) <= tolerance_ms
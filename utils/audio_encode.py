@@ -0,0 +1,94 @@
+# utils/audio_encode.py
+
+import io
+import subprocess
+
+import numpy as np
+import soundfile as sf
+import torch
+
+from src.English_f5tts.model.modules import resample
+from utils.audio_stream import pcm16_bytes
+
+
+AUDIO_FORMATS = {
+    # format: (mimetype, file extension)
+    "wav": ("audio/wav", "wav"),  # PCM16
+    "wav_float": ("audio/wav", "wav"),  # 32-bit float
+    "flac": ("audio/flac", "flac"),
+    "opus": ("audio/ogg", "ogg"),  # Ogg/Opus at OPUS_BITRATE unless a bitrate is requested
+    "pcm": ("audio/L16", "pcm"),  # raw little-endian 16-bit mono, rate sent as a mimetype parameter
+}
+OPUS_BITRATE = 32  # kbps
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+class AudioFormatError(ValueError):
+    pass
+
+
+def parse_audio_format(form, default="wav"):
+    # format / bitrate (kbps, opus only) / sample_rate fields of a synthesis request, raises AudioFormatError
+    fmt = form.get("format", default).lower()
+    if fmt not in AUDIO_FORMATS:
+        raise AudioFormatError(f"Unsupported format '{fmt}', expected one of {sorted(AUDIO_FORMATS)}")
+    try:
+        bitrate = int(form["bitrate"]) if form.get("bitrate") else None
+        sample_rate = int(form["sample_rate"]) if form.get("sample_rate") else None
+    except ValueError:
+        raise AudioFormatError("'bitrate' and 'sample_rate' must be integers")
+    if bitrate is not None and not 6 <= bitrate <= 510:
+        raise AudioFormatError("'bitrate' must be between 6 and 510 kbps")
+    if sample_rate is not None and not 8000 <= sample_rate <= 48000:
+        raise AudioFormatError("'sample_rate' must be between 8000 and 48000")
+    if fmt == "opus" and sample_rate is not None and sample_rate not in OPUS_SAMPLE_RATES:
+        raise AudioFormatError(f"Opus supports sample rates {list(OPUS_SAMPLE_RATES)}")
+    return dict(fmt=fmt, bitrate=bitrate, out_sample_rate=sample_rate)  # encode_audio keyword arguments
+
+
+def audio_mimetype(fmt, sample_rate):
+    if fmt == "pcm":
+        return f"{AUDIO_FORMATS['pcm'][0]};rate={sample_rate};channels=1"
+    return AUDIO_FORMATS[fmt][0]
+
+
+def download_name(stem, fmt):
+    return f"{stem}.{AUDIO_FORMATS[fmt][1]}"
+
+
+def _encode_opus(wave, sample_rate, bitrate):
+    # ffmpeg (already needed by pydub) through pipes, nothing touches the filesystem
+    process = subprocess.run(
+        [
+            "ffmpeg", "-hide_banner", "-loglevel", "error",
+            "-f", "f32le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+            "-c:a", "libopus", "-b:a", f"{bitrate}k", "-f", "ogg", "pipe:1",
+        ],
+        input=wave.astype("<f4").tobytes(),
+        capture_output=True,
+        check=True,
+    )
+    return process.stdout
+
+
+def encode_audio(wave, sample_rate, fmt="wav", bitrate=None, out_sample_rate=None):
+    # mono float wave -> (bytes, mimetype, sample rate of the encoded audio), entirely in memory
+    wave = np.clip(np.asarray(wave, dtype=np.float32).reshape(-1), -1.0, 1.0)
+    if out_sample_rate is None and fmt == "opus" and sample_rate not in OPUS_SAMPLE_RATES:
+        out_sample_rate = 48000
+    if out_sample_rate is not None and out_sample_rate != sample_rate:
+        wave = resample(torch.from_numpy(wave)[None], sample_rate, out_sample_rate)[0].numpy()
+        sample_rate = out_sample_rate
+
+    if fmt == "pcm":
+        data = pcm16_bytes(wave)
+    elif fmt == "opus":
+        data = _encode_opus(wave, sample_rate, bitrate or OPUS_BITRATE)
+    else:
+        buffer = io.BytesIO()
+        if fmt == "flac":
+            sf.write(buffer, wave, sample_rate, format="FLAC", subtype="PCM_16")
+        else:
+            sf.write(buffer, wave, sample_rate, format="WAV", subtype="FLOAT" if fmt == "wav_float" else "PCM_16")
+        data = buffer.getvalue()
+    return data, audio_mimetype(fmt, sample_rate), sample_rate
@@ -0,0 +1,51 @@
+# utils/audio_stream.py
+
+import struct
+
+import numpy as np
+
+
+STREAM_FORMATS = {
+    "wav": "audio/wav",
+    "pcm": "audio/L16",  # raw little-endian 16-bit mono, rate sent as a mimetype parameter
+}
+STREAM_CHUNK_SIZE = 2048  # samples per streamed piece, ~85 ms at 24 kHz
+
+
+def wav_stream_header(sample_rate, channels=1, sample_width=2):
+    # total length is unknown when streaming, so the RIFF and data sizes are set to the maximum
+    # (players read until the connection closes)
+    byte_rate = sample_rate * channels * sample_width
+    return b"".join([
+        b"RIFF", struct.pack("<I", 0xFFFFFFFF), b"WAVE",
+        b"fmt ", struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate, channels * sample_width, sample_width * 8),
+        b"data", struct.pack("<I", 0xFFFFFFFF),
+    ])
+
+
+def pcm16_bytes(wave):
+    wave = np.clip(np.asarray(wave, dtype=np.float32), -1.0, 1.0)
+    return (wave * 32767).astype("<i2").tobytes()
+
+
+def stream_mimetype(fmt, sample_rate):
+    if fmt == "pcm":
+        return f"{STREAM_FORMATS['pcm']};rate={sample_rate};channels=1"
+    return STREAM_FORMATS[fmt]
+
+
+def stream_audio(chunks, sample_rate, fmt="wav", on_close=None):
+    # chunks: iterable of (wave piece, sample rate) as yielded by infer_process(..., streaming=True)
+    # on_close runs once the stream is exhausted or the client disconnects
+    try:
+        if fmt == "wav":
+            yield wav_stream_header(sample_rate)
+        for wave, _ in chunks:
+            if len(wave):
+                yield pcm16_bytes(wave)
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+        if on_close is not None:
+            on_close()